@@ -0,0 +1,179 @@
+import sys
+import os
+
+# Ensure Python finds `app/` and `db/` as modules when run as a script
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import asyncio
+import time
+from collections import defaultdict
+
+from sqlalchemy import select
+from app.logger import logging
+from app.config import REPORT_RENDER_WORKERS, HEALTH_DATA_FETCH_MODE
+from app.utils.helper_functions import calculate_age, years_ago, percentile
+from app.utils.health_score import calculate_scores, build_report_sections, window_start
+from app.utils.pdf import render_pdf_async, shutdown_render_pool
+from db.database import AsyncSessionLocal, engine
+from db.models import User, GenderEnum
+from db.cruds.stats_crud import stats_service
+
+
+class StageTimer:
+    """
+    Collects per-stage durations and prints p50 / p99 for each stage.
+    """
+
+    def __init__(self):
+        self.timings = defaultdict(list)
+
+    def record(self, stage: str, seconds: float):
+        self.timings[stage].append(seconds)
+
+    def print_summary(self):
+        for stage, values in self.timings.items():
+            values = sorted(values)
+            print(f"  {stage:<8} n={len(values):<8} p50={percentile(values, 50) * 1000:9.2f} ms  "
+                  f"p99={percentile(values, 99) * 1000:9.2f} ms")
+
+
+def cohort_query(args, after_user_id: int, batch_size: int):
+    """
+    Next page of users of the cohort, by keyset on user_id.
+    """
+    query = select(User).where(User.user_id > after_user_id).order_by(User.user_id).limit(batch_size)
+    if args.user_ids:
+        query = query.where(User.user_id.in_(args.user_ids))
+    if args.gender:
+        query = query.where(User.gender == GenderEnum(args.gender.capitalize()))
+    if args.min_age is not None:
+        query = query.where(User.dob <= years_ago(args.min_age))
+    if args.max_age is not None:
+        query = query.where(User.dob > years_ago(args.max_age + 1))
+    return query
+
+
+async def fetch_batches(args, timer: StageTimer):
+    """
+    Yields (users, totals) per batch: one query for the users and one for all their health totals.
+    """
+    since = window_start(args.days)
+    last_user_id = 0
+    while True:
+        start = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            users = (await db.execute(cohort_query(args, last_user_id, args.batch_size))).scalars().all()
+            if not users:
+                return
+            totals = await stats_service.get_totals(db, [user.user_id for user in users], since=since,
+                                                    from_rollups=HEALTH_DATA_FETCH_MODE == "rollup")
+        timer.record("fetch", (time.perf_counter() - start) / len(users))
+
+        last_user_id = users[-1].user_id
+        yield users, totals
+
+
+async def render_and_write(report_data: dict, output_dir: str, timer: StageTimer, slots: asyncio.Semaphore):
+    try:
+        start = time.perf_counter()
+        pdf_bytes = await render_pdf_async(build_report_sections(report_data))
+        timer.record("render", time.perf_counter() - start)
+
+        start = time.perf_counter()
+        path = os.path.join(output_dir, f"health_report_{report_data['user'].user_id}.pdf")
+        await asyncio.to_thread(_write_file, path, pdf_bytes)
+        timer.record("write", time.perf_counter() - start)
+    finally:
+        slots.release()
+
+
+def _write_file(path: str, content: bytes):
+    with open(path, "wb") as file:
+        file.write(content)
+
+
+def reap_tasks(tasks: dict, failed: list) -> dict:
+    """
+    Returns the still running tasks of `tasks` (task -> user_id) and appends the users whose finished task raised to
+    `failed`.
+    """
+    running = {}
+    for task, user_id in tasks.items():
+        if not task.done():
+            running[task] = user_id
+        elif task.exception() is not None:
+            logging.error("Report of user %s failed", user_id, exc_info=task.exception())
+            failed.append(user_id)
+    return running
+
+
+async def generate_reports(args) -> list:
+    """
+    Generates the reports of the cohort and returns the ids of the users whose report failed.
+    """
+    os.makedirs(args.output_dir, exist_ok=True)
+    timer = StageTimer()
+    slots = asyncio.Semaphore(args.concurrency)  # Bounds in-flight renders, and therefore memory
+    tasks = {}
+    failed = []
+    scheduled = 0
+    started = time.perf_counter()
+
+    async for users, totals in fetch_batches(args, timer):
+        for user in users:
+            start = time.perf_counter()
+            report_data = {"user": user, "age": calculate_age(user.dob), "totals": totals[user.user_id],
+                           "days": args.days}
+            report_data["scores"] = calculate_scores(report_data["totals"])
+            timer.record("score", time.perf_counter() - start)
+
+            await slots.acquire()
+            task = asyncio.create_task(render_and_write(report_data, args.output_dir, timer, slots))
+            tasks[task] = user.user_id
+            scheduled += 1
+
+        # Drop finished tasks so the dict does not grow with the population, keeping their failures
+        tasks = reap_tasks(tasks, failed)
+
+    if tasks:
+        await asyncio.wait(tasks)
+    reap_tasks(tasks, failed)
+    elapsed = time.perf_counter() - started
+    generated = scheduled - len(failed)
+
+    print(f"Generated {generated} reports in {elapsed:.2f}s ({generated / elapsed if elapsed else 0:,.1f} users/s)")
+    if failed:
+        print(f"Failed {len(failed)} reports, users: {' '.join(map(str, sorted(failed)))}")
+    timer.print_summary()
+    return failed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate health report PDFs for every user or a cohort.")
+    parser.add_argument("--output-dir", default="reports")
+    parser.add_argument("--concurrency", type=int, default=REPORT_RENDER_WORKERS,
+                        help="Maximum number of reports rendered at the same time")
+    parser.add_argument("--batch-size", type=int, default=500, help="Users fetched per database round trip")
+    parser.add_argument("--user-ids", type=int, nargs="*")
+    parser.add_argument("--gender", choices=[gender.value.lower() for gender in GenderEnum])
+    parser.add_argument("--min-age", type=int)
+    parser.add_argument("--max-age", type=int)
+    parser.add_argument("--days", type=int, help="Only score the last N days")
+    return parser.parse_args(argv)
+
+
+async def main(argv=None):
+    args = parse_args(argv)
+    engine.echo = False
+    logging.getLogger().setLevel(logging.WARNING)
+    try:
+        failed = await generate_reports(args)
+    finally:
+        shutdown_render_pool()
+        await engine.dispose()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -3,9 +3,82 @@ from dotenv import load_dotenv
 
 # Load environment variables from a .env file
 load_dotenv()
+
+# Logging: "json" (one object per line) or "text"; DEBUG / INFO records per call site per second (0: unlimited)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_RATE_LIMIT_PER_SECOND = int(os.getenv("LOG_RATE_LIMIT_PER_SECOND", "20"))
+
 DB_URI = os.getenv("DATABASE_URL")
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT")
 DB_NAME = os.getenv("DB_NAME")
+
+# Database performance profile: connection pool sizing, asyncpg prepared statement cache (set to 0 behind
+# pgbouncer in transaction mode), SQL echo (off, it logs every statement) and a slow query log (off when 0)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() in ("1", "true", "yes")
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "0"))
+
+# Startup: "blocking" initializes the database before serving; "background" serves /live at once and reports
+# /ready only once initialization is done. Connection attempts back off exponentially up to DB_CONNECT_TIMEOUT.
+DB_STARTUP_MODE = os.getenv("DB_STARTUP_MODE", "blocking")
+DB_CONNECT_TIMEOUT = float(os.getenv("DB_CONNECT_TIMEOUT", "60"))
+DB_CONNECT_BACKOFF_INITIAL = float(os.getenv("DB_CONNECT_BACKOFF_INITIAL", "0.1"))
+DB_CONNECT_BACKOFF_MAX = float(os.getenv("DB_CONNECT_BACKOFF_MAX", "5"))
+
+# "summary" aggregates the report totals in Postgres, "rollup" reads them from the user_rollups table,
+# "concurrent" loads the scoring columns of every row on separate pooled sessions,
+# "sequential" loads them on one session
+HEALTH_DATA_FETCH_MODE = os.getenv("HEALTH_DATA_FETCH_MODE", "summary")
+
+# Per-user health score cache
+SCORE_CACHE_TTL_SECONDS = float(os.getenv("SCORE_CACHE_TTL_SECONDS", "300"))
+SCORE_CACHE_MAX_SIZE = int(os.getenv("SCORE_CACHE_MAX_SIZE", "10000"))
+
+# PDF rendering pool: "process" (default, fpdf is CPU bound) or "thread"
+REPORT_RENDER_POOL = os.getenv("REPORT_RENDER_POOL", "process")
+REPORT_RENDER_WORKERS = int(os.getenv("REPORT_RENDER_WORKERS", "2"))
+
+# Seconds before the in-process tests / activity types catalog is reloaded (it is also reloaded on writes)
+CATALOG_TTL_SECONDS = float(os.getenv("CATALOG_TTL_SECONDS", "300"))
+
+# Peer ranking of FHS in the health report: width of the age bands, seconds before the population index is rebuilt
+# (reports update their own user's entry in between) and the smallest cohort a percentile is shown for
+COHORT_AGE_BAND_YEARS = int(os.getenv("COHORT_AGE_BAND_YEARS", "10"))
+COHORT_MIN_PEERS = int(os.getenv("COHORT_MIN_PEERS", "20"))
+
+# Rendered report cache budget in bytes
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Prometheus latency histograms on /metrics (request middleware, BaseService, calculate_*, PDF rendering)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Rows per INSERT ... RETURNING statement / COPY batch in BaseService.bulk_create and bulk_copy
+BULK_INSERT_BATCH_SIZE = int(os.getenv("BULK_INSERT_BATCH_SIZE", "1000"))
+
+# Rows fetched per server-side cursor round trip (and encoded per chunk) by the streaming exports
+EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", "1000"))
+
+# Batched ingestion (POST /ingest): rows buffered before requests are refused with 503, rows per upsert micro-batch,
+# how long a worker waits to fill a batch, number of flushing workers and rows accepted per request
+INGEST_QUEUE_MAX_ROWS = int(os.getenv("INGEST_QUEUE_MAX_ROWS", "100000"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "2000"))
+INGEST_FLUSH_INTERVAL_MS = float(os.getenv("INGEST_FLUSH_INTERVAL_MS", "50"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_MAX_ROWS_PER_REQUEST = int(os.getenv("INGEST_MAX_ROWS_PER_REQUEST", "10000"))
+
+# Most user ids per POST /users/scores request
+BATCH_SCORE_MAX_USERS = int(os.getenv("BATCH_SCORE_MAX_USERS", "5000"))
+
+# Anomaly detection on written test results and activity heart rates: |z| against the user's running baseline
+# that flags a value, and how many earlier values the baseline needs before it is used
+ANOMALY_Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", "3.0"))
+ANOMALY_MIN_SAMPLES = int(os.getenv("ANOMALY_MIN_SAMPLES", "10"))
@@ -1,4 +1,114 @@
+import atexit
+import copy
+import json
 import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+from app.config import LOG_LEVEL, LOG_FORMAT, LOG_RATE_LIMIT_PER_SECOND
+
+# Attributes every LogRecord has; anything else on a record was passed with extra={...}
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line, with the fields passed through `extra` as top level keys.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "line": record.lineno,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{text} ({suppressed} similar messages suppressed)" if suppressed else text
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets at most `per_second` DEBUG / INFO records through per call site (file and line) per second, so per-row
+    messages cannot flood the log under load. Warnings and errors always pass. The number of dropped records is
+    attached to the next record let through from the same call site as `suppressed`.
+    """
+
+    def __init__(self, per_second: int):
+        super().__init__()
+        self.per_second = per_second
+        self._sites = {}  # (pathname, lineno) -> [window start, records let through, records suppressed]
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+
+        key = (record.pathname, record.lineno)
+        site = self._sites.get(key)
+        if site is None or record.created - site[0] >= 1.0:
+            if site is not None and site[2]:
+                record.suppressed = site[2]
+            self._sites[key] = [record.created, 1, 0]
+            return True
+        if site[1] < self.per_second:
+            site[1] += 1
+            return True
+        site[2] += 1
+        return False
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler whose prepare() only copies the record: the stdlib one formats the message (and any traceback) on
+    the calling thread, here all formatting is left to the listener thread's handler. Objects passed as log
+    arguments must therefore not be mutated after the call.
+    """
+
+    def prepare(self, record):
+        return copy.copy(record)
+
+
+def configure_logging():
+    """
+    Log calls only put the record on an in-memory queue; a listener thread formats the records and writes them
+    to stderr, so log I/O never blocks the event loop. Returns the listener (stopped, and flushed, at exit).
+    """
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    if any(isinstance(handler, QueueHandler) for handler in root.handlers):
+        return None
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    if LOG_FORMAT == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(TextFormatter("%(asctime)s - %(levelname)s - %(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    if LOG_RATE_LIMIT_PER_SECOND > 0:
+        queue_handler.addFilter(RateLimitFilter(LOG_RATE_LIMIT_PER_SECOND))
+    root.addHandler(queue_handler)
+
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
 
 # Setup logging configuration
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+log_listener = configure_logging()
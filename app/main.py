@@ -1,17 +1,57 @@
+import asyncio
+import time
+
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
-from db.database import init_db
+from db.database import init_db, get_pool_stats, ping_db
 from app.routers.users import users_router
+from app.routers.internal import internal_router
+from app.routers.ingest import ingest_router
 from app.logger import logging
+from app.utils.pdf import shutdown_render_pool
+from app.utils.cache import score_cache, report_cache
+from app.utils.catalog import catalog
+from app.utils.ingestion import ingestion_queue
+from app.config import METRICS_ENABLED, DB_STARTUP_MODE
+from app.utils.metrics import metrics_middleware, render_metrics, register, StatsGauges, CONTENT_TYPE
+
+
+async def initialize(app: FastAPI, background: bool = False):
+    start = time.perf_counter()
+    logging.info("Initializing database...")
+    try:
+        await init_db()
+        await catalog.ensure_fresh()
+    except Exception as e:
+        app.state.startup_error = str(e)
+        logging.error("Database initialization failed: %s", e)
+        if background:
+            return  # Reported by /ready; there is no caller to raise to
+        raise
+    app.state.ready = True
+    logging.info("Ready to serve after %.2fs.", time.perf_counter() - start)
+
 
 # Lifespan event for startup & shutdown
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    logging.info("Initializing database...")
-    await init_db()
+    app.state.ready = False
+    app.state.startup_error = None
+    startup = None
+    if DB_STARTUP_MODE == "background":
+        # Serve /live right away; /ready stays 503 until the database is initialized
+        startup = asyncio.create_task(initialize(app, background=True))
+    else:
+        await initialize(app)
+    ingestion_queue.start()
     yield
     logging.info("Application shutting down.")
+    if startup is not None and not startup.done():
+        startup.cancel()
+    await ingestion_queue.stop()
+    shutdown_render_pool()
 
 
 # Initialize FastAPI with lifespan
@@ -19,6 +59,39 @@ app = FastAPI(lifespan=lifespan)
 
 # Include Routers
 app.include_router(users_router, prefix="/users", tags=["Users"])
+app.include_router(ingest_router, prefix="/ingest", tags=["Ingestion"])
+app.include_router(internal_router, prefix="/internal", tags=["Internal"])
+
+if METRICS_ENABLED:
+    app.middleware("http")(metrics_middleware)
+    register(StatsGauges("score_cache", "Health score cache", score_cache.stats))
+    register(StatsGauges("report_cache", "Rendered report cache", report_cache.stats))
+    register(StatsGauges("db_pool", "Database connection pool", get_pool_stats))
+    register(StatsGauges("ingest", "Ingestion queue", ingestion_queue.stats))
+
+
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
+
+
+# Liveness: the process is up and serving, whatever the state of the database
+@app.get("/live")
+async def live():
+    return {"status": "alive"}
+
+
+# Readiness: startup has completed and the database answers through the pool
+@app.get("/ready")
+async def ready():
+    if app.state.startup_error:
+        return JSONResponse({"status": "failed", "error": app.state.startup_error}, status_code=503)
+    if not app.state.ready:
+        return JSONResponse({"status": "starting"}, status_code=503)
+    if not await ping_db():
+        return JSONResponse({"status": "database unavailable"}, status_code=503)
+    return {"status": "ready"}
 
 
 # Root endpoint
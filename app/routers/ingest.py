@@ -0,0 +1,30 @@
+from fastapi import APIRouter, HTTPException
+
+from app.config import INGEST_MAX_ROWS_PER_REQUEST
+from app.schemas.ingest import IngestBatch, IngestAccepted
+from app.utils.ingestion import ingestion_queue, to_row, missing_conflict_indexes
+
+ingest_router = APIRouter()
+
+
+@ingest_router.post("/", status_code=202, response_model=IngestAccepted)
+async def ingest_samples(batch: IngestBatch):
+    """
+    Accepts steps, sleep and activity samples of any number of users. Rows are upserted on (user_id, source_id)
+    asynchronously, in micro-batches; a later sample with the same source_id replaces the earlier one.
+    Answers 503 with Retry-After while the ingestion queue cannot take the whole batch, and 503 while a unique
+    (user_id, source_id) index the upserts rely on is missing.
+    """
+    missing = missing_conflict_indexes()
+    if missing:
+        raise HTTPException(status_code=503,
+                            detail=f"Ingestion is unavailable until the indexes {sorted(missing)} are created.")
+    rows = [(dataset, to_row(sample.model_dump()))
+            for dataset in ("steps", "sleep", "activities") for sample in getattr(batch, dataset)]
+    if len(rows) > INGEST_MAX_ROWS_PER_REQUEST:
+        raise HTTPException(status_code=413,
+                            detail=f"At most {INGEST_MAX_ROWS_PER_REQUEST} samples per request, got {len(rows)}.")
+    if not ingestion_queue.submit(rows):
+        raise HTTPException(status_code=503, detail="Ingestion queue is full, retry later.",
+                            headers={"Retry-After": "1"})
+    return IngestAccepted(accepted=len(rows), queued=ingestion_queue.queue.qsize())
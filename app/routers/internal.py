@@ -0,0 +1,58 @@
+from fastapi import APIRouter
+
+from app.utils.cache import score_cache, report_cache
+from app.utils.catalog import catalog
+from app.utils.cohort_ranking import cohort_ranking
+from app.utils.ingestion import ingestion_queue
+from db.database import get_pool_stats
+
+internal_router = APIRouter()
+
+
+@internal_router.get("/score-cache")
+async def get_score_cache_stats():
+    """
+    Hit, miss and eviction counters of the per-user health score cache.
+    """
+    return score_cache.stats()
+
+
+@internal_router.get("/report-cache")
+async def get_report_cache_stats():
+    """
+    Size and hit / miss / eviction counters of the rendered report cache.
+    """
+    return report_cache.stats()
+
+
+@internal_router.get("/db-pool")
+async def get_db_pool_stats():
+    """
+    Checked-out and idle connections of the database pool, and how long checkouts waited for a connection.
+    """
+    return get_pool_stats()
+
+
+@internal_router.get("/catalog")
+async def get_catalog_stats():
+    """
+    Number of cached tests and activity types, the version of the test bounds and the age of the last load.
+    """
+    return catalog.stats()
+
+
+@internal_router.get("/cohort-ranking")
+async def get_cohort_ranking_stats():
+    """
+    Users and cohorts in the loaded FHS peer ranking, the version (build time) it was loaded from and the number
+    of loads.
+    """
+    return cohort_ranking.stats()
+
+
+@internal_router.get("/ingest")
+async def get_ingest_stats():
+    """
+    Queue depth and accepted / written / dropped / failed row counters of the batched ingestion.
+    """
+    return ingestion_queue.stats()
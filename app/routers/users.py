@@ -1,32 +1,124 @@
-from fastapi import APIRouter, Query, HTTPException, Depends
-from fastapi.responses import FileResponse
-import os
+from fastapi import APIRouter, Query, HTTPException, Depends, Header
+from typing import Optional, List
+from fastapi.responses import Response, StreamingResponse
 
 from db.database import get_db
-from app.utils.health_score import generate_pdf_report  # Import your function
+from db.cruds.user_crud import user_service
+from db.cruds.anomaly_crud import anomaly_service
+from app.utils.health_score import get_report_etag, get_cached_pdf_report, window_start, get_score_series
+from app.utils.export import ExportDataset, ExportFormat, MEDIA_TYPES, export_user_data
+from app.utils.health_score_batch import score_cohort
+from app.schemas.scores import BatchScoreRequest, BatchScoreResponse, UserScores, ScoreSeries
+from app.schemas.anomaly import AnomalyEventResponse
+from app.config import BATCH_SCORE_MAX_USERS
 from app.logger import logging
 from sqlalchemy.ext.asyncio import AsyncSession
 
 users_router = APIRouter()
 
 
-@users_router.get("/get_health_score", response_class=FileResponse)
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+@users_router.get("/get_health_score", response_class=Response)
 async def get_health_score(user_id: int = Query(..., description="User ID to generate health score report"),
+                           days: Optional[int] = Query(None, ge=1, description="Only score the last N days"),
+                           if_none_match: Optional[str] = Header(None),
                            db: AsyncSession = Depends(get_db)):
     """
     API Endpoint to generate and return a health score report for a user.
+    Answers 304 Not Modified when the client's If-None-Match already holds the current report version.
     """
-    pdf_file_path = f"health_report_user_{user_id}.pdf"
-
     try:
-        logging.info(f"Generating health report for user {user_id}...")
-        await generate_pdf_report(user_id)
+        etag = await get_report_etag(db, user_id, days)
+        if etag is None:
+            raise HTTPException(status_code=404, detail=f"User {user_id} not found.")
+
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+
+        logging.info("Generating health report for user %s...", user_id)
+        pdf_bytes = await get_cached_pdf_report(user_id, etag, days)
+    except HTTPException:
+        raise
     except Exception as e:
-        logging.error(f"Error generating health report: {e}")
+        logging.error("Error generating health report: %s", e)
         raise HTTPException(status_code=500, detail="Failed to generate health report.")
 
-    if not os.path.exists(pdf_file_path):
-        logging.error("Report file not found after generation.")
-        raise HTTPException(status_code=500, detail="Report generation failed.")
+    if pdf_bytes is None:
+        raise HTTPException(status_code=404, detail=f"User {user_id} not found.")
+
+    headers["Content-Disposition"] = f'attachment; filename="health_report_{user_id}.pdf"'
+    return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
+
+
+@users_router.post("/scores", response_model=BatchScoreResponse)
+async def get_batch_scores(request: BatchScoreRequest, db: AsyncSession = Depends(get_db)):
+    """
+    BHI / AHS / SQS / FHS of many users (e.g. a team or clinic roster) as JSON, without rendering reports.
+    Each table is read once for the whole roster and all users are scored in one vectorized pass.
+    """
+    user_ids = sorted(set(request.user_ids))
+    if len(user_ids) > BATCH_SCORE_MAX_USERS:
+        raise HTTPException(status_code=413,
+                            detail=f"At most {BATCH_SCORE_MAX_USERS} users per request, got {len(user_ids)}.")
+
+    scores = await score_cohort(db, user_ids, since=window_start(request.days))
+    found = scores["user_id"].tolist()
+    columns = [scores[name].tolist() for name in ("BHI", "AHS", "SQS", "FHS")]
+    return BatchScoreResponse(
+        days=request.days,
+        scores=[UserScores(user_id=user_id, BHI=BHI, AHS=AHS, SQS=SQS, FHS=FHS)
+                for user_id, BHI, AHS, SQS, FHS in zip(found, *columns)],
+        missing=sorted(set(user_ids) - set(found)),
+    )
+
+
+@users_router.get("/{user_id}/score-series", response_model=ScoreSeries)
+async def get_user_score_series(user_id: int,
+                                window: int = Query(7, ge=1, le=365, description="Rolling window in days"),
+                                days: int = Query(90, ge=1, le=730, description="Number of daily points"),
+                                db: AsyncSession = Depends(get_db)):
+    """
+    Daily rolling-window AHS / SQS / BHI of the last `days` days, for trend charts (e.g. window=7, 30 or 90).
+    """
+    if await user_service.get_by_id(db, user_id) is None:
+        raise HTTPException(status_code=404, detail=f"User {user_id} not found.")
+    return ScoreSeries(user_id=user_id, window=window, points=await get_score_series(db, user_id, window, days))
+
+
+@users_router.get("/{user_id}/anomalies", response_model=List[AnomalyEventResponse])
+async def get_user_anomalies(user_id: int,
+                             days: Optional[int] = Query(None, ge=1, description="Only the last N days"),
+                             limit: int = Query(100, ge=1, le=1000),
+                             db: AsyncSession = Depends(get_db)):
+    """
+    Test results and activity heart rates flagged when they were written (out of range, or far from the user's
+    own baseline), newest first.
+    """
+    if await user_service.get_by_id(db, user_id) is None:
+        raise HTTPException(status_code=404, detail=f"User {user_id} not found.")
+    return await anomaly_service.get_recent(db, user_id, since=window_start(days), limit=limit)
+
+
+@users_router.get("/{user_id}/export/{dataset}", response_class=StreamingResponse)
+async def export_health_data(user_id: int, dataset: ExportDataset,
+                             format: ExportFormat = Query(ExportFormat.ndjson, description="ndjson or csv"),
+                             days: Optional[int] = Query(None, ge=1, description="Only export the last N days"),
+                             db: AsyncSession = Depends(get_db)):
+    """
+    Streams a user's raw steps / sleep / activity / test result rows as NDJSON or CSV, oldest first.
+    Rows are read through a server-side cursor and encoded chunk by chunk, so memory does not grow with history.
+    """
+    if await user_service.get_by_id(db, user_id) is None:
+        raise HTTPException(status_code=404, detail=f"User {user_id} not found.")
 
-    return FileResponse(pdf_file_path, filename=f"health_report_{user_id}.pdf", media_type="application/pdf")
+    logging.info("Exporting %s of user %s as %s...", dataset.value, user_id, format.value)
+    headers = {"Content-Disposition": f'attachment; filename="{dataset.value}_{user_id}.{format.value}"'}
+    return StreamingResponse(export_user_data(user_id, dataset, format, since=window_start(days)),
+                             media_type=MEDIA_TYPES[format], headers=headers)
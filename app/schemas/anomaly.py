@@ -0,0 +1,19 @@
+from pydantic import BaseModel, ConfigDict
+from datetime import datetime
+from typing import Optional
+
+
+# Anomaly Event Response Schema
+class AnomalyEventResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    event_id: int
+    metric: str
+    kind: str
+    source_id: int
+    observed_at: datetime
+    value: float
+    expected_low: Optional[float]
+    expected_high: Optional[float]
+    z_score: Optional[float]
+    created_at: datetime
@@ -0,0 +1,32 @@
+from pydantic import BaseModel, Field
+from typing import List
+
+from app.schemas.daily_steps import StepsCreate
+from app.schemas.sleep_activity import SleepCreate
+from app.schemas.psychical_activity import ActivityCreate
+
+
+# Ingested samples carry the client's id of the sample, unique per user: resending an id replaces that sample
+class StepsSample(StepsCreate):
+    source_id: str = Field(min_length=1, max_length=64)
+
+
+class SleepSample(SleepCreate):
+    source_id: str = Field(min_length=1, max_length=64)
+
+
+class ActivitySample(ActivityCreate):
+    source_id: str = Field(min_length=1, max_length=64)
+
+
+# Batch of device samples for any number of users
+class IngestBatch(BaseModel):
+    steps: List[StepsSample] = []
+    sleep: List[SleepSample] = []
+    activities: List[ActivitySample] = []
+
+
+# Rows queued for upsert
+class IngestAccepted(BaseModel):
+    accepted: int
+    queued: int
@@ -0,0 +1,37 @@
+from pydantic import BaseModel, Field
+from datetime import date
+from typing import List, Optional
+
+
+# Users to score, optionally over the last N days only
+class BatchScoreRequest(BaseModel):
+    user_ids: List[int]
+    days: Optional[int] = Field(None, ge=1)
+
+
+class UserScores(BaseModel):
+    user_id: int
+    BHI: float
+    AHS: float
+    SQS: float
+    FHS: float
+
+
+class BatchScoreResponse(BaseModel):
+    days: Optional[int]
+    scores: List[UserScores]
+    missing: List[int]  # Requested ids without a user
+
+
+class ScorePoint(BaseModel):
+    date: date
+    AHS: float
+    SQS: float
+    BHI: Optional[float]  # None without test results in the window
+
+
+# Rolling `window`-day scores, one point per day, oldest first
+class ScoreSeries(BaseModel):
+    user_id: int
+    window: int
+    points: List[ScorePoint]
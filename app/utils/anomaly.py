@@ -0,0 +1,29 @@
+import math
+from typing import Optional
+
+
+class RunningStats:
+    """
+    Welford's online mean / variance: constant memory per metric, numerically stable, one update per value.
+    """
+    __slots__ = ("count", "mean", "m2")
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def stddev(self) -> float:
+        # Sample standard deviation
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def z_score(self, value: float) -> Optional[float]:
+        stddev = self.stddev
+        return (value - self.mean) / stddev if stddev > 0 else None
@@ -0,0 +1,138 @@
+import time
+from collections import OrderedDict
+
+from app.config import SCORE_CACHE_MAX_SIZE, SCORE_CACHE_TTL_SECONDS, REPORT_CACHE_MAX_BYTES
+
+
+class TTLCache:
+    """
+    In-process LRU cache with a time-to-live per entry and hit / miss / eviction counters.
+
+    Every `invalidate` / `clear` bumps the key's generation: a value computed from data read before that is passed
+    with the generation taken before the read, and `set` drops it instead of caching stale data.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value), least recently used first
+        self._generations = {}  # key -> number of invalidations since the last clear
+        self._epoch = 0  # Number of clears
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_sets = 0
+
+    def generation(self, key) -> tuple:
+        return self._epoch, self._generations.get(key, 0)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, generation: tuple = None):
+        if generation is not None and generation != self.generation(key):
+            self.stale_sets += 1
+            return
+
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key):
+        # Bumped even without an entry: the value may be being computed right now
+        self._generations[key] = self._generations.get(key, 0) + 1
+        if self._entries.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._generations.clear()
+        self._epoch += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "stale_sets": self.stale_sets,
+        }
+
+
+class SizedLRUCache:
+    """
+    LRU cache for bytes values, bounded by the total size of the cached values instead of an entry count.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()  # key -> bytes, least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value: bytes):
+        if len(value) > self.max_bytes:
+            return
+
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.current_bytes -= len(previous)
+        self._entries[key] = value
+        self.current_bytes += len(value)
+        while self.current_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.current_bytes -= len(evicted)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# Health scores per user_id, invalidated by BaseService whenever a row with that user_id is written
+score_cache = TTLCache(SCORE_CACHE_MAX_SIZE, SCORE_CACHE_TTL_SECONDS)
+
+# Rendered PDF reports keyed by their ETag (a digest of the user's data version)
+report_cache = SizedLRUCache(REPORT_CACHE_MAX_BYTES)
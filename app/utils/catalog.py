@@ -0,0 +1,90 @@
+import asyncio
+import hashlib
+import time
+from typing import NamedTuple, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import CATALOG_TTL_SECONDS
+from app.logger import logging
+from app.utils.cache import score_cache
+from app.utils.score_series import series_cache
+from db.database import AsyncSessionLocal
+from db.models import Test, ActivityType
+
+
+class TestInfo(NamedTuple):
+    test_id: int
+    test_name: str
+    unit: str
+    lower_bound: Optional[float]
+    upper_bound: Optional[float]
+
+
+class Catalog:
+    """
+    Process-wide copy of the reference tables (tests and activity types). Loaded at startup, reloaded after writes
+    through TestService / ActivityTypeService and at most `ttl` seconds after the last load (which covers writes
+    made by other processes). Lookups are plain dict reads, so test results never need to join `tests`.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.tests = {}  # test_id -> TestInfo
+        self.test_bounds = {}  # test_id -> (lower_bound, upper_bound), what calculate_BHI reads
+        self.activity_types = {}  # activity_type_id -> name
+        self.version = None  # Digest of the test bounds; part of cached scores and report ETags
+        self.loaded_at = None
+        self.loads = 0
+        self._lock = asyncio.Lock()
+
+    async def refresh(self, db: AsyncSession):
+        tests = {row.test_id: TestInfo(*row) for row in (await db.execute(
+            select(Test.test_id, Test.test_name, Test.unit, Test.lower_bound, Test.upper_bound))).all()}
+        activity_types = dict((await db.execute(select(ActivityType.activity_type_id, ActivityType.name))).all())
+        test_bounds = {test_id: (test.lower_bound, test.upper_bound) for test_id, test in tests.items()}
+        version = hashlib.sha1(repr(sorted(test_bounds.items())).encode()).hexdigest()[:12]
+
+        # Swap whole dicts so readers never see a half-loaded catalog
+        self.tests, self.test_bounds, self.activity_types = tests, test_bounds, activity_types
+        if self.version is not None and version != self.version:
+            # Every cached BHI, and every cached BHI deviation of the score series, used the old bounds
+            score_cache.clear()
+            series_cache.clear()
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.loads += 1
+        logging.info("Loaded catalog: %s tests, %s activity types (version %s).", len(tests), len(activity_types),
+                     version)
+
+    async def ensure_fresh(self):
+        """
+        Reloads the catalog if it was never loaded or is older than the TTL. Cheap when it is fresh.
+        """
+        if self.loaded_at is not None and time.monotonic() - self.loaded_at < self.ttl:
+            return
+        async with self._lock:
+            if self.loaded_at is not None and time.monotonic() - self.loaded_at < self.ttl:
+                return  # Reloaded by another task while we waited
+            async with AsyncSessionLocal() as db:
+                await self.refresh(db)
+
+    async def on_write(self, db: AsyncSession, keys):
+        """
+        Write hook of TestService and ActivityTypeService.
+        """
+        await self.refresh(db)
+
+    def stats(self) -> dict:
+        return {
+            "tests": len(self.tests),
+            "activity_types": len(self.activity_types),
+            "version": self.version,
+            "age_seconds": round(time.monotonic() - self.loaded_at, 1) if self.loaded_at is not None else None,
+            "ttl_seconds": self.ttl,
+            "loads": self.loads,
+        }
+
+
+catalog = Catalog(CATALOG_TTL_SECONDS)
@@ -0,0 +1,145 @@
+import asyncio
+import math
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select, insert, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import COHORT_AGE_BAND_YEARS, COHORT_MIN_PEERS
+from app.logger import logging
+from app.utils.helper_functions import calculate_age
+from db.cruds.stats_crud import stats_service
+from db.models import User, CohortScore
+
+
+def cohort_key(age: int, gender) -> tuple:
+    """
+    (age band, gender) bucket of a user, e.g. ("40-49", "Female").
+    """
+    low = age // COHORT_AGE_BAND_YEARS * COHORT_AGE_BAND_YEARS
+    return f"{low}-{low + COHORT_AGE_BAND_YEARS - 1}", getattr(gender, "value", gender)
+
+
+class CohortRanking:
+    """
+    All-history FHS of every user, kept as one sorted list per (age band, gender) cohort. A percentile lookup is two
+    bisections. The scores live in `cohort_scores`, written by `build` in an offline job
+    (data/build_cohort_ranking.py) from the SQL totals; API processes only read them, and reload their copy when
+    a newer build was stored. The build time is the ranking's version, the same in every process.
+    """
+
+    def __init__(self, min_peers: int):
+        self.min_peers = min_peers
+        self.cohorts = {}  # cohort key -> sorted FHS values
+        self.entries = {}  # user_id -> (cohort key, FHS), to find the value a fresh score replaces
+        self.version = None  # built_at of the loaded build
+        self.loads = 0
+        self._lock = asyncio.Lock()
+
+    def load(self, entries, version: Optional[datetime] = None):
+        """
+        Replaces the index with `entries` of (user_id, cohort key, FHS). Non-finite scores are left out: NaN
+        does not sort, and one would break the bisections of the whole cohort.
+        """
+        cohorts, users = {}, {}
+        for user_id, key, score in entries:
+            if not math.isfinite(score):
+                continue
+            cohorts.setdefault(key, []).append(score)
+            users[user_id] = (key, score)
+        for scores in cohorts.values():
+            scores.sort()
+        self.cohorts, self.entries = cohorts, users
+        self.version = version
+        self.loads += 1
+
+    def rank(self, key: tuple, score: float, user_id: Optional[int] = None):
+        """
+        Percentage of the cohort scoring below `score` (ties count half) and the cohort size, or None when the
+        cohort has fewer than `min_peers` users. With `user_id`, `score` is that user's current FHS and replaces
+        the user's stored entry.
+        """
+        if not math.isfinite(score):
+            return None
+        scores = self.cohorts.get(key, [])
+        below = bisect_left(scores, score)
+        ties = bisect_right(scores, score) - below
+        peers = len(scores)
+        if user_id is not None:
+            stored = self.entries.get(user_id)
+            if stored is not None and stored[0] == key:
+                peers -= 1
+                if stored[1] < score:
+                    below -= 1
+                elif stored[1] == score:
+                    ties -= 1
+            peers += 1
+            ties += 1
+
+        if peers < self.min_peers:
+            return None
+        return {"percentile": round(100 * (below + ties / 2) / peers, 1), "peers": peers}
+
+    @staticmethod
+    async def get_version(db: AsyncSession) -> Optional[datetime]:
+        """
+        built_at of the stored build, None before the first one.
+        """
+        return (await db.execute(select(func.max(CohortScore.built_at)))).scalar()
+
+    async def ensure_current(self, db: AsyncSession) -> Optional[datetime]:
+        """
+        Reloads the index if a newer build was stored. Returns the stored version. Cheap when it is current.
+        """
+        version = await self.get_version(db)
+        if version == self.version:
+            return version
+        async with self._lock:
+            if version != self.version:  # Unless another task reloaded it while we waited
+                rows = (await db.execute(select(CohortScore.user_id, CohortScore.age_band, CohortScore.gender,
+                                                CohortScore.fhs))).all()
+                self.load(((user_id, (band, gender), fhs) for user_id, band, gender, fhs in rows), version)
+                logging.info("Loaded cohort ranking of %s users in %s cohorts.", len(self.entries),
+                             len(self.cohorts))
+        return version
+
+    @staticmethod
+    async def build(db: AsyncSession) -> int:
+        """
+        Scores every user from the SQL totals over the daily rollups and replaces `cohort_scores` in one
+        transaction. Returns the number of ranked users.
+        """
+        from app.utils.health_score import calculate_scores  # health_score imports this module
+
+        start = time.perf_counter()
+        users = (await db.execute(select(User.user_id, User.dob, User.gender))).all()
+        totals = await stats_service.get_totals(db, from_rollups=True)
+        built_at = datetime.now()
+        rows = []
+        for user_id, dob, gender in users:
+            fhs = calculate_scores(totals[user_id])["FHS"] if user_id in totals else math.nan
+            if not math.isfinite(fhs):
+                continue
+            band, gender = cohort_key(calculate_age(dob), gender)
+            rows.append({"user_id": user_id, "age_band": band, "gender": gender, "fhs": fhs, "built_at": built_at})
+
+        await db.execute(delete(CohortScore))
+        if rows:
+            await db.execute(insert(CohortScore), rows)
+        await db.commit()
+        logging.info("Built cohort ranking of %s users in %.2fs.", len(rows), time.perf_counter() - start)
+        return len(rows)
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self.entries),
+            "cohorts": len(self.cohorts),
+            "version": self.version.isoformat() if self.version is not None else None,
+            "loads": self.loads,
+        }
+
+
+cohort_ranking = CohortRanking(COHORT_MIN_PEERS)
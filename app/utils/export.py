@@ -0,0 +1,85 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from enum import Enum
+
+from app.logger import logging
+from db.database import AsyncSessionLocal
+from db.cruds.daily_steps_crud import step_service
+from db.cruds.sleep_activity_crud import sleep_service
+from db.cruds.activity import activity_service
+from db.cruds.test_results_crud import test_result_service
+
+
+class ExportDataset(str, Enum):
+    steps = "steps"
+    sleep = "sleep"
+    activity = "activity"
+    test_results = "test_results"
+
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+EXPORT_SERVICES = {
+    ExportDataset.steps: step_service,
+    ExportDataset.sleep: sleep_service,
+    ExportDataset.activity: activity_service,
+    ExportDataset.test_results: test_result_service,
+}
+
+MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv; charset=utf-8",
+}
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_ndjson(columns, rows) -> str:
+    return "".join(json.dumps(dict(zip(columns, row)), default=_json_default) + "\n" for row in rows)
+
+
+class CsvEncoder:
+    """
+    Encodes chunks of rows as CSV text, reusing one buffer; the header is written with the first chunk.
+    """
+
+    def __init__(self, columns):
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+        self.writer.writerow(columns)
+
+    def encode(self, rows) -> str:
+        self.writer.writerows(rows)
+        text = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return text
+
+
+async def export_user_data(user_id: int, dataset: ExportDataset, export_format: ExportFormat, since=None):
+    """
+    Async generator of the encoded export, one chunk per server-side cursor fetch. It opens its own session:
+    the response body is produced after the endpoint returned, when request-scoped sessions may be closed.
+    """
+    service = EXPORT_SERVICES[dataset]
+    columns = service.get_column_names()
+    csv_encoder = CsvEncoder(columns) if export_format == ExportFormat.csv else None
+    async with AsyncSessionLocal() as db:
+        try:
+            async for rows in service.stream_by_user_id(db, user_id, since=since):
+                yield csv_encoder.encode(rows) if csv_encoder else encode_ndjson(columns, rows)
+        except Exception as e:
+            # Headers are already sent, so the client sees a truncated body rather than an error status
+            logging.error("Export of %s for user %s failed: %s", dataset.value, user_id, e)
+            raise
+    if csv_encoder and csv_encoder.buffer.tell():
+        yield csv_encoder.encode([])  # Nothing was streamed: the header alone
@@ -0,0 +1,67 @@
+from datetime import datetime
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.models import TestResult, DailySteps, SleepingActivity, PhysicalActivity
+from db.cruds.test_results_crud import test_result_service
+from db.cruds.daily_steps_crud import step_service
+from db.cruds.sleep_activity_crud import sleep_service
+from db.cruds.activity import activity_service
+
+
+# Compact stand-ins for the ORM rows, holding only the columns the scores need. They keep the attribute names of the
+# models, so calculate_BHI / calculate_AHS / calculate_SQS and summarize_health_data accept either form.
+
+class TestResultRecord:
+    __slots__ = ("result_value", "test_id")
+
+    def __init__(self, result_value, test_id):
+        self.result_value = result_value
+        self.test_id = test_id
+
+
+class StepRecord:
+    __slots__ = ("total_steps",)
+
+    def __init__(self, total_steps):
+        self.total_steps = total_steps
+
+
+class ActivityRecord:
+    __slots__ = ("start_time", "end_time", "calories_burned")
+
+    def __init__(self, start_time, end_time, calories_burned):
+        self.start_time = start_time
+        self.end_time = end_time
+        self.calories_burned = calories_burned
+
+
+class SleepRecord:
+    __slots__ = ("sleep_duration",)
+
+    def __init__(self, sleep_duration):
+        self.sleep_duration = sleep_duration
+
+
+async def load_test_result_records(db: AsyncSession, user_id: int, since: datetime = None) -> list:
+    # Bounds are looked up in the catalog by test_id, so `tests` is not joined
+    rows = await test_result_service.get_columns_by_user_id(
+        db, user_id, [TestResult.result_value, TestResult.test_id], since=since)
+    return [TestResultRecord(*row) for row in rows]
+
+
+async def load_step_records(db: AsyncSession, user_id: int, since: datetime = None) -> list:
+    rows = await step_service.get_columns_by_user_id(db, user_id, [DailySteps.total_steps], since=since)
+    return [StepRecord(total_steps) for (total_steps,) in rows]
+
+
+async def load_activity_records(db: AsyncSession, user_id: int, since: datetime = None) -> list:
+    rows = await activity_service.get_columns_by_user_id(
+        db, user_id, [PhysicalActivity.start_time, PhysicalActivity.end_time, PhysicalActivity.calories_burned],
+        since=since)
+    return [ActivityRecord(*row) for row in rows]
+
+
+async def load_sleep_records(db: AsyncSession, user_id: int, since: datetime = None) -> list:
+    rows = await sleep_service.get_columns_by_user_id(db, user_id, [SleepingActivity.sleep_duration], since=since)
+    return [SleepRecord(sleep_duration) for (sleep_duration,) in rows]
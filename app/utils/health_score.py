@@ -1,4 +1,8 @@
 # Health Score Calculations
+import asyncio
+import hashlib
+from datetime import date, datetime, timedelta
+
 from sqlalchemy.ext.asyncio import AsyncSession
 
 # Import Services
@@ -7,9 +11,19 @@ from db.cruds.test_results_crud import test_result_service
 from db.cruds.daily_steps_crud import step_service
 from db.cruds.sleep_activity_crud import sleep_service
 from db.cruds.activity import activity_service
+from db.cruds.stats_crud import stats_service
 from db.database import AsyncSessionLocal
 from app.utils.helper_functions import calculate_age
-from app.utils.pdf import PDFReport
+from app.utils.health_records import load_test_result_records, load_step_records, load_sleep_records, \
+    load_activity_records
+from app.utils.pdf import render_pdf_async
+from app.logger import logging
+from app.utils.cache import score_cache, report_cache
+from app.utils.catalog import catalog
+from app.utils.cohort_ranking import cohort_ranking, cohort_key
+from app.utils.score_series import DailyPrefixSums, series_cache
+from app.config import HEALTH_DATA_FETCH_MODE
+from app.utils.metrics import timed, CALCULATION_SECONDS
 
 IDEAL_SLEEP_HOURS = 8
 TARGET_STEPS = 10000
@@ -17,17 +31,21 @@ TARGET_ACTIVE_MINUTES = 60
 TARGET_CALORIES = 2500
 
 
-def calculate_BHI(test_results):
+@timed(CALCULATION_SECONDS, "calculate_BHI")
+def calculate_BHI(test_results, test_bounds: dict):
+    """
+    `test_bounds` maps test_id to (lower_bound, upper_bound), e.g. `catalog.test_bounds` once the catalog is loaded.
+    Results of tests missing from it do not count.
+    """
     if not test_results:
         return 100
 
     score = 100
     for test in test_results:
-        if not test.test or test.test.lower_bound is None or test.test.upper_bound is None:
+        lower, upper = test_bounds.get(test.test_id, (None, None))
+        if lower is None or upper is None:
             continue
 
-        lower = test.test.lower_bound
-        upper = test.test.upper_bound
         deviation = abs(test.result_value - ((lower + upper) / 2))
         if test.result_value < lower or test.result_value > upper:
             score -= deviation * 0.5
@@ -35,6 +53,15 @@ def calculate_BHI(test_results):
     return score
 
 
+@timed(CALCULATION_SECONDS, "calculate_BHI_from_deviation")
+def calculate_BHI_from_deviation(deviation_sum):
+    """
+    BHI from the summed deviation of all out-of-range results (see stats_crud.BHI_DEVIATION).
+    """
+    return 100 - deviation_sum * 0.5
+
+
+@timed(CALCULATION_SECONDS, "calculate_AHS")
 def calculate_AHS(steps, activities):
     """
     Calculates the Activity-Based Health Score (AHS).
@@ -44,8 +71,17 @@ def calculate_AHS(steps, activities):
 
     total_steps = sum([s.total_steps for s in steps]) if steps else 0
     active_minutes = sum([(a.end_time - a.start_time).total_seconds() // 60 for a in activities]) if activities else 0
-    calories_burned = sum([a.calories_burned for a in activities]) if activities else 0
+    # calories_burned is nullable; skip NULLs like SUM() does
+    calories_burned = sum([a.calories_burned or 0 for a in activities]) if activities else 0
+
+    return calculate_AHS_from_totals(total_steps, active_minutes, calories_burned)
 
+
+@timed(CALCULATION_SECONDS, "calculate_AHS_from_totals")
+def calculate_AHS_from_totals(total_steps, active_minutes, calories_burned):
+    """
+    AHS from already aggregated totals (e.g. SUMs computed by Postgres).
+    """
     # Prevent division by zero and normalize to 100
     step_score = (total_steps / TARGET_STEPS) if TARGET_STEPS else 0
     activity_score = (active_minutes / TARGET_ACTIVE_MINUTES) if TARGET_ACTIVE_MINUTES else 0
@@ -62,15 +98,25 @@ def calculate_AHS(steps, activities):
     return round(AHS, 2)  # Return rounded score
 
 
+@timed(CALCULATION_SECONDS, "calculate_SQS")
 def calculate_SQS(sleep_activities):
     if not sleep_activities:
         return 50
 
     total_sleep_hours = sum([s.sleep_duration / 60 for s in sleep_activities]) / len(sleep_activities)
-    score = 100 - (abs(IDEAL_SLEEP_HOURS - total_sleep_hours) * 10)
+    return calculate_SQS_from_average(total_sleep_hours)
+
+
+@timed(CALCULATION_SECONDS, "calculate_SQS_from_average")
+def calculate_SQS_from_average(avg_sleep_hours):
+    if avg_sleep_hours is None:
+        return 50
+
+    score = 100 - (abs(IDEAL_SLEEP_HOURS - avg_sleep_hours) * 10)
     return max(0, min(100, score))
 
 
+@timed(CALCULATION_SECONDS, "calculate_FHS")
 def calculate_FHS(BHI, AHS, SQS, weights=None):
     if weights is None:
         weights = {"BHI": 0.4, "AHS": 0.3, "SQS": 0.3}
@@ -87,16 +133,25 @@ def calculate_FHS(BHI, AHS, SQS, weights=None):
     return round(final_score, 2)
 
 
-async def fetch_user_health_data(user_id: int, db: AsyncSession):
+def window_start(days: int = None):
+    """
+    Start of a "last N days" window, or None for the whole history.
+    """
+    if days is None:
+        return None
+    return datetime.combine(date.today() - timedelta(days=days - 1), datetime.min.time())
+
+
+async def fetch_user_health_data(user_id: int, db: AsyncSession, since: datetime = None):
     user = await user_service.get_by_id(db, user_id)
     if not user:
         return None
 
     age = calculate_age(user.dob)
-    user_tests = await test_result_service.get_by_user_id(db, user_id)
-    user_steps = await step_service.get_by_user_id(db, user_id)
-    user_sleep = await sleep_service.get_by_user_id(db, user_id)
-    user_activities = await activity_service.get_by_user_id(db, user_id)
+    user_tests = await test_result_service.get_by_user_id(db, user_id, since=since)
+    user_steps = await step_service.get_by_user_id(db, user_id, since=since)
+    user_sleep = await sleep_service.get_by_user_id(db, user_id, since=since)
+    user_activities = await activity_service.get_by_user_id(db, user_id, since=since)
 
     return {
         "user": user,
@@ -108,29 +163,185 @@ async def fetch_user_health_data(user_id: int, db: AsyncSession):
     }
 
 
-async def generate_pdf_report(user_id: int):
+async def _fetch_in_own_session(fetch, obj_id: int, **kwargs):
     async with AsyncSessionLocal() as db:
-        user_data = await fetch_user_health_data(user_id, db)
+        return await fetch(db, obj_id, **kwargs)
 
-    if not user_data:
-        print(f"User ID {user_id} not found.")
-        return
 
-    user = user_data["user"]
-    BHI = calculate_BHI(user_data["test_results"])
-    AHS = calculate_AHS(user_data["steps"], user_data["activities"])
-    SQS = calculate_SQS(user_data["sleep"])
+async def fetch_user_health_data_concurrent(user_id: int, since: datetime = None):
+    """
+    Same result as `fetch_user_health_data`, but every query runs on its own pooled session,
+    so the five round trips overlap and the total latency is roughly one RTT instead of five.
+    """
+    user, user_tests, user_steps, user_sleep, user_activities = await asyncio.gather(
+        _fetch_in_own_session(user_service.get_by_id, user_id),
+        _fetch_in_own_session(test_result_service.get_by_user_id, user_id, since=since),
+        _fetch_in_own_session(step_service.get_by_user_id, user_id, since=since),
+        _fetch_in_own_session(sleep_service.get_by_user_id, user_id, since=since),
+        _fetch_in_own_session(activity_service.get_by_user_id, user_id, since=since),
+    )
+    if not user:
+        return None
+
+    return {
+        "user": user,
+        "age": calculate_age(user.dob),
+        "test_results": user_tests,
+        "steps": user_steps,
+        "sleep": user_sleep,
+        "activities": user_activities,
+    }
+
+
+async def fetch_user_health_records(user_id: int, db: AsyncSession, since: datetime = None):
+    """
+    Same shape as `fetch_user_health_data`, but the health rows are compact `__slots__` records holding only the
+    columns the scores use, read as tuples instead of hydrated ORM instances.
+    """
+    user = await user_service.get_by_id(db, user_id)
+    if not user:
+        return None
+
+    return {
+        "user": user,
+        "age": calculate_age(user.dob),
+        "test_results": await load_test_result_records(db, user_id, since),
+        "steps": await load_step_records(db, user_id, since),
+        "sleep": await load_sleep_records(db, user_id, since),
+        "activities": await load_activity_records(db, user_id, since),
+    }
+
+
+async def fetch_user_health_records_concurrent(user_id: int, since: datetime = None):
+    """
+    `fetch_user_health_records` with every query on its own pooled session.
+    """
+    user, user_tests, user_steps, user_sleep, user_activities = await asyncio.gather(
+        _fetch_in_own_session(user_service.get_by_id, user_id),
+        _fetch_in_own_session(load_test_result_records, user_id, since=since),
+        _fetch_in_own_session(load_step_records, user_id, since=since),
+        _fetch_in_own_session(load_sleep_records, user_id, since=since),
+        _fetch_in_own_session(load_activity_records, user_id, since=since),
+    )
+    if not user:
+        return None
+
+    return {
+        "user": user,
+        "age": calculate_age(user.dob),
+        "test_results": user_tests,
+        "steps": user_steps,
+        "sleep": user_sleep,
+        "activities": user_activities,
+    }
+
+
+async def fetch_user_health_summary(user_id: int, db: AsyncSession, since: datetime = None,
+                                    from_rollups: bool = False):
+    """
+    Fetches the user and their health totals aggregated by Postgres, without loading any health rows.
+    With `from_rollups` the activity and sleep totals are read from the daily rollup table.
+    """
+    summary = await stats_service.get_user_summary(db, user_id, since=since, from_rollups=from_rollups)
+    if not summary:
+        return None
+
+    user, totals = summary
+    return {"user": user, "age": calculate_age(user.dob), "totals": totals}
+
+
+def summarize_health_data(user_data: dict, test_bounds: dict) -> dict:
+    """
+    Computes the same totals as `StatsService` from rows that were already loaded (ORM rows or health records).
+    Test bounds are looked up by test_id in `test_bounds`, as in calculate_BHI.
+    """
+    sleep = user_data["sleep"]
+    deviation = 0
+    for result in user_data["test_results"]:
+        lower, upper = test_bounds.get(result.test_id, (None, None))
+        if lower is None or upper is None:
+            continue
+        if result.result_value < lower or result.result_value > upper:
+            deviation += abs(result.result_value - ((lower + upper) / 2))
+
+    return {
+        "total_steps": sum([s.total_steps for s in user_data["steps"]]),
+        "active_minutes": sum([(a.end_time - a.start_time).total_seconds() // 60 for a in user_data["activities"]]),
+        "calories_burned": sum([a.calories_burned or 0 for a in user_data["activities"]]),  # NULLs skipped, as SUM()
+        "avg_sleep_minutes": sum([s.sleep_duration for s in sleep]) / len(sleep) if sleep else None,
+        "sleep_count": len(sleep),
+        "bhi_deviation": deviation,
+    }
+
+
+@timed(CALCULATION_SECONDS, "calculate_scores")
+def calculate_scores(totals: dict) -> dict:
+    BHI = calculate_BHI_from_deviation(totals["bhi_deviation"])
+    AHS = calculate_AHS_from_totals(totals["total_steps"], totals["active_minutes"], totals["calories_burned"])
+    avg_sleep_hours = totals["avg_sleep_minutes"] / 60 if totals["avg_sleep_minutes"] is not None else None
+    SQS = calculate_SQS_from_average(avg_sleep_hours)
     FHS = calculate_FHS(BHI, AHS, SQS)
+    return {"BHI": BHI, "AHS": AHS, "SQS": SQS, "FHS": FHS}
+
+
+async def load_report_data(user_id: int, days: int = None):
+    """
+    Loads the user and their health totals (of the last `days` days, or all history) using the configured
+    HEALTH_DATA_FETCH_MODE.
+    """
+    since = window_start(days)
+    if HEALTH_DATA_FETCH_MODE in ("summary", "rollup"):
+        async with AsyncSessionLocal() as db:
+            return await fetch_user_health_summary(user_id, db, since=since,
+                                                   from_rollups=HEALTH_DATA_FETCH_MODE == "rollup")
+
+    if HEALTH_DATA_FETCH_MODE == "sequential":
+        async with AsyncSessionLocal() as db:
+            user_data = await fetch_user_health_records(user_id, db, since=since)
+    else:
+        user_data = await fetch_user_health_records_concurrent(user_id, since=since)
 
-    pdf = PDFReport()
-    pdf.add_page()
+    if not user_data:
+        return None
+    await catalog.ensure_fresh()
+    return {"user": user_data["user"], "age": user_data["age"],
+            "totals": summarize_health_data(user_data, catalog.test_bounds)}
 
-    pdf.add_section("User Details",
-                    f"Name: {user.first_name} {user.last_name}\n"
-                    f"Age: {user_data['age']}\n"
-                    f"Gender: {str(user.gender).split('.')[-1]}\n"
-                    f"Height: {user.height} cm\n"
-                    f"Weight: {user.weight} kg")
+
+async def get_user_scores(user_id: int, version: str = None, days: int = None):
+    """
+    Returns the report data plus BHI/AHS/SQS/FHS for a user (over the last `days` days, or all history), served
+    from `score_cache` when the user's data has not been written since the scores were computed. When `version`
+    is given, a cached entry computed for another data version is ignored. Scores computed while a write invalidated
+    the user are returned but not cached.
+    """
+    generation = score_cache.generation(user_id)
+    # One cache entry per user holding every window, so a write invalidates all of them at once
+    windows = score_cache.get(user_id) or {}
+    cached = windows.get(days)
+    if cached is not None and (version is None or cached.get("version") == version):
+        return cached
+
+    report_data = await load_report_data(user_id, days)
+    if not report_data:
+        return None
+
+    report_data["scores"] = calculate_scores(report_data["totals"])
+    report_data["version"] = version
+    report_data["days"] = days
+    windows = {**windows, days: report_data}
+    score_cache.set(user_id, windows, generation)
+    return report_data
+
+
+def build_report_sections(report_data: dict) -> list:
+    """
+    Builds the (title, text) sections of the health report from already computed report data.
+    """
+    user = report_data["user"]
+    totals = report_data["totals"]
+    scores = report_data["scores"]
+    BHI, AHS, SQS, FHS = scores["BHI"], scores["AHS"], scores["SQS"], scores["FHS"]
 
     if BHI < 0:
         warning = "🚨 Severe health issues detected! Seek medical attention."
@@ -139,23 +350,132 @@ async def generate_pdf_report(user_id: int):
     else:
         warning = "✅ Health biometrics within a good range."
 
-    pdf.add_section("Test Results", warning)
-    pdf.add_section("Daily Activity",
-                    f"Total Steps: {sum([s.total_steps for s in user_data['steps']])}\n"
-                    f"Active Minutes: {sum([(a.end_time - a.start_time).total_seconds() // 60 for a in user_data['activities']])}\n"
-                    f"Calories Burned: {sum([a.calories_burned for a in user_data['activities']])}")
-
-    avg_sleep = sum([s.sleep_duration for s in user_data["sleep"]]) / len(user_data["sleep"]) if user_data[
-        "sleep"] else "N/A"
-    pdf.add_section("Sleep Data",
-                    f"Average Sleep Duration: {avg_sleep} hours")
-
-    pdf.add_section("Health Scores",
-                    f"BHI: {BHI:.2f}\n"
-                    f"AHS: {AHS:.2f}\n"
-                    f"SQS: {SQS:.2f}\n"
-                    f"Final Health Score (FHS): {FHS:.2f}")
-
-    file_path = f"health_report_user_{user_id}.pdf"
-    pdf.output(file_path)
-    print(f"Report saved as {file_path}")
+    avg_sleep = totals["avg_sleep_minutes"] if totals["avg_sleep_minutes"] is not None else "N/A"
+    period = f"Last {report_data['days']} days" if report_data.get("days") else "All recorded history"
+
+    sections = [
+        ("User Details",
+         f"Name: {user.first_name} {user.last_name}\n"
+         f"Age: {report_data['age']}\n"
+         f"Gender: {str(user.gender).split('.')[-1]}\n"
+         f"Height: {user.height} cm\n"
+         f"Weight: {user.weight} kg"),
+        ("Test Results", warning),
+        ("Daily Activity",
+         f"Total Steps: {totals['total_steps']}\n"
+         f"Active Minutes: {totals['active_minutes']}\n"
+         f"Calories Burned: {totals['calories_burned']}"),
+        ("Sleep Data",
+         f"Average Sleep Duration: {avg_sleep} hours"),
+        ("Health Scores",
+         f"Period: {period}\n"
+         f"BHI: {BHI:.2f}\n"
+         f"AHS: {AHS:.2f}\n"
+         f"SQS: {SQS:.2f}\n"
+         f"Final Health Score (FHS): {FHS:.2f}"),
+    ]
+
+    ranking = report_data.get("ranking")
+    if ranking:
+        band, gender = ranking["cohort"]
+        sections.append(
+            ("Peer Comparison",
+             f"Cohort: {gender}, age {band} ({ranking['peers']} users)\n"
+             f"FHS percentile: {ranking['percentile']:.1f} "
+             f"(scores higher than {ranking['percentile']:.0f}% of peers)"))
+    return sections
+
+
+async def generate_pdf_report(user_id: int, version: str = None, days: int = None):
+    """
+    Generates the health report of a user and returns it as PDF bytes, or None if the user does not exist.
+    Rendering runs in the report render pool, off the event loop.
+    """
+    report_data = await get_user_scores(user_id, version, days)
+
+    if not report_data:
+        logging.warning("User ID %s not found.", user_id)
+        return None
+
+    if days is None:
+        report_data = {**report_data, "ranking": await rank_in_cohort(user_id, report_data)}
+    return await render_pdf_async(build_report_sections(report_data))
+
+
+async def rank_in_cohort(user_id: int, report_data: dict):
+    """
+    FHS percentile of the user among same age band / gender users, against the stored cohort ranking with the
+    user's own entry replaced by their current score. None before the first build or when the cohort is too small.
+    """
+    async with AsyncSessionLocal() as db:
+        await cohort_ranking.ensure_current(db)
+    key = cohort_key(report_data["age"], report_data["user"].gender)
+    ranking = cohort_ranking.rank(key, report_data["scores"]["FHS"], user_id)
+    return {**ranking, "cohort": key} if ranking else None
+
+
+async def get_score_series(db: AsyncSession, user_id: int, window: int, days: int) -> list:
+    """
+    Daily series of the `window`-day rolling AHS, SQS and BHI (None without test results in the window) for the
+    last `days` days. Each point is what a `window`-day report ending that day would show. Built from the user's
+    cached DailyPrefixSums, extended with only the days not cached yet, so the cost is O(days) after one fetch.
+    """
+    today = date.today()
+    first_day = today - timedelta(days=days - 1)
+    need_start = first_day - timedelta(days=window - 1)
+
+    await catalog.ensure_fresh()  # BHI deviations depend on the test bounds; a new version clears series_cache
+    sums = series_cache.get(user_id)
+    if sums is None or sums.start > need_start:
+        sums = DailyPrefixSums(need_start)
+        # Only set on creation: the TTL bounds the age of the whole entry, which a read must not extend
+        series_cache.set(user_id, sums)
+    while sums.end <= today:
+        generation, since = sums.generation, sums.end
+        daily = await stats_service.get_daily_totals(db, user_id, datetime.combine(since, datetime.min.time()),
+                                                     datetime.combine(today + timedelta(days=1), datetime.min.time()))
+        if sums.generation == generation and sums.end == since:  # Not truncated or extended meanwhile
+            sums.extend(daily, today)
+
+    series = []
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        totals = sums.window(day, window)
+        avg_sleep_hours = totals["sleep_minutes"] / totals["sleep_count"] / 60 if totals["sleep_count"] else None
+        series.append({
+            "date": day,
+            "AHS": calculate_AHS_from_totals(totals["total_steps"], totals["active_minutes"],
+                                             totals["calories_burned"]),
+            "SQS": calculate_SQS_from_average(avg_sleep_hours),
+            "BHI": calculate_BHI_from_deviation(totals["bhi_deviation"]) if totals["result_count"] else None,
+        })
+    return series
+
+
+async def get_report_etag(db: AsyncSession, user_id: int, days: int = None):
+    """
+    ETag of the user's current report: changes whenever the underlying data (see get_data_version), the test
+    bounds or the date (age is part of the report) changes, and for all-history reports
+    (which show the peer percentile) whenever a new cohort ranking build is stored. Returns None if the user does
+    not exist.
+    """
+    version = await stats_service.get_data_version(db, user_id)
+    if version is None:
+        return None
+
+    await catalog.ensure_fresh()
+    ranking = await cohort_ranking.get_version(db) if days is None else "-"
+    fingerprint = f"{user_id}|{days}|{version}|{catalog.version}|{ranking}|{date.today()}"
+    return '"' + hashlib.sha1(fingerprint.encode()).hexdigest() + '"'
+
+
+async def get_cached_pdf_report(user_id: int, etag: str, days: int = None):
+    """
+    Returns the rendered report for this ETag from `report_cache`, rendering it only on a miss.
+    """
+    pdf_bytes = report_cache.get(etag)
+    if pdf_bytes is None:
+        pdf_bytes = await generate_pdf_report(user_id, version=etag, days=days)
+        if pdf_bytes is not None:
+            report_cache.set(etag, pdf_bytes)
+    return pdf_bytes
@@ -0,0 +1,187 @@
+# Vectorized (population-wide) Health Score Calculations
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import select, any_, bindparam, Integer
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.models import User, TestResult, DailySteps, SleepingActivity, PhysicalActivity
+from app.utils.health_score import IDEAL_SLEEP_HOURS, TARGET_STEPS, TARGET_ACTIVE_MINUTES, TARGET_CALORIES
+from app.utils.catalog import catalog
+
+# Every batch_* function takes `user_idx`, the position (0..n_users-1) of the row's user in the cohort,
+# and reduces rows per user with np.bincount. bincount accumulates weights in input order, so each
+# user's rows are summed in the same order as the `sum()` calls in app/utils/health_score.py and the
+# results match the scalar functions for the same row order.
+
+
+def index_users(user_ids: np.ndarray, row_user_ids):
+    """
+    Maps each row's user_id to the position of that user in the sorted `user_ids` array. Also returns the mask of
+    the rows whose user is in `user_ids`: searchsorted puts any other user (e.g. one created between the query of
+    the cohort and the query of its rows) on a neighbour's position, or one past the end.
+    """
+    row_user_ids = np.asarray(row_user_ids, dtype=np.int64)
+    user_idx = np.searchsorted(user_ids, row_user_ids)
+    known = user_idx < len(user_ids)
+    known[known] = user_ids[user_idx[known]] == row_user_ids[known]
+    return user_idx, known
+
+
+def _cohort_rows(user_ids: np.ndarray, columns) -> list:
+    """
+    (user_idx, *other columns) of the rows of cohort users, in their original order.
+    """
+    user_idx, known = index_users(user_ids, columns[0])
+    return [user_idx[known], *(np.asarray(column)[known] for column in columns[1:])]
+
+
+def _round2(values: np.ndarray) -> np.ndarray:
+    # Python's round() rather than np.round so the result is identical to the scalar path
+    return np.array([round(v, 2) for v in values.tolist()], dtype=np.float64)
+
+
+def batch_BHI(n_users: int, user_idx, result_values, lower_bounds, upper_bounds) -> np.ndarray:
+    """
+    Blood Health Index for every user in the cohort. NaN bounds are skipped like a missing `Test`.
+    """
+    values = np.asarray(result_values, dtype=np.float64)
+    lower = np.asarray(lower_bounds, dtype=np.float64)
+    upper = np.asarray(upper_bounds, dtype=np.float64)
+
+    deviation = np.abs(values - ((lower + upper) / 2))
+    out_of_range = ((values < lower) | (values > upper)) & ~(np.isnan(lower) | np.isnan(upper))
+
+    # Seed every user with 100 ahead of their deviations so the subtraction order matches `score -= ...`
+    user_idx = np.asarray(user_idx)[out_of_range]
+    return np.bincount(
+        np.concatenate([np.arange(n_users), user_idx]),
+        weights=np.concatenate([np.full(n_users, 100.0), -(deviation[out_of_range] * 0.5)]),
+        minlength=n_users,
+    )
+
+
+def batch_AHS(n_users: int, step_user_idx, total_steps,
+              activity_user_idx, start_times, end_times, calories_burned) -> np.ndarray:
+    """
+    Activity-Based Health Score for every user in the cohort.
+    `start_times`/`end_times` are datetime64 arrays. NULL (None / NaN) calories count as 0, like SUM() skipping them.
+    """
+    steps = np.bincount(step_user_idx, weights=np.asarray(total_steps, dtype=np.float64), minlength=n_users)
+
+    seconds = (np.asarray(end_times, dtype="datetime64[us]") - np.asarray(start_times, dtype="datetime64[us]")) \
+        / np.timedelta64(1, "s")
+    active_minutes = np.bincount(activity_user_idx, weights=seconds // 60, minlength=n_users)
+    calories = np.bincount(activity_user_idx, weights=np.nan_to_num(np.asarray(calories_burned, dtype=np.float64)),
+                           minlength=n_users)
+
+    step_score = np.minimum(1, steps / TARGET_STEPS)
+    activity_score = np.minimum(1, active_minutes / TARGET_ACTIVE_MINUTES)
+    calorie_score = np.minimum(1, calories / TARGET_CALORIES)
+
+    return _round2((step_score * 40) + (activity_score * 30) + (calorie_score * 30))
+
+
+def batch_SQS(n_users: int, user_idx, sleep_durations) -> np.ndarray:
+    """
+    Sleep Quality Score for every user in the cohort. Users without sleep records score 50.
+    """
+    counts = np.bincount(user_idx, minlength=n_users)
+    hours = np.bincount(user_idx, weights=np.asarray(sleep_durations, dtype=np.float64) / 60, minlength=n_users)
+
+    has_sleep = counts > 0
+    scores = np.full(n_users, 50.0)
+    avg_hours = hours[has_sleep] / counts[has_sleep]
+    scores[has_sleep] = np.clip(100 - (np.abs(IDEAL_SLEEP_HOURS - avg_hours) * 10), 0, 100)
+    return scores
+
+
+def batch_FHS(BHI: np.ndarray, AHS: np.ndarray, SQS: np.ndarray, weights=None) -> np.ndarray:
+    if weights is None:
+        weights = {"BHI": 0.4, "AHS": 0.3, "SQS": 0.3}
+
+    total_weight = sum(weights.values())
+    if total_weight != 1:
+        weights = {key: value / total_weight for key, value in weights.items()}
+
+    return _round2(weights["BHI"] * BHI + weights["AHS"] * AHS + weights["SQS"] * SQS)
+
+
+def score_population(user_ids, test_results, steps, activities, sleep) -> dict:
+    """
+    Scores a whole cohort from columnar arrays.
+
+    - user_ids: sorted unique user ids of the cohort
+    - test_results: (user_id, result_value, lower_bound, upper_bound)
+    - steps: (user_id, total_steps)
+    - activities: (user_id, start_time, end_time, calories_burned)
+    - sleep: (user_id, sleep_duration)
+
+    Returns a dict of arrays aligned with `user_ids`. Rows of users missing from `user_ids` are ignored.
+    """
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    n_users = len(user_ids)
+
+    BHI = batch_BHI(n_users, *_cohort_rows(user_ids, test_results))
+    AHS = batch_AHS(n_users, *_cohort_rows(user_ids, steps), *_cohort_rows(user_ids, activities))
+    SQS = batch_SQS(n_users, *_cohort_rows(user_ids, sleep))
+    FHS = batch_FHS(BHI, AHS, SQS)
+
+    return {"user_id": user_ids, "BHI": BHI, "AHS": AHS, "SQS": SQS, "FHS": FHS}
+
+
+def lookup_bounds(test_bounds: dict, test_ids):
+    """
+    (lower, upper) arrays aligned with `test_ids`, NaN where a test is unknown (e.g. created after the catalog was
+    loaded) or has no bound, which batch_BHI skips.
+    """
+    size = max(test_bounds, default=0) + 2  # The last slot stays NaN and absorbs unknown ids
+    lower, upper = np.full(size, np.nan), np.full(size, np.nan)
+    for test_id, (lower_bound, upper_bound) in test_bounds.items():
+        lower[test_id] = np.nan if lower_bound is None else lower_bound
+        upper[test_id] = np.nan if upper_bound is None else upper_bound
+    index = np.asarray(test_ids, dtype=np.int64)
+    index = np.where((index >= 0) & (index < size), index, size - 1)
+    return lower[index], upper[index]
+
+
+async def _fetch_columns(db: AsyncSession, query, user_ids, user_id_column, date_column=None,
+                         since: datetime = None) -> list:
+    if user_ids is not None:
+        # One array parameter instead of one per id, so any roster size is the same prepared statement
+        query = query.where(user_id_column == any_(bindparam("user_ids", list(user_ids), type_=ARRAY(Integer))))
+    if since is not None:
+        query = query.where(date_column >= since)
+    result = await db.execute(query)
+    rows = result.all()
+    # Transpose rows into one tuple per column, keeping empty results shaped correctly
+    return [list(column) for column in zip(*rows)] or [[] for _ in query.selected_columns]
+
+
+async def score_cohort(db: AsyncSession, user_ids=None, since: datetime = None) -> dict:
+    """
+    Cohort scoring entry point: loads only the columns the scores need for `user_ids`
+    (or every user), from `since` on if given, with one query per table and scores them in one vectorized pass.
+    Unknown ids are left out of the result.
+    """
+    (cohort,) = await _fetch_columns(db, select(User.user_id).order_by(User.user_id), user_ids, User.user_id)
+
+    await catalog.ensure_fresh()
+    result_users, result_values, test_ids = await _fetch_columns(
+        db, select(TestResult.user_id, TestResult.result_value, TestResult.test_id), user_ids, TestResult.user_id,
+        TestResult.test_date, since)
+    results = [result_users, result_values, *lookup_bounds(catalog.test_bounds, test_ids)]
+    steps = await _fetch_columns(db, select(DailySteps.user_id, DailySteps.total_steps), user_ids,
+                                 DailySteps.user_id, DailySteps.date, since)
+    activities = await _fetch_columns(
+        db,
+        select(PhysicalActivity.user_id, PhysicalActivity.start_time, PhysicalActivity.end_time,
+               PhysicalActivity.calories_burned),
+        user_ids, PhysicalActivity.user_id, PhysicalActivity.start_time, since)
+    sleep = await _fetch_columns(db, select(SleepingActivity.user_id, SleepingActivity.sleep_duration), user_ids,
+                                 SleepingActivity.user_id, SleepingActivity.sleep_date, since)
+
+    activities[1] = np.array(activities[1], dtype="datetime64[us]")
+    activities[2] = np.array(activities[2], dtype="datetime64[us]")
+    return score_population(cohort, results, steps, activities, sleep)
@@ -1,7 +1,25 @@
 # Utility function to calculate age from DOB
+import math
 from datetime import date
 
 
 def calculate_age(dob: date) -> int:
     today = date.today()
     return today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+
+
+# Date `years` years before today (Feb 29 falls back to Feb 28), used for age-based cohort filters
+def years_ago(years: int) -> date:
+    today = date.today()
+    try:
+        return today.replace(year=today.year - years)
+    except ValueError:
+        return today.replace(year=today.year - years, day=28)
+
+
+# Nearest-rank percentile of an already sorted list, q in [0, 100]
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
@@ -0,0 +1,168 @@
+import asyncio
+import time
+from datetime import date, datetime
+
+from sqlalchemy import select
+
+from app.config import INGEST_QUEUE_MAX_ROWS, INGEST_BATCH_SIZE, INGEST_FLUSH_INTERVAL_MS, INGEST_WORKERS
+from app.logger import logging
+from app.utils.catalog import catalog
+from db import database
+from db.database import AsyncSessionLocal
+from db.models import User
+from db.cruds.daily_steps_crud import step_service
+from db.cruds.sleep_activity_crud import sleep_service
+from db.cruds.activity import activity_service
+
+INGEST_SERVICES = {
+    "steps": step_service,
+    "sleep": sleep_service,
+    "activities": activity_service,
+}
+
+# Unique (user_id, source_id) indexes the upserts use as their ON CONFLICT target
+CONFLICT_INDEXES = {index.name for service in INGEST_SERVICES.values()
+                    for index in service.model.__table__.indexes if index.unique}
+
+
+def missing_conflict_indexes() -> set:
+    """
+    Conflict indexes the schema sync could not build; every upsert into their table fails until they exist.
+    """
+    return CONFLICT_INDEXES & database.unbuilt_indexes
+
+
+def to_row(sample: dict) -> dict:
+    # The date columns are timestamps; a plain date means midnight, so a day's samples share one conflict key
+    return {key: datetime.combine(value, datetime.min.time())
+            if isinstance(value, date) and not isinstance(value, datetime) else value
+            for key, value in sample.items()}
+
+
+class IngestionQueue:
+    """
+    Buffers ingested rows and writes them in micro-batches: each worker takes up to `batch_size` queued rows (waiting
+    at most `flush_interval` seconds to fill a batch) and upserts them with one transaction per dataset.
+    A request is only accepted whole and only while the queue has room for all of its rows, which pushes back on
+    clients during sync bursts instead of growing memory.
+    """
+
+    def __init__(self, max_rows: int, batch_size: int, flush_interval: float, workers: int):
+        self.max_rows = max_rows
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.workers = workers
+        self.queue = None
+        self._tasks = []
+        self.accepted = 0
+        self.rejected_requests = 0
+        self.written = 0
+        self.dropped = 0  # Rows of unknown users / activity types
+        self.failed = 0
+        self.flushes = 0
+        self.flush_seconds = 0.0
+
+    def start(self):
+        self.queue = asyncio.Queue(self.max_rows)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10.0):
+        """
+        Flushes what is queued (for at most `timeout` seconds), then stops the workers.
+        """
+        if self.queue is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logging.warning("Stopping ingestion with %s rows still queued.", self.queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def submit(self, rows) -> bool:
+        """
+        Queues (dataset, row) pairs. Returns False, queuing nothing, if they do not all fit.
+        """
+        if self.queue is None or self.queue.qsize() + len(rows) > self.max_rows:
+            self.rejected_requests += 1
+            return False
+        for item in rows:
+            self.queue.put_nowait(item)
+        self.accepted += len(rows)
+        return True
+
+    async def _next_batch(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _worker(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                logging.error("Ingestion flush of %s rows failed: %s", len(batch), e)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _flush(self, batch: list):
+        start = time.perf_counter()
+        by_dataset = {}
+        for dataset, row in batch:
+            by_dataset.setdefault(dataset, []).append(row)
+
+        async with AsyncSessionLocal() as db:
+            user_ids = {row["user_id"] for _, row in batch}
+            known_users = set((await db.execute(select(User.user_id).where(User.user_id.in_(user_ids)))).scalars())
+            await catalog.ensure_fresh()
+
+            for dataset, rows in by_dataset.items():
+                service = INGEST_SERVICES[dataset]
+                valid = [row for row in rows if row["user_id"] in known_users and
+                         (dataset != "activities" or row["activity_type_id"] in catalog.activity_types)]
+                self.dropped += len(rows) - len(valid)
+
+                # Last sample per (user_id, source_id) wins; sorted so concurrent workers lock rows in the same order
+                latest = {(row["user_id"], row["source_id"]): row for row in valid}
+                rows = [latest[key] for key in sorted(latest)]
+                written = await service.upsert(db, rows)
+                self.written += written
+                self.failed += len(rows) - written
+
+        self.flushes += 1
+        self.flush_seconds += time.perf_counter() - start
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "max_rows": self.max_rows,
+            "accepted": self.accepted,
+            "rejected_requests": self.rejected_requests,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "flushes": self.flushes,
+            "avg_flush_ms": round(1000 * self.flush_seconds / self.flushes, 2) if self.flushes else 0.0,
+        }
+
+
+ingestion_queue = IngestionQueue(INGEST_QUEUE_MAX_ROWS, INGEST_BATCH_SIZE, INGEST_FLUSH_INTERVAL_MS / 1000,
+                                 INGEST_WORKERS)
@@ -0,0 +1,211 @@
+import time
+from bisect import bisect_left
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from app.config import METRICS_ENABLED
+
+# Latency buckets in seconds, from sub-millisecond scoring up to slow report requests
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # One slot per bucket plus +Inf, made cumulative when rendered
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram:
+    """
+    Prometheus histogram with labels. Children are created once per label combination and cached, so an
+    observation costs a dict lookup, a bisect and three additions.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._children = {}
+
+    def labels(self, *values) -> _HistogramChild:
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = _HistogramChild(self.buckets)
+        return child
+
+    def observe(self, value: float, *values):
+        self.labels(*values).observe(value)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), child.counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {child.sum}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class Counter:
+    """
+    Prometheus counter with labels.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def inc(self, *values, amount: float = 1):
+        self._values[values] = self._values.get(values, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for values, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {value}")
+        return lines
+
+
+class StatsGauges:
+    """
+    Exposes the numeric fields of an existing stats() dict (caches, connection pool) as gauges, read at scrape time.
+    """
+
+    def __init__(self, prefix: str, documentation: str, stats):
+        self.prefix = prefix
+        self.documentation = documentation
+        self.stats = stats
+
+    def render(self) -> list:
+        lines = []
+        for key, value in self.stats().items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"{self.prefix}_{key}"
+            lines += [f"# HELP {name} {self.documentation}: {key}", f"# TYPE {name} gauge", f"{name} {value}"]
+        return lines
+
+
+_registry = []
+
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+HTTP_REQUEST_SECONDS = register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status")))
+DB_OPERATION_SECONDS = register(Histogram(
+    "db_operation_duration_seconds", "BaseService method latency", ("model", "operation")))
+DB_OPERATION_ERRORS = register(Counter(
+    "db_operation_errors_total", "BaseService methods that raised", ("model", "operation")))
+CALCULATION_SECONDS = register(Histogram(
+    "health_score_calculation_duration_seconds", "calculate_* latency", ("function",)))
+REPORT_RENDER_SECONDS = register(Histogram(
+    "report_render_duration_seconds", "PDF rendering latency including the wait for a render worker"))
+
+
+def timed(histogram: Histogram, *values):
+    """
+    Decorator recording the duration of a sync or async function in `histogram` under fixed label values.
+    Returns the function unchanged when METRICS_ENABLED is off.
+    """
+    def decorator(fn):
+        if not METRICS_ENABLED:
+            return fn
+        child = histogram.labels(*values)
+
+        if iscoroutinefunction(fn):
+            @wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    child.observe(time.perf_counter() - start)
+            return async_wrapper
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def timed_db_operation(method):
+    """
+    Decorator for async service methods: records their latency per model (or service class, for services without
+    a model) and operation, and counts exceptions.
+    """
+    if not METRICS_ENABLED:
+        return method
+    operation = method.__name__
+
+    @wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        model = self.model.__name__ if hasattr(self, "model") else type(self).__name__
+        try:
+            return await method(self, *args, **kwargs)
+        except Exception:
+            DB_OPERATION_ERRORS.inc(model, operation)
+            raise
+        finally:
+            DB_OPERATION_SECONDS.observe(time.perf_counter() - start, model, operation)
+    return wrapper
+
+
+async def metrics_middleware(request, call_next):
+    """
+    HTTP middleware recording request latency labelled by route template (not the raw path, to bound cardinality).
+    """
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, request.method,
+                                     route.path if route is not None else "unmatched", str(status))
@@ -1,12 +1,23 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
 from fpdf import FPDF
 
+from app.config import REPORT_RENDER_POOL, REPORT_RENDER_WORKERS
+from app.utils.metrics import timed, REPORT_RENDER_SECONDS
+
+# The core fonts only cover latin-1, so emoji markers are replaced with plain words before rendering
+EMOJI_REPLACEMENTS = {"🚨": "Warning:", "⚠️": "Caution:", "✅": "OK:"}
+
+
 class PDFReport(FPDF):
     def header(self):
         self.set_font("Arial", "B", 16)
         self.cell(200, 10, "Health Report", ln=True, align="C")
 
     def add_section(self, title, text):
-        text = text.replace("🚨", "Warning:")
+        for emoji, replacement in EMOJI_REPLACEMENTS.items():
+            text = text.replace(emoji, replacement)
         self.set_font("Arial", "B", 14)
         self.cell(200, 10, title, ln=True, align="L")
         self.set_font("Arial", "", 12)
@@ -14,3 +25,42 @@ class PDFReport(FPDF):
         self.ln(5)
 
 
+def render_pdf(sections) -> bytes:
+    """
+    Renders a report from (title, text) sections into PDF bytes, without touching the disk.
+    Takes only plain data so it can run in a worker process.
+    """
+    pdf = PDFReport()
+    pdf.add_page()
+    for title, text in sections:
+        pdf.add_section(title, text)
+
+    output = pdf.output(dest="S")
+    return output.encode("latin-1") if isinstance(output, str) else bytes(output)
+
+
+_render_pool = None
+
+
+def get_render_pool():
+    global _render_pool
+    if _render_pool is None:
+        pool_class = ThreadPoolExecutor if REPORT_RENDER_POOL == "thread" else ProcessPoolExecutor
+        _render_pool = pool_class(max_workers=REPORT_RENDER_WORKERS)
+    return _render_pool
+
+
+@timed(REPORT_RENDER_SECONDS)
+async def render_pdf_async(sections) -> bytes:
+    """
+    Renders the report in the render pool so the event loop keeps serving other requests meanwhile.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_render_pool(), render_pdf, sections)
+
+
+def shutdown_render_pool():
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=True)
+        _render_pool = None
@@ -0,0 +1,81 @@
+from datetime import date, datetime, timedelta
+
+from app.config import SCORE_CACHE_MAX_SIZE, SCORE_CACHE_TTL_SECONDS
+from app.utils.cache import TTLCache
+from db.cruds.stats_crud import DAILY_TOTAL_FIELDS
+
+_ZERO = (0,) * len(DAILY_TOTAL_FIELDS)
+
+
+class DailyPrefixSums:
+    """
+    Running totals of a user's days from `start`: prefix[i] holds the sums of DAILY_TOTAL_FIELDS over the first i
+    days, so the totals of any window are one subtraction. Appending a day is O(1), and a write only drops the
+    days from the written date on, which are the only ones refetched.
+    """
+    __slots__ = ("start", "prefix", "generation")
+
+    def __init__(self, start: date):
+        self.start = start
+        self.prefix = [_ZERO]
+        self.generation = 0  # Bumped by truncate, so a fetch that raced a write is not appended
+
+    @property
+    def end(self) -> date:
+        """
+        First day not covered yet.
+        """
+        return self.start + timedelta(days=len(self.prefix) - 1)
+
+    def append(self, totals: tuple):
+        last = self.prefix[-1]
+        self.prefix.append(tuple(a + b for a, b in zip(last, totals)))
+
+    def extend(self, daily: dict, through: date):
+        """
+        Appends every day from `end` to `through` from {day: totals}, days without data counting as zero.
+        """
+        day = self.end
+        while day <= through:
+            self.append(daily.get(day, _ZERO))
+            day += timedelta(days=1)
+
+    def truncate(self, day: date):
+        """
+        Forgets `day` and every later day.
+        """
+        keep = max(1, (day - self.start).days + 1)
+        if keep < len(self.prefix):
+            del self.prefix[keep:]
+            self.generation += 1
+
+    def window(self, day: date, size: int) -> dict:
+        """
+        Totals of the `size` days ending with `day` (inclusive).
+        """
+        i = (day - self.start).days + 1
+        first, last = self.prefix[max(0, i - size)], self.prefix[i]
+        return dict(zip(DAILY_TOTAL_FIELDS, (b - a for a, b in zip(first, last))))
+
+
+# DailyPrefixSums per user_id. Kept current by on_write in this process and cleared when the test bounds change;
+# the TTL, counted from creation, bounds staleness from other processes
+series_cache = TTLCache(SCORE_CACHE_MAX_SIZE, SCORE_CACHE_TTL_SECONDS)
+
+
+async def on_write(db, keys):
+    """
+    Write hook of the steps / sleep / activity / test result services: drops the cached days from the earliest
+    written date of each user on. The rollups are refreshed in the writer's transaction, so the refetch sees them.
+    """
+    earliest = {}
+    for user_id, value in keys:
+        if user_id is None or value is None:
+            continue
+        day = value.date() if isinstance(value, datetime) else value
+        earliest[user_id] = min(day, earliest.get(user_id, day))
+
+    for user_id, day in earliest.items():
+        sums = series_cache.get(user_id)
+        if sums is not None:
+            sums.truncate(day)
@@ -0,0 +1,97 @@
+import sys
+import os
+
+# Ensure Python finds `app/` and `db/` as modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete
+from app.logger import logging
+from db.database import AsyncSessionLocal, engine
+from db.models import DailySteps
+from db.cruds.daily_steps_crud import step_service
+
+# Benchmark rows are dated far in the future so they can be removed without touching real data
+BENCH_START_DATE = datetime(2100, 1, 1)
+
+
+def make_rows(user_id: int, count: int) -> list:
+    rng = random.Random(42)
+    return [
+        {
+            "user_id": user_id,
+            "date": BENCH_START_DATE + timedelta(days=i),
+            "total_steps": rng.randint(0, 20000),
+            "total_calories_burned": round(rng.uniform(100, 900), 2),
+            "distance_walked_km": round(rng.uniform(0, 15), 2),
+            "active_minutes": rng.randint(0, 180),
+        }
+        for i in range(count)
+    ]
+
+
+async def add_all_and_refresh(db, rows):
+    """
+    The previous bulk_create implementation: add_all, commit, then one SELECT per row.
+    """
+    objs = [DailySteps(**row) for row in rows]
+    db.add_all(objs)
+    await db.commit()
+    for obj in objs:
+        await db.refresh(obj)
+    return objs
+
+
+async def insert_returning_objects(db, rows):
+    return await step_service.bulk_create(db, rows)
+
+
+async def insert_returning_keys(db, rows):
+    return await step_service.bulk_create(db, rows, return_objects=False)
+
+
+async def copy_records(db, rows):
+    return await step_service.bulk_copy(db, rows)
+
+
+async def cleanup():
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(DailySteps).where(DailySteps.date >= BENCH_START_DATE))
+        await db.commit()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Rows per second of the BaseService bulk insert paths.")
+    parser.add_argument("--user-id", type=int, default=1)
+    parser.add_argument("--rows", type=int, default=10000)
+    args = parser.parse_args()
+
+    engine.echo = False
+    logging.getLogger().setLevel(logging.WARNING)
+
+    modes = [
+        ("add_all + refresh", add_all_and_refresh),
+        ("INSERT RETURNING objects", insert_returning_objects),
+        ("INSERT RETURNING keys", insert_returning_keys),
+        ("COPY", copy_records),
+    ]
+    await cleanup()
+    for name, insert_rows in modes:
+        rows = make_rows(args.user_id, args.rows)
+        async with AsyncSessionLocal() as db:
+            start = time.perf_counter()
+            await insert_rows(db, rows)
+            elapsed = time.perf_counter() - start
+        await cleanup()
+        print(f"{name:<26} {args.rows / elapsed:12,.0f} rows/s  ({elapsed:.3f} s)")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+import sys
+import os
+
+# Ensure Python finds `app/` and `db/` as modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import text
+from app.logger import logging
+from db.database import AsyncSessionLocal, engine
+from app.utils.health_score import fetch_user_health_data, fetch_user_health_data_concurrent
+
+
+async def warm_pool(connections: int):
+    """
+    Opens `connections` sessions at once so the pool already holds them before timing starts.
+    """
+    async def ping():
+        async with AsyncSessionLocal() as db:
+            await db.execute(text("SELECT 1"))
+
+    await asyncio.gather(*[ping() for _ in range(connections)])
+
+
+async def fetch_sequential(user_id: int):
+    async with AsyncSessionLocal() as db:
+        return await fetch_user_health_data(user_id, db)
+
+
+async def time_mode(fetch, user_id: int, iterations: int) -> list:
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await fetch(user_id)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def summarize(name: str, timings: list):
+    timings = sorted(timings)
+    p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+    print(f"{name:<12} mean={statistics.mean(timings):8.2f} ms  "
+          f"p50={statistics.median(timings):8.2f} ms  p95={p95:8.2f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compare sequential vs concurrent fetch_user_health_data latency.")
+    parser.add_argument("--user-id", type=int, default=1)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    args = parser.parse_args()
+
+    engine.echo = False
+    logging.getLogger().setLevel(logging.WARNING)
+
+    await warm_pool(5)
+    # Untimed runs so statement caches and the identity of pooled connections are settled
+    await time_mode(fetch_sequential, args.user_id, args.warmup)
+    await time_mode(fetch_user_health_data_concurrent, args.user_id, args.warmup)
+
+    sequential = await time_mode(fetch_sequential, args.user_id, args.iterations)
+    concurrent = await time_mode(fetch_user_health_data_concurrent, args.user_id, args.iterations)
+
+    summarize("sequential", sequential)
+    summarize("concurrent", concurrent)
+    print(f"speedup (p50): {statistics.median(sequential) / statistics.median(concurrent):.2f}x")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
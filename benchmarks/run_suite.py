@@ -0,0 +1,392 @@
+import sys
+import os
+
+# Ensure Python finds `app/` and `db/` as modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+from sqlalchemy import delete, func
+from app.logger import logging
+from app.utils.helper_functions import percentile
+from app.utils.health_score import calculate_BHI, calculate_AHS, calculate_SQS, calculate_FHS, calculate_scores, \
+    build_report_sections, fetch_user_health_data, fetch_user_health_records, fetch_user_health_summary
+from app.utils.health_score_batch import score_population
+from app.utils.cohort_ranking import CohortRanking
+from app.utils.pdf import render_pdf
+from db.database import AsyncSessionLocal, engine
+from db.models import User, Test, ActivityType, DailySteps
+from db.cruds.user_crud import user_service
+from db.cruds.test_crud import test_service
+from db.cruds.daily_steps_crud import step_service
+from db.cruds.test_results_crud import test_result_service
+from db.cruds.sleep_activity_crud import sleep_service
+from db.cruds.activity import activity_service
+from db.cruds.activity_type_crud import activity_type_service
+
+# The fixture is dated far in the future and owned by its own user / test / activity type, so it can be created and
+# removed (through ON DELETE CASCADE) without touching real data
+BENCH_EMAIL = "bench-suite@example.invalid"
+BENCH_NAME = "bench-suite"
+BENCH_START_DATE = datetime(2100, 1, 1)
+SCORING_SIZES = [10, 100, 1000, 10000]
+
+
+class Suite:
+    """
+    Runs benchmarks and keeps their timing statistics (milliseconds per call).
+    """
+
+    def __init__(self, iterations: int, warmup: int, only=None):
+        self.iterations = iterations
+        self.warmup = warmup
+        self.only = only
+        self.results = {}
+
+    def selected(self, name: str) -> bool:
+        return not self.only or any(pattern in name for pattern in self.only)
+
+    def record(self, name: str, timings: list, **params):
+        timings = sorted(timings)
+        self.results[name] = {
+            "iterations": len(timings),
+            "mean_ms": round(statistics.mean(timings), 4),
+            "stdev_ms": round(statistics.stdev(timings), 4) if len(timings) > 1 else 0.0,
+            "min_ms": round(timings[0], 4),
+            "p50_ms": round(percentile(timings, 50), 4),
+            "p99_ms": round(percentile(timings, 99), 4),
+            "params": params,
+        }
+        print(f"{name:<44} p50={self.results[name]['p50_ms']:10.3f} ms  p99={self.results[name]['p99_ms']:10.3f} ms")
+
+    def run(self, name: str, fn, *args, iterations=None, **params):
+        if not self.selected(name):
+            return
+        for _ in range(self.warmup):
+            fn(*args)
+        timings = []
+        for _ in range(iterations or self.iterations):
+            start = time.perf_counter()
+            fn(*args)
+            timings.append((time.perf_counter() - start) * 1000)
+        self.record(name, timings, **params)
+
+    async def run_async(self, name: str, fn, *args, iterations=None, warmup=None, **params):
+        """
+        `fn` is called with the iteration number first, so write benchmarks can touch a different row each time.
+        """
+        if not self.selected(name):
+            return
+        warmup = self.warmup if warmup is None else warmup
+        for i in range(warmup):
+            await fn(-1 - i, *args)
+        timings = []
+        for i in range(iterations or self.iterations):
+            start = time.perf_counter()
+            await fn(i, *args)
+            timings.append((time.perf_counter() - start) * 1000)
+        self.record(name, timings, **params)
+
+
+# ---------- Seeded in-memory inputs ----------
+
+def make_scoring_inputs(size: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    test_bounds = {test_id: (lower, lower + rng.uniform(5, 50))
+                   for test_id, lower in enumerate(rng.uniform(0, 100) for _ in range(20))}
+    start = BENCH_START_DATE
+    activities = []
+    for i in range(size):
+        begin = start + timedelta(hours=i)
+        activities.append(SimpleNamespace(start_time=begin, end_time=begin + timedelta(minutes=rng.randint(5, 120)),
+                                          calories_burned=rng.uniform(20, 800)))
+    return {
+        "test_bounds": test_bounds,
+        "test_results": [SimpleNamespace(test_id=test_id, result_value=rng.uniform(0, 150))
+                         for test_id in (rng.randrange(len(test_bounds)) for _ in range(size))],
+        "steps": [SimpleNamespace(total_steps=rng.randint(0, 20000)) for _ in range(size)],
+        "activities": activities,
+        "sleep": [SimpleNamespace(sleep_duration=rng.randint(240, 600)) for _ in range(size)],
+    }
+
+
+def make_population_inputs(users: int, rows_per_user: int, seed: int):
+    rng = np.random.default_rng(seed)
+    rows = users * rows_per_user
+    user_ids = np.arange(1, users + 1)
+    row_users = rng.integers(1, users + 1, rows)
+    starts = np.datetime64("2100-01-01T00:00") + rng.integers(0, 525600, rows).astype("timedelta64[m]")
+    return (
+        user_ids,
+        (row_users, rng.uniform(0, 150, rows), rng.uniform(0, 60, rows), rng.uniform(60, 120, rows)),
+        (row_users, rng.integers(0, 20000, rows)),
+        (row_users, starts, starts + rng.integers(5, 120, rows).astype("timedelta64[m]"), rng.uniform(20, 800, rows)),
+        (row_users, rng.integers(240, 600, rows)),
+    )
+
+
+def make_report_data(seed: int) -> dict:
+    rng = random.Random(seed)
+    totals = {"total_steps": rng.randint(0, 10 ** 6), "active_minutes": rng.uniform(0, 10 ** 4),
+              "calories_burned": rng.uniform(0, 10 ** 5), "avg_sleep_minutes": rng.uniform(300, 540),
+              "sleep_count": rng.randint(1, 365), "bhi_deviation": rng.uniform(0, 200)}
+    user = SimpleNamespace(first_name="Bench", last_name="Suite", gender="Other", height=175.0, weight=70.0)
+    return {"user": user, "age": 40, "totals": totals, "scores": calculate_scores(totals), "days": 30}
+
+
+# ---------- CPU benchmarks ----------
+
+def bench_scoring(suite: Suite, seed: int):
+    for size in SCORING_SIZES:
+        inputs = make_scoring_inputs(size, seed)
+        suite.run(f"calculate_BHI[n={size}]", calculate_BHI, inputs["test_results"], inputs["test_bounds"],
+                  size=size)
+        suite.run(f"calculate_AHS[n={size}]", calculate_AHS, inputs["steps"], inputs["activities"], size=size)
+        suite.run(f"calculate_SQS[n={size}]", calculate_SQS, inputs["sleep"], size=size)
+    suite.run("calculate_FHS", calculate_FHS, 72.5, 64.1, 88.0, iterations=suite.iterations * 100)
+
+    for users in (100, 1000, 10000):
+        population = make_population_inputs(users, 30, seed)
+        suite.run(f"score_population[users={users}]", score_population, *population, users=users, rows_per_user=30)
+
+
+def bench_ranking(suite: Suite, seed: int):
+    rng = random.Random(seed)
+    keys = [(band, gender) for band in ("20-29", "30-39", "40-49", "50-59") for gender in ("Male", "Female")]
+    for users in (10000, 100000):
+        entries = [(user_id, rng.choice(keys), rng.uniform(0, 100)) for user_id in range(users)]
+        ranking = CohortRanking(min_peers=1)
+        suite.run(f"CohortRanking.load[users={users}]", ranking.load, entries, users=users)
+        suite.run(f"CohortRanking.rank[users={users}]", ranking.rank, keys[0], 50.0,
+                  iterations=suite.iterations * 100, users=users)
+        suite.run(f"CohortRanking.rank_user[users={users}]",
+                  lambda: ranking.rank(rng.choice(keys), rng.uniform(0, 100), rng.randrange(users)),
+                  iterations=suite.iterations * 100, users=users)
+
+
+def bench_rendering(suite: Suite, seed: int):
+    report_data = make_report_data(seed)
+    suite.run("build_report_sections", build_report_sections, report_data)
+    suite.run("PDFReport.render", render_pdf, build_report_sections(report_data))
+
+
+# ---------- Database fixture and benchmarks ----------
+
+async def remove_fixture():
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(User).where(User.email == BENCH_EMAIL))
+        await db.execute(delete(Test).where(Test.test_name == BENCH_NAME))
+        await db.execute(delete(ActivityType).where(ActivityType.name == BENCH_NAME))
+        await db.commit()
+
+
+async def create_fixture(rows: int, seed: int) -> dict:
+    """
+    Creates the benchmark user with `rows` rows in every health table, generated from `seed`.
+    """
+    rng = random.Random(seed)
+    await remove_fixture()
+    async with AsyncSessionLocal() as db:
+        user = await user_service.create(db, {"first_name": "Bench", "last_name": "Suite", "email": BENCH_EMAIL,
+                                              "dob": date(1985, 6, 15), "gender": "Other", "height": 175.0,
+                                              "weight": 70.0})
+        test = await test_service.create(db, {"test_name": BENCH_NAME, "unit": "mg/dL", "lower_bound": 70,
+                                              "upper_bound": 110})
+        activity_type = await activity_type_service.create(db, {"name": BENCH_NAME})
+
+        user_id = user.user_id
+        days = [BENCH_START_DATE + timedelta(days=i) for i in range(rows)]
+        await step_service.bulk_copy(db, [
+            {"user_id": user_id, "date": day, "total_steps": rng.randint(0, 20000),
+             "total_calories_burned": rng.uniform(100, 900), "distance_walked_km": rng.uniform(0, 15),
+             "active_minutes": rng.randint(0, 180)} for day in days])
+        await sleep_service.bulk_copy(db, [
+            {"user_id": user_id, "sleep_date": day, "sleep_duration": rng.randint(240, 600),
+             "sleep_efficiency": rng.uniform(70, 99), "deep_sleep_min": rng.randint(30, 120),
+             "rem_sleep_min": rng.randint(30, 120), "wakeups": rng.randint(0, 6),
+             "bedtime": day - timedelta(hours=2), "wake_time": day + timedelta(hours=6)} for day in days])
+        await activity_service.bulk_copy(db, [
+            {"user_id": user_id, "activity_type_id": activity_type.activity_type_id,
+             "start_time": day + timedelta(hours=18), "end_time": day + timedelta(hours=18, minutes=rng.randint(5, 120)),
+             "calories_burned": rng.uniform(20, 800), "avg_heart_rate": rng.randint(90, 150),
+             "max_heart_rate": rng.randint(150, 190)} for day in days])
+        await test_result_service.bulk_copy(db, [
+            {"user_id": user_id, "test_id": test.test_id, "test_date": day, "result_value": rng.uniform(50, 130)}
+            for day in days[::7]])
+    return {"user_id": user_id, "rows": rows}
+
+
+async def bench_database(suite: Suite, rows: int, seed: int):
+    fixture = await create_fixture(rows, seed)
+    user_id = fixture["user_id"]
+    rng = random.Random(seed)
+    write_start = BENCH_START_DATE + timedelta(days=rows + 1)
+
+    def step_row(day: int) -> dict:
+        return {"user_id": user_id, "date": write_start + timedelta(days=day), "total_steps": rng.randint(0, 20000),
+                "total_calories_burned": 400.0, "distance_walked_km": 5.0, "active_minutes": 60}
+
+    async with AsyncSessionLocal() as db:
+        step_ids = [step.id for step in await step_service.get_by_user_id(db, user_id)]
+
+        async def get_by_id(i):
+            await step_service.get_by_id(db, step_ids[i % len(step_ids)])
+
+        async def get_all(i):
+            await activity_type_service.get_all(db)
+
+        async def get_by_user_id(i):
+            await step_service.get_by_user_id(db, user_id)
+
+        async def get_by_user_id_page(i):
+            await step_service.get_by_user_id(db, user_id, limit=50)
+
+        async def aggregate(i):
+            await step_service.aggregate(db, {"total_steps": func.sum(DailySteps.total_steps)}, [user_id])
+
+        async def create(i):
+            await step_service.create(db, step_row(10000 + i))
+
+        async def update(i):
+            await step_service.update(db, step_ids[i % len(step_ids)], {"total_steps": rng.randint(0, 20000)})
+
+        created_ids = []
+
+        async def create_for_delete(i):
+            created_ids.append((await step_service.create(db, step_row(20000 + i))).id)
+
+        async def delete_row(i):
+            await step_service.delete(db, created_ids.pop())
+
+        async def bulk_create(i):
+            await step_service.bulk_create(db, [step_row(30000 + i * 100 + j) for j in range(100)],
+                                           return_objects=False)
+
+        async def bulk_copy(i):
+            await step_service.bulk_copy(db, [step_row(60000 + i * 100 + j) for j in range(100)])
+
+        async def fetch_full(i):
+            db.expunge_all()
+            await fetch_user_health_data(user_id, db)
+
+        async def fetch_records(i):
+            db.expunge_all()
+            await fetch_user_health_records(user_id, db)
+
+        async def fetch_summary(i):
+            await fetch_user_health_summary(user_id, db)
+
+        async def fetch_summary_rollups(i):
+            await fetch_user_health_summary(user_id, db, from_rollups=True)
+
+        await suite.run_async("BaseService.get_by_id", get_by_id)
+        await suite.run_async("BaseService.get_all[activity_types]", get_all)
+        await suite.run_async(f"BaseService.get_by_user_id[rows={rows}]", get_by_user_id, rows=rows)
+        await suite.run_async("BaseService.get_by_user_id[limit=50]", get_by_user_id_page)
+        await suite.run_async("BaseService.aggregate", aggregate)
+        await suite.run_async("BaseService.create", create)
+        await suite.run_async("BaseService.update", update)
+        if suite.selected("BaseService.delete"):
+            for i in range(suite.iterations + suite.warmup):
+                await create_for_delete(i)
+        await suite.run_async("BaseService.delete", delete_row)
+        await suite.run_async("BaseService.bulk_create[rows=100]", bulk_create, rows=100)
+        await suite.run_async("BaseService.bulk_copy[rows=100]", bulk_copy, rows=100)
+        await suite.run_async(f"fetch_user_health_data[rows={rows}]", fetch_full, rows=rows)
+        await suite.run_async(f"fetch_user_health_records[rows={rows}]", fetch_records, rows=rows)
+        await suite.run_async(f"fetch_user_health_summary[rows={rows}]", fetch_summary, rows=rows)
+        await suite.run_async(f"fetch_user_health_summary[rollups,rows={rows}]", fetch_summary_rollups, rows=rows)
+
+    await remove_fixture()
+
+
+# ---------- Results ----------
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline_path: str, tolerance: float) -> list:
+    """
+    Prints the p50 change of every benchmark present in both runs and returns the ones slower than `tolerance`.
+    """
+    with open(baseline_path, "r", encoding="utf-8") as file:
+        baseline = json.load(file)["results"]
+
+    regressions = []
+    print(f"\nCompared with {baseline_path}:")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]["p50_ms"], result["p50_ms"]
+        change = (after - before) / before if before else 0.0
+        flag = "  REGRESSION" if change > tolerance else ""
+        print(f"{name:<44} {before:10.3f} -> {after:10.3f} ms  ({change:+.1%}){flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark scoring, BaseService methods, health data fetching and "
+                                                 "PDF rendering, and save the results as JSON.")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="Earlier results file to compare p50 latencies against")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Relative p50 slowdown reported as a regression (default 0.10)")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--rows", type=int, default=365, help="Rows per health table of the benchmark user")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", nargs="*", help="Only run benchmarks whose name contains one of these strings")
+    parser.add_argument("--skip-db", action="store_true", help="Only run the benchmarks that need no database")
+    args = parser.parse_args()
+
+    engine.echo = False
+    logging.getLogger().setLevel(logging.WARNING)
+
+    suite = Suite(args.iterations, args.warmup, args.only)
+    bench_scoring(suite, args.seed)
+    bench_ranking(suite, args.seed)
+    bench_rendering(suite, args.seed)
+    if not args.skip_db:
+        await bench_database(suite, args.rows, args.seed)
+        await engine.dispose()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "iterations": args.iterations,
+            "warmup": args.warmup,
+            "rows": args.rows,
+            "seed": args.seed,
+        },
+        "results": suite.results,
+    }
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"\nSaved {len(suite.results)} results to {args.output}")
+
+    if args.compare and compare(suite.results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,22 @@
+import sys
+import os
+
+# Ensure Python finds `app/` as a module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+from app.logger import logging
+from app.utils.cohort_ranking import cohort_ranking
+from db.database import AsyncSessionLocal
+
+
+# Rescore every user from the rollup totals and store the cohort ranking the API reports rank against
+async def main():
+    logging.info("⏳ Building cohort ranking...")
+    async with AsyncSessionLocal() as session:
+        users = await cohort_ranking.build(session)
+    logging.info(f"✅ Cohort ranking built: {users} users.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
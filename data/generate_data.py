@@ -0,0 +1,317 @@
+import sys
+import os
+
+# Ensure Python finds `app/` as a module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import asyncio
+import json
+import random
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from sqlalchemy import text
+from app.logger import logging
+from app.config import BULK_INSERT_BATCH_SIZE
+from db.database import AsyncSessionLocal
+from db.cruds.user_crud import user_service
+from db.cruds.test_results_crud import test_result_service
+from db.cruds.sleep_activity_crud import sleep_service
+from db.cruds.daily_steps_crud import step_service
+from db.cruds.activity import activity_service
+from db.cruds.rollup_crud import rollup_service
+from app.utils.cohort_ranking import cohort_ranking
+from data.load_data import DATA_DIR, iter_json_array, load_table, reset_sequence, LOAD_LEVELS
+
+# Fixed so that the same seed always produces the same data, whatever day the generator runs
+DEFAULT_END_DATE = "2025-02-22"
+
+# Generated tables, in foreign key order, with the service used to COPY them into the database
+GENERATED_TABLES = [
+    ("users.json", user_service),
+    ("test_results.json", test_result_service),
+    ("sleep.json", sleep_service),
+    ("daily_steps.json", step_service),
+    ("activities.json", activity_service),
+]
+
+# The reference tables are not generated: their fixtures are reused as is
+CATALOG_FILES = ["tests.json", "activity_types.json"]
+
+
+class DataGenerator:
+    """
+    Generates referentially consistent users with `days` days of steps, sleep, activities and periodic lab tests.
+
+    Every user draws from its own random.Random(seed, user_id) stream, so a user's records never depend on how many
+    users are generated, the batch size or the number of worker processes, and the same seed reproduces the data
+    exactly. Primary keys are assigned afterwards, in user order, by `generate_batches`.
+    """
+
+    def __init__(self, seed: int, days: int, end_date: date, tests: list, activity_type_ids: list,
+                 test_interval_days: int = 90):
+        self.seed = seed
+        self.days = [datetime.combine(end_date - timedelta(days=offset), datetime.min.time())
+                     for offset in range(days - 1, -1, -1)]
+        self.tests = tests
+        self.activity_type_ids = activity_type_ids
+        self.test_interval_days = test_interval_days
+
+    def generate_user(self, user_id: int) -> dict:
+        """
+        Returns {filename: [records]} for one user.
+        """
+        rng = random.Random(self.seed * 1_000_003 + user_id)
+        gender = rng.choices(["Male", "Female", "Other"], weights=[49, 49, 2])[0]
+        height = rng.gauss(177 if gender == "Male" else 164, 7)
+        user = {
+            "user_id": user_id,
+            "first_name": f"User{user_id}",
+            "last_name": f"Lastname{user_id}",
+            "email": f"user{user_id}@example.com",
+            "dob": date(1950, 1, 1) + timedelta(days=rng.randrange(365 * 55)),
+            "gender": gender,
+            "height": round(height, 1),
+            "weight": round(rng.gauss(24, 3.5) * (height / 100) ** 2, 1),  # From a plausible BMI
+        }
+
+        # Personal baselines, so users differ from each other and each user is consistent over time
+        activity_level = rng.lognormvariate(0, 0.35)
+        sleep_minutes = rng.gauss(430, 35)
+        sleep_efficiency = rng.uniform(78, 94)
+        workout_chance = min(0.9, 0.25 * activity_level)
+        test_offsets = {test["test_id"]: rng.gauss(0, 0.15) for test in self.tests}
+
+        records = {filename: [] for filename, _ in GENERATED_TABLES}
+        records["users.json"].append(user)
+        for index, day in enumerate(self.days):
+            weekend = day.weekday() >= 5
+            steps = max(0, int(rng.gauss(8000 * activity_level * (0.85 if weekend else 1.0), 2500)))
+            records["daily_steps.json"].append({
+                "user_id": user_id,
+                "date": day,
+                "total_steps": steps,
+                "total_calories_burned": round(steps * rng.uniform(0.035, 0.05), 2),
+                "distance_walked_km": round(steps * rng.uniform(0.0007, 0.0008), 2),
+                "active_minutes": int(steps / rng.uniform(100, 140)),
+            })
+
+            duration = int(min(720, max(180, rng.gauss(sleep_minutes + (30 if weekend else 0), 45))))
+            efficiency = min(99.0, max(60.0, rng.gauss(sleep_efficiency, 4)))
+            bedtime = day - timedelta(minutes=rng.randint(60, 180))  # The night before the wake-up day
+            records["sleep.json"].append({
+                "user_id": user_id,
+                "sleep_date": day,
+                "sleep_duration": duration,
+                "sleep_efficiency": round(efficiency, 2),
+                "deep_sleep_min": int(duration * rng.uniform(0.12, 0.25)),
+                "rem_sleep_min": int(duration * rng.uniform(0.18, 0.25)),
+                "wakeups": rng.randint(0, 5),
+                "bedtime": bedtime,
+                "wake_time": bedtime + timedelta(minutes=int(duration * 100 / efficiency)),
+            })
+
+            sessions = (rng.random() < workout_chance) + (rng.random() < workout_chance / 4)
+            start = day + timedelta(hours=rng.randint(6, 12), minutes=rng.randint(0, 59)) if sessions else None
+            for _ in range(sessions):
+                minutes = rng.randint(15, 90)
+                avg_heart_rate = rng.randint(95, 160)
+                records["activities.json"].append({
+                    "user_id": user_id,
+                    "activity_type_id": rng.choice(self.activity_type_ids),
+                    "start_time": start,
+                    "end_time": start + timedelta(minutes=minutes),
+                    "calories_burned": round(minutes * rng.uniform(5, 12), 2),
+                    "avg_heart_rate": avg_heart_rate,
+                    "max_heart_rate": avg_heart_rate + rng.randint(10, 35),
+                })
+                # The next session starts one to four hours after this one ends, so a day's sessions never overlap
+                start += timedelta(minutes=minutes + rng.randint(60, 240))
+
+            if index % self.test_interval_days == self.test_interval_days - 1:
+                for test in rng.sample(self.tests, min(5, len(self.tests))):
+                    # Around the middle of the reference range, shifted per user so some users run out of range
+                    middle = (test["lower_bound"] + test["upper_bound"]) / 2
+                    spread = (test["upper_bound"] - test["lower_bound"]) / 2
+                    value = middle + spread * (test_offsets[test["test_id"]] * 4 + rng.gauss(0, 0.5))
+                    records["test_results.json"].append({
+                        "user_id": user_id,
+                        "test_id": test["test_id"],
+                        "test_date": day,
+                        "result_value": round(max(0.0, value), 2),
+                    })
+        return records
+
+    def generate_range(self, first: int, last: int, as_json: bool = False) -> dict:
+        """
+        Records of users `first` to `last` (inclusive), without primary keys. With `as_json` the records are
+        already serialized, so that work also happens in the worker processes.
+        """
+        batch = {filename: [] for filename, _ in GENERATED_TABLES}
+        for user_id in range(first, last + 1):
+            for filename, records in self.generate_user(user_id).items():
+                batch[filename].extend(records)
+        if as_json:
+            batch = {filename: [json.dumps(record, default=lambda value: value.isoformat()) for record in records]
+                     for filename, records in batch.items()}
+        return batch
+
+    def generate_batches(self, users: int, batch_users: int, workers: int = 1, as_json: bool = False):
+        """
+        Yields {filename: [records]} for `batch_users` users at a time, in user order, with sequential primary
+        keys. With several workers the batches are generated in parallel processes, at most two per worker ahead
+        of the consumer.
+        """
+        ranges = [(first, min(users, first + batch_users - 1)) for first in range(1, users + 1, batch_users)]
+        if workers > 1:
+            batches = _generate_parallel(self, ranges, workers, as_json)
+        else:
+            batches = (self.generate_range(first, last, as_json) for first, last in ranges)
+
+        next_ids = {filename: 1 for filename, _ in GENERATED_TABLES}
+        for batch in batches:
+            for filename, service in GENERATED_TABLES[1:]:  # users already carry their user_id
+                records, key = batch[filename], service.primary_key
+                for index in range(len(records)):
+                    if as_json:
+                        records[index] = f'{{"{key}": {next_ids[filename]}, {records[index][1:]}'
+                    else:
+                        records[index][key] = next_ids[filename]
+                    next_ids[filename] += 1
+            yield batch
+
+
+def _generate_parallel(generator: DataGenerator, ranges: list, workers: int, as_json: bool):
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for first, last in ranges:
+            pending.append(pool.submit(generator.generate_range, first, last, as_json))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class JsonArrayWriter:
+    """
+    Streams serialized records into a JSON array file in the fixture format read by load_data.iter_json_array.
+    """
+
+    def __init__(self, path: str):
+        self.file = open(path, "w", encoding="utf-8")
+        self.file.write("[")
+        self.count = 0
+
+    def write(self, records: list):
+        if not records:
+            return
+        self.file.write(",\n" if self.count else "\n")
+        self.file.write(",\n".join(records))
+        self.count += len(records)
+
+    def close(self):
+        self.file.write("\n]\n")
+        self.file.close()
+
+
+def load_catalogs(source_dir: str):
+    tests = list(iter_json_array(os.path.join(source_dir, "tests.json")))
+    activity_type_ids = [row["activity_type_id"]
+                         for row in iter_json_array(os.path.join(source_dir, "activity_types.json"))]
+    return tests, activity_type_ids
+
+
+def write_files(generator: DataGenerator, users: int, batch_users: int, workers: int, output_dir: str) -> dict:
+    os.makedirs(output_dir, exist_ok=True)
+    for filename in CATALOG_FILES:
+        if os.path.abspath(output_dir) != os.path.abspath(DATA_DIR):
+            shutil.copyfile(os.path.join(DATA_DIR, filename), os.path.join(output_dir, filename))
+
+    writers = {filename: JsonArrayWriter(os.path.join(output_dir, filename)) for filename, _ in GENERATED_TABLES}
+    try:
+        for batch in generator.generate_batches(users, batch_users, workers, as_json=True):
+            for filename, records in batch.items():
+                writers[filename].write(records)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return {filename: writer.count for filename, writer in writers.items()}
+
+
+async def write_database(generator: DataGenerator, users: int, batch_users: int, workers: int,
+                         truncate: bool) -> dict:
+    """
+    COPYs the generated rows straight into the database, batch by batch, then rebuilds the rollups once.
+    """
+    async with AsyncSessionLocal() as db:
+        if truncate:
+            tables = [service.model.__tablename__ for level in LOAD_LEVELS for _, service in level]
+            await db.execute(text(f"TRUNCATE {', '.join(tables + ['user_rollups'])} RESTART IDENTITY CASCADE"))
+            await db.commit()
+        elif (await db.execute(text("SELECT EXISTS (SELECT 1 FROM users)"))).scalar():
+            raise RuntimeError("The users table is not empty: generated ids would collide, rerun with --truncate")
+
+    # The reference tables come from the fixtures, as in load_data
+    for filename, service in LOAD_LEVELS[0]:
+        if filename in CATALOG_FILES:
+            await load_table(filename, service, BULK_INSERT_BATCH_SIZE)
+
+    counts = {filename: 0 for filename, _ in GENERATED_TABLES}
+    async with AsyncSessionLocal() as db:
+        for batch in generator.generate_batches(users, batch_users, workers):
+            for filename, service in GENERATED_TABLES:
+                copied = await service.bulk_copy(db, batch[filename], run_hooks=False)
+                if copied != len(batch[filename]):
+                    raise RuntimeError(f"COPY into {service.model.__tablename__} failed after {counts[filename]} rows")
+                counts[filename] += copied
+            logging.info(f"Generated {counts['users.json']} users so far.")
+        for _, service in GENERATED_TABLES:
+            await reset_sequence(db, service)
+        await rollup_service.rebuild(db)
+        await cohort_ranking.build(db)
+    return counts
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate reproducible synthetic health data at any scale, "
+                                                 "as fixture files or straight into the database.")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=730, help="Days of daily records per user")
+    parser.add_argument("--end-date", default=DEFAULT_END_DATE, help="Last day of the generated history")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--test-interval", type=int, default=90, help="Days between two lab test panels")
+    parser.add_argument("--batch-users", type=int, default=100, help="Users generated (and COPYed) per batch")
+    parser.add_argument("--workers", type=int, default=1, help="Processes generating batches in parallel")
+    parser.add_argument("--output-dir", help="Write JSON fixtures to this directory (loadable with load_data.py)")
+    parser.add_argument("--database", action="store_true", help="COPY the data straight into the database")
+    parser.add_argument("--truncate", action="store_true", help="With --database: empty all tables first")
+    args = parser.parse_args(argv)
+    if bool(args.output_dir) == args.database:
+        parser.error("choose exactly one of --output-dir or --database")
+    return args
+
+
+async def main(argv=None):
+    args = parse_args(argv)
+    tests, activity_type_ids = load_catalogs(DATA_DIR)
+    generator = DataGenerator(args.seed, args.days, date.fromisoformat(args.end_date), tests, activity_type_ids,
+                              args.test_interval)
+
+    start = time.perf_counter()
+    if args.database:
+        counts = await write_database(generator, args.users, args.batch_users, args.workers, args.truncate)
+    else:
+        counts = write_files(generator, args.users, args.batch_users, args.workers, args.output_dir)
+
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    for filename, count in counts.items():
+        logging.info(f"{filename}: {count} rows")
+    logging.info(f"✅ Generated {total} rows in {elapsed:.2f}s ({total / elapsed if elapsed else 0:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
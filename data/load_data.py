@@ -6,115 +6,152 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")
 
 import json
 import asyncio
-from datetime import datetime
-from sqlalchemy.ext.asyncio import AsyncSession
+import time
+from datetime import date, datetime
+from sqlalchemy import Date, DateTime, Enum, text
 from app.logger import logging
+from app.config import BULK_INSERT_BATCH_SIZE
 from db.database import AsyncSessionLocal
-from db.models import GenderEnum, User, Test, TestResult, SleepingActivity, DailySteps, ActivityType, PhysicalActivity
-
-
-# Load JSON data from files
-def load_json_data(filename):
-    with open(os.path.join(os.getcwd(), "data", filename), "r") as file:
-        return json.load(file)
-
-
-# Convert date string to datetime.date
-def parse_date(date_str):
-    return datetime.strptime(date_str, "%Y-%m-%d").date()
-
-
-# Insert Users
-async def insert_users(db: AsyncSession):
-    users = load_json_data("users.json")
-
-    for user in users:
-        user["dob"] = parse_date(user["dob"])  # ✅ Convert to datetime.date
-        user["gender"] = GenderEnum(user["gender"].capitalize())  # ✅ Convert to correct case
-
-    db.add_all([User(**user) for user in users])
-    await db.commit()
-
-
-# Insert Tests
-async def insert_tests(db: AsyncSession):
-    tests = load_json_data("tests.json")
-    db.add_all([Test(**test) for test in tests])
-    await db.commit()
-
-
-# Insert Test Results
-async def insert_test_results(db: AsyncSession):
-    test_results = load_json_data("test_results.json")
-
-    for result in test_results:
-        result["test_date"] = parse_date(result["test_date"])  # ✅ Convert to datetime.date
-
-    db.add_all([TestResult(**result) for result in test_results])
-    await db.commit()
-
-
-# Insert Sleeping Activity
-async def insert_sleep_data(db: AsyncSession):
-    sleep_data = load_json_data("sleep.json")
-    for sleep in sleep_data:
-        sleep["sleep_date"] = parse_date(sleep["sleep_date"])  # ✅ Convert to datetime.date
-        sleep["bedtime"] = datetime.fromisoformat(sleep["bedtime"])  # ✅ Convert to datetime
-        sleep["wake_time"] = datetime.fromisoformat(sleep["wake_time"])  # ✅ Convert to datetime
-    db.add_all([SleepingActivity(**sleep) for sleep in sleep_data])
-    await db.commit()
-
-
-# Insert Daily Steps
-async def insert_daily_steps(db: AsyncSession):
-    steps_data = load_json_data("daily_steps.json")
-
-    for step in steps_data:
-        step["date"] = parse_date(step["date"])  # ✅ Convert to datetime.date
-
-    db.add_all([DailySteps(**step) for step in steps_data])
-    await db.commit()
-
-
-# Insert Activity Types
-async def insert_activity_types(db: AsyncSession):
-    activity_types = load_json_data("activity_types.json")
-    db.add_all([ActivityType(**activity) for activity in activity_types])
-    await db.commit()
-
-
-# Insert Physical Activities
-async def insert_physical_activity(db: AsyncSession):
-    activity_data = load_json_data("activities.json")
-
-    for activity in activity_data:
-        activity["start_time"] = datetime.fromisoformat(activity["start_time"])  # ✅ Convert to datetime
-        activity["end_time"] = datetime.fromisoformat(activity["end_time"])  # ✅ Convert to datetime
-
-    db.add_all([PhysicalActivity(**activity) for activity in activity_data])
+from db.cruds.user_crud import user_service
+from db.cruds.test_crud import test_service
+from db.cruds.test_results_crud import test_result_service
+from db.cruds.sleep_activity_crud import sleep_service
+from db.cruds.daily_steps_crud import step_service
+from db.cruds.activity import activity_service
+from db.cruds.activity_type_crud import activity_type_service
+from db.cruds.rollup_crud import rollup_service
+from app.utils.cohort_ranking import cohort_ranking
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Tables grouped by foreign key dependencies: every table of a level only references tables of earlier levels,
+# so the tables inside one level are loaded in parallel.
+LOAD_LEVELS = [
+    [("users.json", user_service), ("tests.json", test_service), ("activity_types.json", activity_type_service)],
+    [("test_results.json", test_result_service), ("sleep.json", sleep_service),
+     ("daily_steps.json", step_service), ("activities.json", activity_service)],
+]
+
+
+# Stream the objects of a top-level JSON array without reading the whole file into memory
+def iter_json_array(path, chunk_size=1 << 20):
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as file:
+        buffer = file.read(chunk_size).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"{path} does not contain a JSON array")
+        position = 1
+
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+
+            if position < len(buffer) and buffer[position] == "]":
+                return
+
+            try:
+                if position >= len(buffer):
+                    raise json.JSONDecodeError("Need more data", buffer, position)
+                obj, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The next object is split across chunks: keep the unread tail and read more
+                more = file.read(chunk_size)
+                if not more:
+                    raise
+                buffer, position = buffer[position:] + more, 0
+                continue
+
+            yield obj
+
+
+def parse_gender(value):
+    return value.capitalize()  # ✅ Stored as the GenderEnum member name
+
+
+# Converters chosen from the column types, e.g. "2025-02-11" -> datetime for DateTime columns
+def column_converters(model) -> dict:
+    converters = {}
+    for column in model.__table__.columns:
+        if isinstance(column.type, DateTime):
+            converters[column.name] = datetime.fromisoformat
+        elif isinstance(column.type, Date):
+            converters[column.name] = date.fromisoformat
+        elif isinstance(column.type, Enum):
+            converters[column.name] = parse_gender
+    return converters
+
+
+def iter_batches(filename, model, batch_size, data_dir=DATA_DIR):
+    converters = column_converters(model)
+    batch = []
+    for record in iter_json_array(os.path.join(data_dir, filename)):
+        for key, convert in converters.items():
+            if record.get(key) is not None:
+                record[key] = convert(record[key])
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Sequences are not advanced by rows inserted with explicit ids, so move them past the loaded rows
+async def reset_sequence(db, service):
+    table, primary_key = service.model.__tablename__, service.primary_key
+    await db.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('{table}', '{primary_key}'), "
+        f"COALESCE((SELECT MAX({primary_key}) FROM {table}), 0) + 1, false)"
+    ))
     await db.commit()
 
 
-# Run all insert operations
-async def insert_all_data(session: AsyncSession):
-    await insert_users(session)
-    await insert_tests(session)
-    await insert_activity_types(session)
-    await insert_test_results(session)
-    await insert_sleep_data(session)
-    await insert_daily_steps(session)
-    await insert_physical_activity(session)
-    logging.info("✅ Data insertion complete!")
+async def load_table(filename, service, batch_size, data_dir=DATA_DIR) -> int:
+    start = time.perf_counter()
+    rows = 0
+    async with AsyncSessionLocal() as db:
+        for batch in iter_batches(filename, service.model, batch_size, data_dir):
+            # Rollups are rebuilt once after all tables are loaded instead of per batch
+            copied = await service.bulk_copy(db, batch, batch_size=batch_size, run_hooks=False)
+            if copied != len(batch):
+                raise RuntimeError(f"COPY into {service.model.__tablename__} failed after {rows} rows")
+            rows += copied
+        await reset_sequence(db, service)
+
+    elapsed = time.perf_counter() - start
+    logging.info(f"✅ Loaded {rows} rows into {service.model.__tablename__} "
+                 f"in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:,.0f} rows/s)")
+    return rows
+
+
+# Run all insert operations, level by level
+async def load_all_data(batch_size: int = BULK_INSERT_BATCH_SIZE, data_dir: str = DATA_DIR) -> dict:
+    start = time.perf_counter()
+    loaded = {}
+    for level in LOAD_LEVELS:
+        counts = await asyncio.gather(*[load_table(filename, service, batch_size, data_dir)
+                                       for filename, service in level])
+        for (_, service), count in zip(level, counts):
+            loaded[service.model.__tablename__] = count
+
+    async with AsyncSessionLocal() as db:
+        await rollup_service.rebuild(db)
+        await cohort_ranking.build(db)
+
+    elapsed = time.perf_counter() - start
+    total = sum(loaded.values())
+    logging.info(f"✅ Data insertion complete: {total} rows in {elapsed:.2f}s "
+                 f"({total / elapsed if elapsed else 0:,.0f} rows/s)")
+    return loaded
 
 
 # Main function to run the script
-async def main():
-    logging.info("⏳ Starting data insertion...")
-    async with AsyncSessionLocal() as session:
-        await insert_all_data(session)
-        await session.commit()
+async def main(data_dir=DATA_DIR):
+    logging.info(f"⏳ Starting data insertion from {data_dir}...")
+    await load_all_data(data_dir=data_dir)
     logging.info("✅ Data insertion completed successfully!")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    # Optional argument: a directory of generated fixtures (see generate_data.py)
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else DATA_DIR))
@@ -0,0 +1,22 @@
+import sys
+import os
+
+# Ensure Python finds `app/` as a module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+from app.logger import logging
+from db.database import AsyncSessionLocal
+from db.cruds.rollup_crud import rollup_service
+
+
+# Rebuild the daily / weekly / monthly rollups from raw history, optionally only for the given user ids
+async def main(user_ids=None):
+    logging.info("⏳ Rebuilding rollups...")
+    async with AsyncSessionLocal() as session:
+        buckets = await rollup_service.rebuild(session, user_ids)
+    logging.info(f"✅ Rollups rebuilt: {buckets} buckets.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main([int(user_id) for user_id in sys.argv[1:]] or None))
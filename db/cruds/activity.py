@@ -1,11 +1,17 @@
 from db.models import PhysicalActivity
 
 from db.cruds.base_crud import BaseService
+from db.cruds.rollup_crud import rollup_service
+from app.utils.score_series import on_write as series_on_write
+from db.cruds.anomaly_crud import anomaly_service
 
 
 class ActivityService(BaseService[PhysicalActivity]):
     def __init__(self):
-        super().__init__(PhysicalActivity)
+        super().__init__(PhysicalActivity, date_column="start_time")
+        self.transaction_hooks.append(rollup_service.refresh)
+        self.write_hooks.append(series_on_write)
+        self.write_hooks.append(anomaly_service.evaluate_activities)
 
 
 activity_service = ActivityService()
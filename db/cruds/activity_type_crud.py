@@ -0,0 +1,13 @@
+from db.models import ActivityType
+
+from db.cruds.base_crud import BaseService
+from app.utils.catalog import catalog
+
+
+class ActivityTypeService(BaseService[ActivityType]):
+    def __init__(self):
+        super().__init__(ActivityType)
+        self.write_hooks.append(catalog.on_write)
+
+
+activity_type_service = ActivityTypeService()
@@ -0,0 +1,160 @@
+from app.logger import logging
+
+from datetime import datetime
+from sqlalchemy import select, insert, update, func, desc
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, List, Tuple
+
+from app.config import ANOMALY_Z_THRESHOLD, ANOMALY_MIN_SAMPLES
+from app.utils.anomaly import RunningStats
+from app.utils.catalog import catalog
+from db.models import AnomalyEvent, AnomalyKindEnum, UserBaseline, TestResult, PhysicalActivity
+from db.cruds.base_crud import BaseService
+
+# Plausible heart rate ranges (bpm) for the out-of-range check; the baseline check catches personal deviations
+HEART_RATE_BOUNDS = {"avg_heart_rate": (40, 190), "max_heart_rate": (40, 220)}
+
+# First key of the per-user advisory lock serializing baseline updates
+ADVISORY_LOCK_NAMESPACE = 7301
+
+
+def _dates_by_user(keys: List[Tuple]) -> dict:
+    dates = {}
+    for user_id, value in keys:
+        if user_id is not None and value is not None:
+            dates.setdefault(user_id, set()).add(value)
+    return dates
+
+
+class AnomalyService(BaseService[AnomalyEvent]):
+    """
+    Flags test results and activity heart rates as they are written, as write hooks of the test result and
+    activity services. A value is flagged when it lies outside its reference range, and when it is more than
+    `z_threshold` standard deviations from the user's running mean of that metric. The running means are Welford
+    baselines in `user_baselines`, so nothing is ever rescanned. Every row is folded in once: evaluated rows are
+    marked `anomaly_checked` in the same transaction, and updates of rows that were already evaluated are not
+    re-evaluated.
+    """
+
+    def __init__(self, z_threshold: float, min_samples: int):
+        super().__init__(AnomalyEvent, date_column="observed_at")
+        self.z_threshold = z_threshold
+        self.min_samples = min_samples
+
+    async def evaluate_test_results(self, db: AsyncSession, keys: List[Tuple]) -> None:
+        """
+        Write hook of TestResultService.
+        """
+        await catalog.ensure_fresh()
+        for user_id, dates in _dates_by_user(keys).items():
+            await self._lock_user(db, user_id)
+            rows = (await db.execute(
+                select(TestResult.result_id, TestResult.test_id, TestResult.test_date, TestResult.result_value)
+                .where(TestResult.user_id == user_id, TestResult.test_date.in_(dates),
+                       TestResult.anomaly_checked.is_not(True))
+                .order_by(TestResult.result_id))).all()
+            await self._evaluate(db, user_id, [
+                (f"test:{test_id}", result_id, test_date, value, catalog.test_bounds.get(test_id))
+                for result_id, test_id, test_date, value in rows
+            ])
+            await self._mark_checked(db, TestResult, TestResult.result_id, [row.result_id for row in rows])
+        await db.commit()
+
+    async def evaluate_activities(self, db: AsyncSession, keys: List[Tuple]) -> None:
+        """
+        Write hook of ActivityService: checks avg_heart_rate and max_heart_rate.
+        """
+        for user_id, dates in _dates_by_user(keys).items():
+            await self._lock_user(db, user_id)
+            rows = (await db.execute(
+                select(PhysicalActivity.activity_id, PhysicalActivity.start_time, PhysicalActivity.avg_heart_rate,
+                       PhysicalActivity.max_heart_rate)
+                .where(PhysicalActivity.user_id == user_id, PhysicalActivity.start_time.in_(dates),
+                       PhysicalActivity.anomaly_checked.is_not(True))
+                .order_by(PhysicalActivity.activity_id))).all()
+            samples = []
+            for activity_id, start_time, *heart_rates in rows:
+                for metric, value in zip(HEART_RATE_BOUNDS, heart_rates):
+                    if value is not None:
+                        samples.append((metric, activity_id, start_time, value, HEART_RATE_BOUNDS[metric]))
+            await self._evaluate(db, user_id, samples)
+            await self._mark_checked(db, PhysicalActivity, PhysicalActivity.activity_id,
+                                     [row.activity_id for row in rows])
+        await db.commit()
+
+    @staticmethod
+    async def _lock_user(db: AsyncSession, user_id: int) -> None:
+        # Selecting the unchecked rows, updating the baselines and marking the rows must not interleave with
+        # another writer of the same user, or both would fold in the same rows
+        await db.execute(select(func.pg_advisory_xact_lock(ADVISORY_LOCK_NAMESPACE, user_id)))
+
+    @staticmethod
+    async def _mark_checked(db: AsyncSession, model, id_column, ids: List[int]) -> None:
+        if not ids:
+            return
+        # updated_at is kept: marking is not a data change and must not move the report ETag
+        await db.execute(update(model).where(id_column.in_(ids))
+                         .values(anomaly_checked=True, updated_at=model.updated_at))
+
+    async def _evaluate(self, db: AsyncSession, user_id: int, samples: List[Tuple]) -> None:
+        """
+        Checks (metric, source_id, observed_at, value, (lower, upper) or None) samples of one user, in source_id
+        order, against the bounds and the baseline before the value is folded into it. Writes the events and the
+        updated baselines; the caller holds the user's lock, marks the rows checked and commits.
+        """
+        if not samples:
+            return
+        metrics = {sample[0] for sample in samples}
+        baselines = {row.metric: RunningStats(row.count, row.mean, row.m2)
+                     for row in (await db.execute(
+                         select(UserBaseline.metric, UserBaseline.count, UserBaseline.mean, UserBaseline.m2)
+                         .where(UserBaseline.user_id == user_id, UserBaseline.metric.in_(metrics)))).all()}
+
+        events, changed = [], set()
+        for metric, source_id, observed_at, value, bounds in samples:
+            stats = baselines.setdefault(metric, RunningStats())
+            event = {"user_id": user_id, "metric": metric, "source_id": source_id, "observed_at": observed_at,
+                     "value": value, "z_score": None}
+            lower, upper = bounds or (None, None)
+            if lower is not None and upper is not None and not lower <= value <= upper:
+                events.append({**event, "kind": AnomalyKindEnum.out_of_range, "expected_low": lower,
+                               "expected_high": upper})
+            if stats.count >= self.min_samples:
+                z_score = stats.z_score(value)
+                if z_score is not None and abs(z_score) >= self.z_threshold:
+                    margin = self.z_threshold * stats.stddev
+                    events.append({**event, "kind": AnomalyKindEnum.baseline, "z_score": round(z_score, 3),
+                                   "expected_low": stats.mean - margin, "expected_high": stats.mean + margin})
+
+            stats.add(value)
+            changed.add(metric)
+
+        if events:
+            await db.execute(insert(AnomalyEvent), events)
+            logging.warning("Flagged %s anomalies for user_id=%s.", len(events), user_id)
+        if changed:
+            statement = pg_insert(UserBaseline).values([
+                {"user_id": user_id, "metric": metric, "count": baselines[metric].count, "mean": baselines[metric].mean,
+                 "m2": baselines[metric].m2, "updated_at": datetime.now()}
+                for metric in changed
+            ])
+            await db.execute(statement.on_conflict_do_update(
+                constraint="uq_user_baselines_metric",
+                set_={column: statement.excluded[column]
+                      for column in ("count", "mean", "m2", "updated_at")}))
+
+    async def get_recent(self, db: AsyncSession, user_id: int, since: Optional[datetime] = None,
+                         limit: int = 100) -> List[AnomalyEvent]:
+        """
+        A user's anomaly events, newest observation first.
+        """
+        query = self.apply_time_window(select(AnomalyEvent).where(AnomalyEvent.user_id == user_id), since)
+        query = query.order_by(desc(AnomalyEvent.observed_at), desc(AnomalyEvent.event_id)).limit(limit)
+        result = await db.execute(query)
+        events = result.scalars().all()
+        logging.info("Retrieved %s anomaly events for user_id=%s.", len(events), user_id)
+        return events
+
+
+anomaly_service = AnomalyService(ANOMALY_Z_THRESHOLD, ANOMALY_MIN_SAMPLES)
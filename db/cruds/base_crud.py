@@ -2,9 +2,15 @@ from app.logger import logging
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import Type, TypeVar, Generic, Optional, List
+from typing import Type, TypeVar, Generic, Optional, List, Dict, Tuple, AsyncIterator
+from datetime import datetime
 from sqlalchemy.orm import DeclarativeBase, joinedload
-from sqlalchemy import inspect
+from sqlalchemy import inspect, insert, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.config import BULK_INSERT_BATCH_SIZE, EXPORT_FETCH_SIZE
+from app.utils.cache import score_cache
+from app.utils.metrics import timed_db_operation
+from db.database import AsyncSessionLocal
 
 # Define a generic model type
 ModelType = TypeVar("ModelType", bound=DeclarativeBase)
@@ -15,10 +21,14 @@ class BaseService(Generic[ModelType]):
     Optimized Base Service class providing common CRUD operations and optimized queries.
     """
 
-    def __init__(self, model: Type[ModelType]):
+    def __init__(self, model: Type[ModelType], date_column: Optional[str] = None):
         self.model = model
         self.primary_key = self.get_primary_key()
-        logging.info(f"{self.model.__name__} service initialized.")
+        self.date_column = date_column  # Column used for time windows and keyset pagination
+        self.has_user_id = "user_id" in inspect(self.model).columns
+        self.transaction_hooks = []  # async callables (db, [(user_id, date)]) run in every write's transaction
+        self.write_hooks = []  # async callables (db, [(user_id, date)]) run after every committed write
+        logging.info("%s service initialized.", self.model.__name__)
 
     def get_primary_key(self) -> str:
         """
@@ -26,6 +36,56 @@ class BaseService(Generic[ModelType]):
         """
         return inspect(self.model).primary_key[0].name  # Gets the first primary key column name
 
+    def invalidate_user_cache(self, user_ids) -> None:
+        """
+        Drops cached health scores of the given users after their data was written.
+        """
+        if not self.has_user_id:
+            return
+        for user_id in set(user_ids):
+            score_cache.invalidate(user_id)
+
+    def get_write_keys(self, records) -> List[Tuple]:
+        """
+        (user_id, date) of written rows, from ORM objects or dicts. The date is None without a date_column.
+        """
+        keys = []
+        for record in records:
+            if isinstance(record, dict):
+                values = record.get
+            else:
+                values = lambda name, obj=record: getattr(obj, name, None)
+            keys.append((values("user_id"), values(self.date_column) if self.date_column else None))
+        return keys
+
+    async def before_commit(self, db: AsyncSession, keys: List[Tuple], run_hooks: bool = True) -> None:
+        """
+        Runs the transaction hooks (e.g. rollup maintenance) in the writer's transaction, right before its commit,
+        so derived data commits or rolls back together with the write. A failing hook fails the write.
+        """
+        if run_hooks:
+            for hook in self.transaction_hooks:
+                await hook(db, keys)
+
+    async def after_write(self, keys: List[Tuple], run_hooks: bool = True) -> None:
+        """
+        Runs after every committed write: drops cached scores of the affected users and runs the write hooks
+        (e.g. anomaly checks). Hook failures are only logged, the write itself already succeeded.
+        """
+        self.invalidate_user_cache([user_id for user_id, _ in keys])
+        if not run_hooks or not self.write_hooks:
+            return
+
+        # Hooks get their own session so a failing hook cannot roll back or expire the caller's objects
+        async with AsyncSessionLocal() as hook_db:
+            for hook in self.write_hooks:
+                try:
+                    await hook(hook_db, keys)
+                except Exception as e:
+                    await hook_db.rollback()
+                    logging.error("Write hook %s failed for %s: %s", hook.__qualname__, self.model.__name__, e)
+
+    @timed_db_operation
     async def create(self, db: AsyncSession, obj_data: dict) -> ModelType:
         """
         Optimized creation method with exception handling.
@@ -33,32 +93,150 @@ class BaseService(Generic[ModelType]):
         try:
             new_obj = self.model(**obj_data)
             db.add(new_obj)
+            await self.before_commit(db, self.get_write_keys([new_obj]))
             await db.commit()
             await db.refresh(new_obj)
-            logging.info(f"Created {self.model.__name__} with {self.primary_key}={getattr(new_obj, self.primary_key)}")
-            return new_obj
+            logging.info("Created %s with %s=%s", self.model.__name__, self.primary_key,
+                         getattr(new_obj, self.primary_key))
         except Exception as e:
             await db.rollback()
-            logging.error(f"Error creating {self.model.__name__}: {e}")
+            logging.error("Error creating %s: %s", self.model.__name__, e)
             return None
 
-    async def bulk_create(self, db: AsyncSession, obj_data_list: List[dict]) -> List[ModelType]:
+        await self.after_write(self.get_write_keys([new_obj]))
+        return new_obj
+
+    @timed_db_operation
+    async def bulk_create(self, db: AsyncSession, obj_data_list: List[dict], batch_size: Optional[int] = None,
+                          return_objects: bool = True) -> List:
         """
-        Optimized bulk insert operation.
+        Bulk insert using multi-row INSERT ... RETURNING, chunked to `batch_size` rows per statement and committed
+        once. Returns the created ORM objects, or only their primary keys when `return_objects` is False
+        (no ORM objects are constructed at all in that mode), in the order of `obj_data_list`.
         """
+        batch_size = batch_size or BULK_INSERT_BATCH_SIZE
+        # Postgres does not guarantee RETURNING rows of a multi-row INSERT in VALUES order; SQLAlchemy sorts them back
+        if return_objects:
+            statement = insert(self.model).returning(self.model, sort_by_parameter_order=True)
+        else:
+            statement = insert(self.model.__table__).returning(getattr(self.model.__table__.c, self.primary_key),
+                                                               sort_by_parameter_order=True)
+
         try:
-            new_objs = [self.model(**obj_data) for obj_data in obj_data_list]
-            db.add_all(new_objs)
+            created = []
+            for start in range(0, len(obj_data_list), batch_size):
+                result = await db.execute(statement, obj_data_list[start:start + batch_size])
+                created.extend(result.scalars().all())
+            await self.before_commit(db, self.get_write_keys(obj_data_list))
             await db.commit()
-            for obj in new_objs:
-                await db.refresh(obj)
-            logging.info(f"Bulk insert completed for {len(new_objs)} records in {self.model.__name__}")
-            return new_objs
+            logging.info("Bulk insert completed for %s records in %s", len(created), self.model.__name__)
         except Exception as e:
             await db.rollback()
-            logging.error(f"Error in bulk creation for {self.model.__name__}: {e}")
+            logging.error("Error in bulk creation for %s: %s", self.model.__name__, e)
             return []
 
+        await self.after_write(self.get_write_keys(obj_data_list))
+        return created
+
+    @timed_db_operation
+    async def upsert(self, db: AsyncSession, obj_data_list: List[dict], batch_size: Optional[int] = None) -> int:
+        """
+        INSERT ... ON CONFLICT (user_id, source_id) DO UPDATE of rows with identical keys, chunked to `batch_size`
+        rows per executemany and committed once. `source_id` is the client's id of the sample, so a resent sample
+        replaces its row; needs the unique (user_id, source_id) index. Rows must not repeat a (user_id, source_id)
+        pair. Returns the number of rows written, 0 on error.
+        """
+        if not obj_data_list:
+            return 0
+        table = self.model.__table__
+        if not self.date_column or "source_id" not in table.columns:
+            raise ValueError(f"{self.model.__name__} has no date column or source_id to upsert on.")
+
+        batch_size = batch_size or BULK_INSERT_BATCH_SIZE
+        conflict_columns = ["user_id", "source_id"]
+        statement = pg_insert(table)
+        updates = {column: statement.excluded[column] for column in obj_data_list[0]
+                   if column not in conflict_columns and column != self.primary_key}
+        for column in self.model.__table__.columns:
+            if column.onupdate is not None:  # e.g. updated_at, which ORM updates set and the ETag relies on
+                updates.setdefault(column.name, statement.excluded[column.name])
+        statement = statement.on_conflict_do_update(index_elements=conflict_columns, set_=updates)
+
+        keys = self.get_write_keys(obj_data_list)
+        try:
+            # A resent sample may move its row to another date, whose derived data changes as well
+            for start in range(0, len(obj_data_list), batch_size):
+                chunk = obj_data_list[start:start + batch_size]
+                keys += (await db.execute(
+                    select(table.c.user_id, table.c[self.date_column])
+                    .where(tuple_(table.c.user_id, table.c.source_id)
+                           .in_([(row["user_id"], row["source_id"]) for row in chunk])))).all()
+                await db.execute(statement, chunk)
+            await self.before_commit(db, keys)
+            await db.commit()
+            logging.info("Upserted %s records in %s", len(obj_data_list), self.model.__name__)
+        except Exception as e:
+            await db.rollback()
+            logging.error("Error upserting %s: %s", self.model.__name__, e)
+            return 0
+
+        await self.after_write(keys)
+        return len(obj_data_list)
+
+    def _copy_defaults(self, columns: List[str]) -> Dict[str, object]:
+        """
+        Python-side column defaults (e.g. created_at=datetime.now) missing from `columns`. COPY bypasses
+        SQLAlchemy, so they have to be filled in by hand.
+        """
+        defaults = {}
+        for column in self.model.__table__.columns:
+            if column.name in columns or column.default is None:
+                continue
+            if column.default.is_callable:
+                defaults[column.name] = column.default.arg
+            elif column.default.is_scalar:
+                defaults[column.name] = lambda ctx, value=column.default.arg: value
+        return defaults
+
+    @timed_db_operation
+    async def bulk_copy(self, db: AsyncSession, obj_data_list: List[dict], batch_size: Optional[int] = None,
+                        run_hooks: bool = True) -> int:
+        """
+        Fastest bulk insert: streams rows with the asyncpg COPY protocol inside the session's transaction.
+        Returns the number of rows written; nothing is returned from the database.
+        Bulk loaders can skip the transaction and write hooks with `run_hooks=False` and rebuild derived data once at
+        the end.
+        """
+        if not obj_data_list:
+            return 0
+
+        batch_size = batch_size or BULK_INSERT_BATCH_SIZE
+        columns = list(obj_data_list[0].keys())
+        defaults = self._copy_defaults(columns)
+        all_columns = columns + list(defaults)
+
+        try:
+            connection = await db.connection()
+            raw_connection = (await connection.get_raw_connection()).driver_connection
+            for start in range(0, len(obj_data_list), batch_size):
+                records = [
+                    tuple(obj_data[column] for column in columns) + tuple(default(None) for default in defaults.values())
+                    for obj_data in obj_data_list[start:start + batch_size]
+                ]
+                await raw_connection.copy_records_to_table(self.model.__tablename__, records=records,
+                                                           columns=all_columns)
+            await self.before_commit(db, self.get_write_keys(obj_data_list), run_hooks=run_hooks)
+            await db.commit()
+            logging.info("Bulk COPY completed for %s records in %s", len(obj_data_list), self.model.__name__)
+        except Exception as e:
+            await db.rollback()
+            logging.error("Error in bulk COPY for %s: %s", self.model.__name__, e)
+            return 0
+
+        await self.after_write(self.get_write_keys(obj_data_list), run_hooks=run_hooks)
+        return len(obj_data_list)
+
+    @timed_db_operation
     async def get_by_id(self, db: AsyncSession, obj_id: int, joins: Optional[List] = None) -> Optional[ModelType]:
         """
         Fetches a record by its primary key. Supports optional joins and optimized queries.
@@ -72,14 +250,15 @@ class BaseService(Generic[ModelType]):
             result = await db.execute(query)
             obj = result.scalars().first()
             if obj:
-                logging.info(f"Retrieved {self.model.__name__} with {self.primary_key}={obj_id}")
+                logging.info("Retrieved %s with %s=%s", self.model.__name__, self.primary_key, obj_id)
             else:
-                logging.warning(f"{self.model.__name__} with ID {obj_id} not found.")
+                logging.warning("%s with ID %s not found.", self.model.__name__, obj_id)
             return obj
         except Exception as e:
-            logging.error(f"Error retrieving {self.model.__name__} with ID {obj_id}: {e}")
+            logging.error("Error retrieving %s with ID %s: %s", self.model.__name__, obj_id, e)
             return None
 
+    @timed_db_operation
     async def get_all(self, db: AsyncSession, joins: Optional[List] = None) -> List[ModelType]:
         """
         Retrieves all records, with optional joins for related tables.
@@ -91,50 +270,152 @@ class BaseService(Generic[ModelType]):
 
         result = await db.execute(query)
         objs = result.scalars().all()
-        logging.info(f"Retrieved {len(objs)} {self.model.__name__} records.")
+        logging.info("Retrieved %s %s records.", len(objs), self.model.__name__)
         return objs
 
-    async def get_by_user_id(self, db: AsyncSession, user_id: int, joins: Optional[List] = None) -> List[ModelType]:
+    def apply_time_window(self, query, since: Optional[datetime] = None, until: Optional[datetime] = None):
+        """
+        Restricts a query to `since <= date_column < until`. Served by the (user_id, date) indexes.
         """
-        Fetches all records related to a specific user, with optional joins.
+        if since is None and until is None:
+            return query
+        if not self.date_column:
+            raise ValueError(f"{self.model.__name__} has no date column to filter on.")
+
+        date_column = getattr(self.model, self.date_column)
+        if since is not None:
+            query = query.where(date_column >= since)
+        if until is not None:
+            query = query.where(date_column < until)
+        return query
+
+    @timed_db_operation
+    async def get_by_user_id(self, db: AsyncSession, user_id: int, joins: Optional[List] = None,
+                             since: Optional[datetime] = None, until: Optional[datetime] = None,
+                             limit: Optional[int] = None, after: Optional[Tuple] = None) -> List[ModelType]:
+        """
+        Fetches records related to a specific user, with optional joins.
+        - since / until: only rows with since <= date_column < until.
+        - limit / after: keyset pagination ordered by (date_column, primary key). Pass the
+          (date, primary key) of the last row of a page as `after` to get the next page.
         """
         query = select(self.model).where(getattr(self.model, "user_id") == user_id)
+        query = self.apply_time_window(query, since, until)
+
+        if self.date_column:
+            order = (getattr(self.model, self.date_column), getattr(self.model, self.primary_key))
+            query = query.order_by(*order)
+            if after is not None:
+                query = query.where(tuple_(*order) > tuple_(*after))
+        if limit is not None:
+            query = query.limit(limit)
+
         if joins:
             for join_model in joins:
                 query = query.options(joinedload(join_model))
 
         result = await db.execute(query)
         objs = result.scalars().all()
-        logging.info(f"Retrieved {len(objs)} {self.model.__name__} records for user_id={user_id}.")
+        logging.info("Retrieved %s %s records for user_id=%s.", len(objs), self.model.__name__, user_id)
         return objs
 
+    @timed_db_operation
+    async def get_columns_by_user_id(self, db: AsyncSession, user_id: int, columns: List,
+                                     join_models: Optional[List] = None, since: Optional[datetime] = None,
+                                     until: Optional[datetime] = None) -> List[tuple]:
+        """
+        Lightweight read path: only `columns` of a user's rows, as plain tuples. No ORM instances are built and
+        nothing enters the session's identity map. `join_models` are joined along their foreign keys, so their
+        columns can be selected too (e.g. the bounds of a test result's Test).
+        """
+        query = select(*columns).where(getattr(self.model, "user_id") == user_id)
+        for join_model in join_models or []:
+            query = query.join(join_model)
+        query = self.apply_time_window(query, since, until)
+
+        result = await db.execute(query)
+        rows = result.tuples().all()
+        logging.info("Retrieved %s %s column rows for user_id=%s.", len(rows), self.model.__name__, user_id)
+        return rows
+
+    def get_column_names(self) -> List[str]:
+        return list(self.model.__table__.columns.keys())
+
+    async def stream_by_user_id(self, db: AsyncSession, user_id: int, since: Optional[datetime] = None,
+                                until: Optional[datetime] = None,
+                                fetch_size: Optional[int] = None) -> AsyncIterator[List[tuple]]:
+        """
+        Yields a user's rows (every table column, in get_column_names() order) as lists of at most `fetch_size`
+        tuples, ordered by (date_column, primary key). Rows are read through a server-side cursor, so memory stays
+        constant however long the history is. The session must stay open until the iteration ends.
+        """
+        query = select(*self.model.__table__.columns).where(self.model.__table__.c.user_id == user_id)
+        query = self.apply_time_window(query, since, until)
+        if self.date_column:
+            query = query.order_by(getattr(self.model, self.date_column), getattr(self.model, self.primary_key))
+
+        fetch_size = fetch_size or EXPORT_FETCH_SIZE
+        result = await db.stream(query.execution_options(yield_per=fetch_size))
+        count = 0
+        async for partition in result.partitions():
+            count += len(partition)
+            yield [tuple(row) for row in partition]
+        logging.info("Streamed %s %s records for user_id=%s.", count, self.model.__name__, user_id)
+
+    @timed_db_operation
+    async def aggregate(self, db: AsyncSession, aggregates: Dict[str, object],
+                        user_ids: Optional[List[int]] = None) -> Dict[int, dict]:
+        """
+        Runs SQL aggregates (e.g. {"total": func.sum(Model.col)}) grouped by user_id, optionally for a subset
+        of users. Returns {user_id: {name: value}} without loading any rows into the session.
+        """
+        user_id_column = getattr(self.model, "user_id")
+        query = select(user_id_column, *[expr.label(name) for name, expr in aggregates.items()]) \
+            .group_by(user_id_column)
+        if user_ids is not None:
+            query = query.where(user_id_column.in_(user_ids))
+
+        result = await db.execute(query)
+        rows = {row[0]: dict(zip(aggregates, row[1:])) for row in result.all()}
+        logging.info("Aggregated %s for %s users.", self.model.__name__, len(rows))
+        return rows
+
+    @timed_db_operation
     async def update(self, db: AsyncSession, obj_id: int, obj_data: dict) -> Optional[ModelType]:
         """
         Updates a record by primary key.
         """
         obj = await self.get_by_id(db, obj_id)
         if not obj:
-            logging.warning(f"Update failed: {self.model.__name__} with {self.primary_key}={obj_id} not found.")
+            logging.warning("Update failed: %s with %s=%s not found.", self.model.__name__, self.primary_key, obj_id)
             return None
 
+        previous_keys = self.get_write_keys([obj])
         for key, value in obj_data.items():
             setattr(obj, key, value)
 
+        keys = previous_keys + self.get_write_keys([obj])
+        await self.before_commit(db, keys)
         await db.commit()
         await db.refresh(obj)
-        logging.info(f"Updated {self.model.__name__} with {self.primary_key}={obj_id}")
+        await self.after_write(keys)
+        logging.info("Updated %s with %s=%s", self.model.__name__, self.primary_key, obj_id)
         return obj
 
+    @timed_db_operation
     async def delete(self, db: AsyncSession, obj_id: int) -> bool:
         """
         Deletes a record by primary key.
         """
         obj = await self.get_by_id(db, obj_id)
         if not obj:
-            logging.warning(f"Delete failed: {self.model.__name__} with {self.primary_key}={obj_id} not found.")
+            logging.warning("Delete failed: %s with %s=%s not found.", self.model.__name__, self.primary_key, obj_id)
             return False
 
+        deleted_keys = self.get_write_keys([obj])
         await db.delete(obj)
+        await self.before_commit(db, deleted_keys)
         await db.commit()
-        logging.info(f"Deleted {self.model.__name__} with {self.primary_key}={obj_id}")
+        await self.after_write(deleted_keys)
+        logging.info("Deleted %s with %s=%s", self.model.__name__, self.primary_key, obj_id)
         return True
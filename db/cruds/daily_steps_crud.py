@@ -1,11 +1,15 @@
 from db.models import DailySteps
 
 from db.cruds.base_crud import BaseService
+from db.cruds.rollup_crud import rollup_service
+from app.utils.score_series import on_write as series_on_write
 
 
 class StepService(BaseService[DailySteps]):
     def __init__(self):
-        super().__init__(DailySteps)
+        super().__init__(DailySteps, date_column="date")
+        self.transaction_hooks.append(rollup_service.refresh)
+        self.write_hooks.append(series_on_write)
 
 
 step_service = StepService()
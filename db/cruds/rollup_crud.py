@@ -0,0 +1,149 @@
+from app.logger import logging
+
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, func, cast, literal, literal_column, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, List, Tuple
+
+from db.models import UserRollup, RollupPeriodEnum, DailySteps, SleepingActivity, PhysicalActivity
+from db.cruds.base_crud import BaseService
+from app.utils.metrics import timed_db_operation
+from db.cruds.stats_crud import ACTIVE_MINUTES
+
+# First key of the per-user advisory lock serializing bucket recomputation
+ADVISORY_LOCK_NAMESPACE = 7302
+
+ROLLUP_COLUMNS = ["total_steps", "active_minutes", "calories_burned", "sleep_minutes", "sleep_count",
+                  "sleep_efficiency_total"]
+
+
+def bucket_start(value, period: RollupPeriodEnum) -> datetime:
+    """
+    Start of the day / week (Monday, like Postgres date_trunc) / month containing `value`.
+    """
+    day = datetime.combine(value.date() if isinstance(value, datetime) else value, datetime.min.time())
+    if period == RollupPeriodEnum.week:
+        return day - timedelta(days=day.weekday())
+    if period == RollupPeriodEnum.month:
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(start: datetime, period: RollupPeriodEnum) -> datetime:
+    if period == RollupPeriodEnum.week:
+        return start + timedelta(days=7)
+    if period == RollupPeriodEnum.month:
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+class RollupService(BaseService[UserRollup]):
+    """
+    Maintains `user_rollups`: step, activity and sleep totals per user per day, week and month.
+    Buckets touched by a write are recomputed from the raw rows, so updates and deletes stay exact.
+    """
+
+    def __init__(self):
+        super().__init__(UserRollup, date_column="period_start")
+
+    @staticmethod
+    def _source_rows(period: RollupPeriodEnum, user_id: Optional[int] = None,
+                     since: Optional[datetime] = None, until: Optional[datetime] = None):
+        """
+        One row per raw steps / activity / sleep record with its bucket and its share of every rollup column.
+        """
+        def rows(model, date_column, *values):
+            query = select(model.user_id.label("user_id"),
+                           func.date_trunc(period.value, date_column).label("bucket"), *values)
+            if user_id is not None:
+                query = query.where(model.user_id == user_id)
+            if since is not None:
+                query = query.where(date_column >= since)
+            if until is not None:
+                query = query.where(date_column < until)
+            return query
+
+        zero = literal_column("0")
+        return union_all(
+            rows(DailySteps, DailySteps.date,
+                 DailySteps.total_steps.label("total_steps"), zero.label("active_minutes"),
+                 zero.label("calories_burned"), zero.label("sleep_minutes"), zero.label("sleep_count"),
+                 zero.label("sleep_efficiency_total")),
+            rows(PhysicalActivity, PhysicalActivity.start_time,
+                 zero, ACTIVE_MINUTES, func.coalesce(PhysicalActivity.calories_burned, 0), zero, zero, zero),
+            rows(SleepingActivity, SleepingActivity.sleep_date,
+                 zero, zero, zero, SleepingActivity.sleep_duration, literal_column("1"),
+                 SleepingActivity.sleep_efficiency),
+        ).subquery()
+
+    @staticmethod
+    def _upsert_from(period: RollupPeriodEnum, source):
+        grouped = select(
+            source.c.user_id,
+            cast(literal(period, type_=UserRollup.__table__.c.period.type), UserRollup.__table__.c.period.type),
+            source.c.bucket,
+            *[func.sum(source.c[column]) for column in ROLLUP_COLUMNS],
+            func.now(),
+        ).group_by(source.c.user_id, source.c.bucket)
+
+        statement = pg_insert(UserRollup).from_select(
+            ["user_id", "period", "period_start", *ROLLUP_COLUMNS, "updated_at"], grouped)
+        return statement.on_conflict_do_update(
+            constraint="uq_user_rollups_bucket",
+            set_={column: statement.excluded[column] for column in ROLLUP_COLUMNS + ["updated_at"]},
+        )
+
+    @timed_db_operation
+    async def refresh(self, db: AsyncSession, keys: List[Tuple]) -> None:
+        """
+        Transaction hook of the steps / sleep / activity services: recomputes every day, week and month bucket
+        between the earliest and latest written date of each affected user, in the writer's transaction, so the
+        rollups commit together with the rows they are computed from. Does not commit.
+        """
+        ranges = {}
+        for user_id, value in keys:
+            if user_id is None or value is None:
+                continue
+            first, last = ranges.get(user_id, (value, value))
+            ranges[user_id] = (min(first, value), max(last, value))
+
+        for user_id, (first, last) in sorted(ranges.items()):
+            # A concurrent writer of the same user must not recompute the buckets from a snapshot without the rows
+            # of this transaction; users are locked in sorted order so writers of several users cannot deadlock
+            await db.execute(select(func.pg_advisory_xact_lock(ADVISORY_LOCK_NAMESPACE, user_id)))
+            for period in RollupPeriodEnum:
+                since = bucket_start(first, period)
+                until = next_bucket(bucket_start(last, period), period)
+                await db.execute(delete(UserRollup).where(UserRollup.user_id == user_id, UserRollup.period == period,
+                                                          UserRollup.period_start >= since,
+                                                          UserRollup.period_start < until))
+                await db.execute(self._upsert_from(period, self._source_rows(period, user_id, since, until)))
+        logging.info("Refreshed rollups for %s users.", len(ranges))
+
+    @timed_db_operation
+    async def rebuild(self, db: AsyncSession, user_ids: Optional[List[int]] = None) -> int:
+        """
+        Backfills the rollups from all raw history, for every user or only `user_ids`. Returns the bucket count.
+        """
+        query = delete(UserRollup)
+        if user_ids is not None:
+            query = query.where(UserRollup.user_id.in_(user_ids))
+        await db.execute(query)
+
+        for period in RollupPeriodEnum:
+            source = self._source_rows(period)
+            if user_ids is not None:
+                source = select(source).where(source.c.user_id.in_(user_ids)).subquery()
+            await db.execute(self._upsert_from(period, source))
+        await db.commit()
+
+        query = select(func.count()).select_from(UserRollup)
+        if user_ids is not None:
+            query = query.where(UserRollup.user_id.in_(user_ids))
+        buckets = (await db.execute(query)).scalar_one()
+        logging.info("Rebuilt %s rollup buckets.", buckets)
+        return buckets
+
+
+rollup_service = RollupService()
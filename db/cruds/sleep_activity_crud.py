@@ -1,9 +1,13 @@
 from db.models import SleepingActivity
 
 from db.cruds.base_crud import BaseService
+from db.cruds.rollup_crud import rollup_service
+from app.utils.score_series import on_write as series_on_write
 
 class SleepService(BaseService[SleepingActivity]):
     def __init__(self):
-        super().__init__(SleepingActivity)
+        super().__init__(SleepingActivity, date_column="sleep_date")
+        self.transaction_hooks.append(rollup_service.refresh)
+        self.write_hooks.append(series_on_write)
 
 sleep_service = SleepService()
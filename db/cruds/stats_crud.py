@@ -0,0 +1,190 @@
+from app.logger import logging
+
+from sqlalchemy import select, func, case, or_, literal_column
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, List, Dict, Tuple
+from datetime import datetime, date
+
+from app.utils.metrics import timed_db_operation
+from db.models import User, Test, TestResult, DailySteps, SleepingActivity, PhysicalActivity, UserRollup, \
+    RollupPeriodEnum
+
+# Per-activity minutes, floored the same way as `(end_time - start_time).total_seconds() // 60`
+ACTIVE_MINUTES = func.floor(func.extract("epoch", PhysicalActivity.end_time - PhysicalActivity.start_time) / 60)
+
+# Distance from the middle of the reference range, only for results outside of it (see calculate_BHI)
+BHI_DEVIATION = case(
+    (or_(TestResult.result_value < Test.lower_bound, TestResult.result_value > Test.upper_bound),
+     func.abs(TestResult.result_value - (Test.lower_bound + Test.upper_bound) / 2)),
+    else_=0,
+)
+
+
+# Per-day totals returned by StatsService.get_daily_totals, in this order
+DAILY_TOTAL_FIELDS = ("total_steps", "active_minutes", "calories_burned", "sleep_minutes", "sleep_count",
+                      "bhi_deviation", "result_count")
+
+
+def _to_float(value) -> Optional[float]:
+    return float(value) if value is not None else None
+
+
+class StatsService:
+    """
+    Per-user health totals computed by Postgres (SUM / AVG / COUNT), so reports do not load every row a user has.
+    """
+
+    @staticmethod
+    def _user_rows(model, date_column, user_id_column, since=None, until=None) -> list:
+        """
+        WHERE conditions selecting one user's rows of `model`, optionally within since <= date_column < until.
+        """
+        conditions = [model.user_id == user_id_column]
+        if since is not None:
+            conditions.append(date_column >= since)
+        if until is not None:
+            conditions.append(date_column < until)
+        return conditions
+
+    def _rollup_totals_columns(self, user_id_column, since=None, until=None) -> list:
+        """
+        Same activity and sleep totals as `_totals_columns`, read from the daily rollups instead of raw rows.
+        """
+        days = self._user_rows(UserRollup, UserRollup.period_start, user_id_column, since, until)
+        days.append(UserRollup.period == RollupPeriodEnum.day)
+
+        def total(column, label):
+            return select(func.coalesce(func.sum(column), 0)).where(*days).scalar_subquery().label(label)
+
+        return [
+            total(UserRollup.total_steps, "total_steps"),
+            total(UserRollup.active_minutes, "active_minutes"),
+            total(UserRollup.calories_burned, "calories_burned"),
+            select(func.sum(UserRollup.sleep_minutes) / func.nullif(func.sum(UserRollup.sleep_count), 0))
+            .where(*days).scalar_subquery().label("avg_sleep_minutes"),
+            total(UserRollup.sleep_count, "sleep_count"),
+        ]
+
+    def _totals_columns(self, user_id_column, since=None, until=None, from_rollups=False) -> list:
+        """
+        Correlated scalar subqueries, one per total, evaluated for each row of the enclosing users query.
+        With `from_rollups` the activity and sleep totals come from the daily rollups.
+        """
+        steps = self._user_rows(DailySteps, DailySteps.date, user_id_column, since, until)
+        activities = self._user_rows(PhysicalActivity, PhysicalActivity.start_time, user_id_column, since, until)
+        sleep = self._user_rows(SleepingActivity, SleepingActivity.sleep_date, user_id_column, since, until)
+        results = self._user_rows(TestResult, TestResult.test_date, user_id_column, since, until)
+        bhi_deviation = select(func.coalesce(func.sum(BHI_DEVIATION), 0)).select_from(TestResult) \
+            .join(Test, TestResult.test_id == Test.test_id) \
+            .where(*results).scalar_subquery().label("bhi_deviation")
+        if from_rollups:
+            return self._rollup_totals_columns(user_id_column, since, until) + [bhi_deviation]
+
+        return [
+            select(func.coalesce(func.sum(DailySteps.total_steps), 0))
+            .where(*steps).scalar_subquery().label("total_steps"),
+            select(func.coalesce(func.sum(ACTIVE_MINUTES), 0))
+            .where(*activities).scalar_subquery().label("active_minutes"),
+            select(func.coalesce(func.sum(PhysicalActivity.calories_burned), 0))
+            .where(*activities).scalar_subquery().label("calories_burned"),
+            select(func.avg(SleepingActivity.sleep_duration))
+            .where(*sleep).scalar_subquery().label("avg_sleep_minutes"),
+            select(func.count()).select_from(SleepingActivity)
+            .where(*sleep).scalar_subquery().label("sleep_count"),
+            bhi_deviation,
+        ]
+
+    @staticmethod
+    def _row_to_totals(row) -> dict:
+        return {
+            "total_steps": int(row.total_steps),
+            "active_minutes": float(row.active_minutes),
+            "calories_burned": float(row.calories_burned),
+            "avg_sleep_minutes": _to_float(row.avg_sleep_minutes),
+            "sleep_count": row.sleep_count,
+            "bhi_deviation": float(row.bhi_deviation),
+        }
+
+    @timed_db_operation
+    async def get_user_summary(self, db: AsyncSession, user_id: int, since: Optional[datetime] = None,
+                               until: Optional[datetime] = None,
+                               from_rollups: bool = False) -> Optional[Tuple[User, dict]]:
+        """
+        Fetches the user together with their health totals (optionally for a time window) in a single round trip.
+        """
+        columns = self._totals_columns(User.user_id, since, until, from_rollups)
+        query = select(User, *columns).where(User.user_id == user_id)
+        result = await db.execute(query)
+        row = result.first()
+        if not row:
+            logging.warning("User with ID %s not found.", user_id)
+            return None
+
+        logging.info("Retrieved health totals for user_id=%s.", user_id)
+        return row[0], self._row_to_totals(row)
+
+    @timed_db_operation
+    async def get_totals(self, db: AsyncSession, user_ids: Optional[List[int]] = None,
+                         since: Optional[datetime] = None, until: Optional[datetime] = None,
+                         from_rollups: bool = False) -> Dict[int, dict]:
+        """
+        Health totals for many users at once, keyed by user_id.
+        """
+        query = select(User.user_id, *self._totals_columns(User.user_id, since, until, from_rollups))
+        if user_ids is not None:
+            query = query.where(User.user_id.in_(user_ids))
+
+        result = await db.execute(query)
+        totals = {row.user_id: self._row_to_totals(row) for row in result.all()}
+        logging.info("Retrieved health totals for %s users.", len(totals))
+        return totals
+
+    @timed_db_operation
+    async def get_daily_totals(self, db: AsyncSession, user_id: int, since: datetime,
+                               until: datetime) -> Dict[date, tuple]:
+        """
+        One tuple of DAILY_TOTAL_FIELDS per day with data in since <= day < until: activity and sleep from the daily
+        rollups, BHI deviation and result count from the test results. Days without any row are left out.
+        """
+        rollups = select(UserRollup.period_start, UserRollup.total_steps, UserRollup.active_minutes,
+                         UserRollup.calories_burned, UserRollup.sleep_minutes, UserRollup.sleep_count) \
+            .where(*self._user_rows(UserRollup, UserRollup.period_start, user_id, since, until),
+                   UserRollup.period == RollupPeriodEnum.day)
+        day = func.date_trunc("day", TestResult.test_date)
+        results = select(day, func.sum(BHI_DEVIATION), func.count()).select_from(TestResult) \
+            .join(Test, TestResult.test_id == Test.test_id) \
+            .where(*self._user_rows(TestResult, TestResult.test_date, user_id, since, until)).group_by(day)
+
+        empty = (0, 0.0, 0.0, 0, 0)
+        totals = {}
+        for period_start, *values in (await db.execute(rollups)).all():
+            totals[period_start.date()] = (int(values[0]), float(values[1]), float(values[2]), int(values[3]),
+                                           values[4], 0.0, 0)
+        for result_day, deviation, count in (await db.execute(results)).all():
+            totals[result_day.date()] = totals.get(result_day.date(), empty)[:5] + (float(deviation), count)
+        logging.info("Retrieved daily totals of %s days for user_id=%s.", len(totals), user_id)
+        return totals
+
+    @timed_db_operation
+    async def get_data_version(self, db: AsyncSession, user_id: int) -> Optional[str]:
+        """
+        Cheap fingerprint of everything a user's report is built from: a digest of the user row plus the row count
+        and latest write (updated_at, or created_at for rows written before updated_at existed) of each health
+        table. Only database state goes in, so it is the same in every worker and across restarts, and in-place
+        updates change it too. Returns None if the user does not exist.
+        """
+        columns = [func.md5(literal_column("users::text"))]
+        for model in (TestResult, DailySteps, SleepingActivity, PhysicalActivity):
+            columns.append(select(func.count()).select_from(model)
+                           .where(model.user_id == User.user_id).scalar_subquery())
+            columns.append(select(func.max(func.coalesce(model.updated_at, model.created_at)))
+                           .where(model.user_id == User.user_id).scalar_subquery())
+
+        result = await db.execute(select(*columns).select_from(User).where(User.user_id == user_id))
+        row = result.first()
+        if not row:
+            return None
+        return "|".join(str(value) for value in row)
+
+
+stats_service = StatsService()
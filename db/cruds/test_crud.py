@@ -1,10 +1,12 @@
 from db.models import Test
 
 from db.cruds.base_crud import BaseService
+from app.utils.catalog import catalog
 
 
 class TestService(BaseService[Test]):
     def __init__(self):
         super().__init__(Test)
+        self.write_hooks.append(catalog.on_write)
 
 test_service = TestService()
@@ -1,11 +1,15 @@
 from db.models import TestResult
 
 from db.cruds.base_crud import BaseService
+from app.utils.score_series import on_write as series_on_write
+from db.cruds.anomaly_crud import anomaly_service
 
 
 class TestResultService(BaseService[TestResult]):
     def __init__(self):
-        super().__init__(TestResult)
+        super().__init__(TestResult, date_column="test_date")
+        self.write_hooks.append(series_on_write)
+        self.write_hooks.append(anomaly_service.evaluate_test_results)
 
 
 test_result_service = TestResultService()
@@ -1,21 +1,100 @@
 import asyncio
+import hashlib
+import random
+import time
 
 import asyncpg
+from sqlalchemy import event, text, Enum, inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from app.config import DB_URI, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME
-import os
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.schema import CreateTable, CreateIndex
+from app.config import DB_URI, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME, DB_POOL_SIZE, DB_MAX_OVERFLOW, \
+    DB_POOL_TIMEOUT, DB_POOL_PRE_PING, DB_POOL_RECYCLE, DB_STATEMENT_CACHE_SIZE, DB_ECHO, DB_SLOW_QUERY_MS, \
+    DB_CONNECT_TIMEOUT, DB_CONNECT_BACKOFF_INITIAL, DB_CONNECT_BACKOFF_MAX
 from app.logger import logging
 from db.base import Base
 
-load_data_path = os.path.join(os.getcwd(), "data", "load_data.py")
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that records how long checkouts wait for a connection and logs pool exhaustion.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            logging.warning("Connection pool exhausted after %.2fs: %s", time.perf_counter() - start, self.status())
+            raise
+        finally:
+            wait = time.perf_counter() - start
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def stats(self) -> dict:
+        return {
+            "pool_size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": self.checkedout(),
+            "idle": self.checkedin(),
+            "overflow": self.overflow(),
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+        }
+
+
+def _database_url():
+    url = make_url(DB_URI)
+    # SQLAlchemy's own cache of asyncpg prepared statements, sized together with asyncpg's statement cache
+    return url.update_query_dict({"prepared_statement_cache_size": str(DB_STATEMENT_CACHE_SIZE)})
+
+
 # Create Async Database Engine
 engine = create_async_engine(
-    DB_URI,
-    echo=True,
-    future=True
+    _database_url(),
+    echo=DB_ECHO,
+    poolclass=InstrumentedPool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    pool_recycle=DB_POOL_RECYCLE,
+    connect_args={"statement_cache_size": DB_STATEMENT_CACHE_SIZE},
 )
 
+
+if DB_SLOW_QUERY_MS > 0:
+    # The start time lives on the statement's execution context, so a failed statement (which gets no
+    # after_cursor_execute) leaves nothing behind on the connection
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        context.query_start = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _log_slow_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - context.query_start) * 1000
+        if elapsed_ms >= DB_SLOW_QUERY_MS:
+            logging.warning("Slow query (%.1f ms): %.1000s", elapsed_ms, " ".join(statement.split()))
+
+
+def get_pool_stats() -> dict:
+    return engine.pool.stats()
+
 # Create an Async Session Factory
 AsyncSessionLocal = sessionmaker(
     bind=engine,
@@ -32,57 +111,205 @@ async def get_db() -> AsyncSession:
 
 
 async def wait_for_db():
-    """Wait for PostgreSQL to be ready before connecting."""
-    retries = 10
-    while retries:
+    """
+    Connects to the `postgres` maintenance database, retrying with jittered exponential backoff until
+    DB_CONNECT_TIMEOUT. Returns the connection, which the caller reuses for the rest of the bootstrap and closes.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + DB_CONNECT_TIMEOUT
+    delay = DB_CONNECT_BACKOFF_INITIAL
+    attempt = 0
+    while True:
+        attempt += 1
         try:
             conn = await asyncpg.connect(user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT,
-                                         database="postgres")
-            await conn.close()
-            logging.info("✅ PostgreSQL is ready!")
-            return
+                                         database="postgres", timeout=max(1.0, deadline - loop.time()))
+            logging.info("✅ PostgreSQL is ready after %s attempt(s).", attempt)
+            return conn
         except Exception as e:
-            logging.warning(f"⏳ Waiting for PostgreSQL... {retries} attempts left")
-            retries -= 1
-            await asyncio.sleep(5)
-    raise Exception("❌ PostgreSQL is not available. Exiting...")
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise RuntimeError("❌ PostgreSQL is not available. Exiting...") from e
+            logging.warning("⏳ Waiting for PostgreSQL (attempt %s): %s", attempt, e)
+            await asyncio.sleep(min(delay * random.uniform(0.5, 1.0), remaining))
+            delay = min(delay * 2, DB_CONNECT_BACKOFF_MAX)
 
 
-async def create_database_if_not_exists():
-    """Creates the database if it does not exist."""
-    try:
-        conn = await asyncpg.connect(user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT,
-                                     database="postgres")
-        result = await conn.fetchval(f"SELECT 1 FROM pg_database WHERE datname = '{DB_NAME}';")
+async def create_database_if_not_exists(conn) -> bool:
+    """Creates the database if it does not exist, on the bootstrap connection. Returns True if it was created."""
+    if await conn.fetchval("SELECT 1 FROM pg_database WHERE datname = $1", DB_NAME):
+        logging.info("✅ Database '%s' already exists.", DB_NAME)
+        return False
+
+    await conn.execute(f'CREATE DATABASE "{DB_NAME}" WITH OWNER "{DB_USER}"')
+    logging.info("✅ Database '%s' created successfully.", DB_NAME)
+    return True
+
+
+def schema_digest() -> str:
+    """
+    Fingerprint of the DDL of every model table, index and enum. Stored in `schema_version` once the schema is
+    created, so later startups can skip the DDL entirely when the models have not changed.
+    """
+    import db.models  # noqa: F401  Registers every table on Base.metadata
 
-        if not result:
-            await conn.execute(f"CREATE DATABASE {DB_NAME} WITH OWNER {DB_USER};")
-            logging.info(f"✅ Database '{DB_NAME}' created successfully.")
+    parts = []
+    for table in Base.metadata.sorted_tables:
+        parts.append(str(CreateTable(table).compile(dialect=engine.dialect)))
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            parts.append(str(CreateIndex(index).compile(dialect=engine.dialect)))
+        for column in table.columns:
+            if isinstance(column.type, Enum):
+                parts.append(f"{column.type.name}: {column.type.enums}")
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()[:16]
+
+
+async def ensure_schema() -> bool:
+    """
+    Creates the missing tables, nullable columns and indexes unless `schema_version` already holds the current
+    schema digest.
+    Returns True if DDL was run. Concurrent starts are serialized with an advisory lock.
+    """
+    digest = schema_digest()
+    async with engine.begin() as conn:
+        if await _stored_schema_version(conn) == digest:
+            logging.info("Schema version %s is current, skipping DDL.", digest)
             return False
-        else:
-            logging.info(f"✅ Database '{DB_NAME}' already exists.")
-            return True
-        await conn.close()
-    except Exception as e:
-        logging.error(f"❌ Error creating database: {e}")
+
+        await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('schema_version'))"))
+        if await _stored_schema_version(conn) == digest:  # Another instance created it while we waited
+            return False
+
+        await conn.run_sync(Base.metadata.create_all)
+        await _sync_columns(conn)
+        if not await _sync_indexes(conn):
+            return True  # Version left unrecorded so the next startup retries the failed indexes
+        await conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version "
+                                "(id INTEGER PRIMARY KEY, version TEXT NOT NULL, updated_at TIMESTAMP NOT NULL)"))
+        await conn.execute(text("INSERT INTO schema_version (id, version, updated_at) VALUES (1, :version, now()) "
+                                "ON CONFLICT (id) DO UPDATE SET version = :version, updated_at = now()"),
+                           {"version": digest})
+    logging.info("✅ Schema created, version %s.", digest)
+    return True
+
+
+# Columns removed from the models; dropped so inserts that no longer set them do not hit their NOT NULL
+RETIRED_COLUMNS = {
+    "user_baselines": ("last_source_id",),  # Replaced by the anomaly_checked flag on the source rows
+}
+
+
+async def _sync_columns(conn):
+    """
+    create_all does not alter existing tables: adds the nullable columns declared on models but missing from their
+    table (e.g. updated_at) and drops the retired ones. Other missing columns need a manual migration and are only
+    logged.
+    """
+    existing = await conn.run_sync(
+        lambda sync_conn: {table: {column["name"] for column in inspect(sync_conn).get_columns(table)}
+                           for table in inspect(sync_conn).get_table_names()})
+    for table in Base.metadata.sorted_tables:
+        for column in table.columns:
+            if column.name in existing.get(table.name, {column.name}):
+                continue
+            if not column.nullable:
+                logging.error("Column %s.%s is missing and NOT NULL; add it with a migration.", table.name,
+                              column.name)
+                continue
+            column_type = column.type.compile(dialect=conn.dialect)
+            await conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN IF NOT EXISTS "{column.name}" '
+                                    f'{column_type}'))
+            logging.info("Added column %s.%s.", table.name, column.name)
+
+    for table_name, columns in RETIRED_COLUMNS.items():
+        for column_name in columns:
+            if column_name in existing.get(table_name, ()):
+                await conn.execute(text(f'ALTER TABLE "{table_name}" DROP COLUMN IF EXISTS "{column_name}"'))
+                logging.info("Dropped retired column %s.%s.", table_name, column_name)
+
+
+# Retired index -> the index that replaced it. The single-column user_id indexes are covered by the (user_id, date)
+# ones. The unique (user_id, date) indexes of the first ingestion version rejected legitimate rows (two sleeps on one
+# date); ingestion upserts on (user_id, source_id) instead.
+RETIRED_INDEXES = {
+    "idx_test_results_user": "idx_test_results_user_date",
+    "idx_sleep_user": "idx_sleep_user_date",
+    "uq_sleep_user_date": "idx_sleep_user_date",
+    "idx_daily_steps_user": "idx_daily_steps_user_date",
+    "uq_daily_steps_user_date": "idx_daily_steps_user_date",
+    "idx_activity_user": "idx_activity_user_time",
+    "uq_activity_user_time": "idx_activity_user_time",
+}
+
+
+# Indexes the last _sync_indexes could not create; ingestion is refused while one of its conflict targets is here
+unbuilt_indexes = set()
+
+
+async def _sync_indexes(conn) -> bool:
+    """
+    create_all only creates indexes together with their table: creates the indexes added to existing tables and
+    drops each retired index once its replacement exists. An index that cannot be built is logged, skipped and
+    recorded in `unbuilt_indexes`, and the index it replaces is kept. Returns False if any index failed.
+    """
+    failed = set()
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                async with conn.begin_nested():
+                    await conn.execute(CreateIndex(index, if_not_exists=True))
+            except Exception as e:
+                failed.add(index.name)
+                logging.error("Could not create index %s on %s: %s", index.name, table.name, e)
+
+    for name, replacement in RETIRED_INDEXES.items():
+        if replacement not in failed:
+            await conn.execute(text(f'DROP INDEX IF EXISTS "{name}"'))
+    unbuilt_indexes.clear()
+    unbuilt_indexes.update(failed)
+    return not failed
+
+
+async def _stored_schema_version(conn):
+    if not (await conn.execute(text("SELECT to_regclass('schema_version') IS NOT NULL"))).scalar():
+        return None
+    return (await conn.execute(text("SELECT version FROM schema_version WHERE id = 1"))).scalar()
 
 
 async def init_db():
     """Ensures PostgreSQL is ready, creates the database, and initializes tables."""
-    await wait_for_db()
-    is_exist=await create_database_if_not_exists()
+    conn = await wait_for_db()
+    try:
+        created = await create_database_if_not_exists(conn)
+    finally:
+        await conn.close()
 
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    if not is_exist:
+    await ensure_schema()
+    if created:
         await run_load_data()
     logging.info("✅ Database initialized successfully.")
 
 
+async def ping_db(timeout: float = 2.0) -> bool:
+    """Readiness check: a pooled connection answers SELECT 1 within `timeout` seconds."""
+    async def ping():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    try:
+        await asyncio.wait_for(ping(), timeout)
+        return True
+    except Exception as e:
+        logging.warning("Database ping failed: %s", e)
+        return False
+
+
 async def run_load_data():
     """
-    Runs the `load_data.py` script after database initialization.
+    Loads the `data/` fixtures in-process after database initialization.
     """
+    from data.load_data import load_all_data  # Imported lazily, the loader itself depends on this module
+
     logging.info("Running load_data.py...")
-    os.system(f"python {load_data_path}")
+    await load_all_data()
     logging.info("Data loading complete.")
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float, Date, TIMESTAMP, Enum, Index
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, DateTime, Float, Date, TIMESTAMP, Enum, Index, \
+    UniqueConstraint, Boolean
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from db.base import Base
@@ -11,6 +12,17 @@ class GenderEnum(str, enum.Enum):
     Other = "Other"
 
 
+class RollupPeriodEnum(str, enum.Enum):
+    day = "day"
+    week = "week"
+    month = "month"
+
+
+class AnomalyKindEnum(str, enum.Enum):
+    out_of_range = "out_of_range"  # Outside the test's reference range / the plausible heart rate range
+    baseline = "baseline"  # Far from the user's own running mean
+
+
 class User(Base):
     __tablename__ = "users"
     user_id = Column(Integer, primary_key=True, autoincrement=True)
@@ -48,11 +60,14 @@ class TestResult(Base):
     test_date = Column(DateTime, nullable=False)
     result_value = Column(Float, nullable=False)
     created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)  # Part of the report ETag
+    anomaly_checked = Column(Boolean, nullable=True)  # Set once AnomalyService has evaluated the row
 
-    test = relationship("Test", backref="test_results", lazy="joined")
+    # Bounds come from the in-process catalog (app/utils/catalog.py) by test_id; loading them per row is an error
+    test = relationship("Test", backref="test_results", lazy="raise")
 
     __table_args__ = (
-        Index("idx_test_results_user", user_id),
+        Index("idx_test_results_user_date", user_id, test_date),
         Index("idx_test_results_test", test_id),
         Index("idx_test_results_date", test_date),
     )
@@ -71,10 +86,13 @@ class SleepingActivity(Base):
     wakeups = Column(Integer, nullable=False)
     bedtime = Column(DateTime, nullable=False)
     wake_time = Column(DateTime, nullable=False)
+    source_id = Column(String(64), nullable=True)  # Client sample id of ingested rows, the upsert key
     created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)  # Part of the report ETag
 
     __table_args__ = (
-        Index("idx_sleep_user", user_id),
+        Index("idx_sleep_user_date", user_id, sleep_date),
+        Index("uq_sleep_user_source", user_id, source_id, unique=True),  # Conflict target of ingestion upserts
         Index("idx_sleep_date", sleep_date),
     )
 
@@ -89,10 +107,13 @@ class DailySteps(Base):
     total_calories_burned = Column(Float, nullable=True)
     distance_walked_km = Column(Float, nullable=True)
     active_minutes = Column(Integer, nullable=True)
+    source_id = Column(String(64), nullable=True)  # Client sample id of ingested rows, the upsert key
     created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)  # Part of the report ETag
 
     __table_args__ = (
-        Index("idx_daily_steps_user", user_id),
+        Index("idx_daily_steps_user_date", user_id, date),
+        Index("uq_daily_steps_user_source", user_id, source_id, unique=True),  # Conflict target of ingestion upserts
         Index("idx_daily_steps_date", date),
     )
 
@@ -116,10 +137,85 @@ class PhysicalActivity(Base):
     calories_burned = Column(Float, nullable=True)
     avg_heart_rate = Column(Integer, nullable=True)
     max_heart_rate = Column(Integer, nullable=True)
+    source_id = Column(String(64), nullable=True)  # Client sample id of ingested rows, the upsert key
     created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)  # Part of the report ETag
+    anomaly_checked = Column(Boolean, nullable=True)  # Set once AnomalyService has evaluated the row
 
     __table_args__ = (
-        Index("idx_activity_user", user_id),
+        Index("idx_activity_user_time", user_id, start_time),
+        Index("uq_activity_user_source", user_id, source_id, unique=True),  # Conflict target of ingestion upserts
         Index("idx_activity_type", activity_type_id),
         Index("idx_activity_time", start_time, end_time),
     )
+
+
+# Per-user activity and sleep rollups per day / week / month, maintained by RollupService
+class UserRollup(Base):
+    __tablename__ = "user_rollups"
+    rollup_id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
+    period = Column(Enum(RollupPeriodEnum, name="rollup_period_enum"), nullable=False)
+    period_start = Column(DateTime, nullable=False)
+    total_steps = Column(BigInteger, nullable=False, default=0)
+    active_minutes = Column(Float, nullable=False, default=0)
+    calories_burned = Column(Float, nullable=False, default=0)
+    sleep_minutes = Column(BigInteger, nullable=False, default=0)
+    sleep_count = Column(Integer, nullable=False, default=0)
+    sleep_efficiency_total = Column(Float, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "period", "period_start", name="uq_user_rollups_bucket"),
+    )
+
+
+# All-history FHS of every user with their peer cohort, replaced as a whole by CohortRanking.build
+class CohortScore(Base):
+    __tablename__ = "cohort_scores"
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True)
+    age_band = Column(String(10), nullable=False)
+    gender = Column(String(20), nullable=False)
+    fhs = Column(Float, nullable=False)
+    built_at = Column(DateTime, nullable=False)  # Same on every row of a build: the ranking version
+
+    __table_args__ = (
+        Index("idx_cohort_scores_built_at", built_at),
+    )
+
+
+# Running mean / variance (Welford) of one metric of a user, e.g. "test:3" or "max_heart_rate", maintained by
+# AnomalyService as results and activities are written
+class UserBaseline(Base):
+    __tablename__ = "user_baselines"
+    baseline_id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
+    metric = Column(String(50), nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    mean = Column(Float, nullable=False, default=0)
+    m2 = Column(Float, nullable=False, default=0)  # Sum of squared deviations from the mean
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "metric", name="uq_user_baselines_metric"),
+    )
+
+
+# Test results and activity vitals flagged when they were written
+class AnomalyEvent(Base):
+    __tablename__ = "anomaly_events"
+    event_id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
+    metric = Column(String(50), nullable=False)
+    kind = Column(Enum(AnomalyKindEnum, name="anomaly_kind_enum"), nullable=False)
+    source_id = Column(Integer, nullable=False)  # result_id / activity_id of the flagged row
+    observed_at = Column(DateTime, nullable=False)
+    value = Column(Float, nullable=False)
+    expected_low = Column(Float, nullable=True)
+    expected_high = Column(Float, nullable=True)
+    z_score = Column(Float, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        Index("idx_anomaly_events_user_time", user_id, observed_at),
+    )
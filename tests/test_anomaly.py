@@ -0,0 +1,112 @@
+import asyncio
+import statistics
+from collections import namedtuple
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql.dml import Insert, Update
+
+from app.utils.anomaly import RunningStats
+from db.cruds.anomaly_crud import AnomalyService
+from db.models import AnomalyKindEnum
+
+
+class FakeResult:
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+
+    def all(self):
+        return self.rows
+
+
+class FakeSession:
+    """
+    Answers the SELECTs in order from `results` and records every INSERT / UPDATE with its parameters.
+    """
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.writes = []
+        self.commits = 0
+
+    async def execute(self, statement, parameters=None):
+        if isinstance(statement, (Insert, Update)):
+            self.writes.append((statement, parameters))
+            return FakeResult()
+        return FakeResult(self.results.pop(0) if self.results else ())
+
+    async def commit(self):
+        self.commits += 1
+
+
+def baseline_row(metric, values):
+    stats = RunningStats()
+    for value in values:
+        stats.add(value)
+    return SimpleNamespace(metric=metric, count=stats.count, mean=stats.mean, m2=stats.m2)
+
+
+def test_running_stats_match_statistics():
+    values = [72.0, 75.5, 71.0, 80.25, 69.0, 77.0]
+    stats = RunningStats()
+    for value in values:
+        stats.add(value)
+
+    assert stats.count == len(values)
+    assert stats.mean == pytest.approx(statistics.mean(values))
+    assert stats.stddev == pytest.approx(statistics.stdev(values))
+    assert stats.z_score(90.0) == pytest.approx((90.0 - statistics.mean(values)) / statistics.stdev(values))
+
+
+def test_running_stats_without_spread_have_no_z_score():
+    stats = RunningStats()
+    assert stats.stddev == 0.0
+    stats.add(70.0)
+    stats.add(70.0)
+    assert stats.z_score(90.0) is None
+
+
+def upserted_baselines(statement) -> dict:
+    params = statement.compile(dialect=postgresql.dialect()).params
+    rows = {}
+    for key, value in params.items():
+        column, _, index = key.rpartition("_m")
+        rows.setdefault(index, {})[column] = value
+    return {row["metric"]: row for row in rows.values()}
+
+
+def test_evaluate_flags_out_of_range_and_baseline_deviations():
+    service = AnomalyService(z_threshold=3.0, min_samples=5)
+    db = FakeSession([baseline_row("avg_heart_rate", [70.0, 72.0, 71.0, 69.0, 73.0])])
+    samples = [
+        ("avg_heart_rate", 11, date(2025, 1, 1), 71.5, (40, 190)),  # Normal
+        ("avg_heart_rate", 12, date(2025, 1, 2), 30.0, (40, 190)),  # Out of range and far below the baseline
+        ("test:7", 13, date(2025, 1, 2), 5.0, (1, 4)),  # Out of range; no baseline yet
+    ]
+    asyncio.run(service._evaluate(db, 1, samples))
+
+    (_, events), (upsert, _) = db.writes
+    assert sorted((event["source_id"], event["kind"].value) for event in events) == [
+        (12, "baseline"), (12, "out_of_range"), (13, "out_of_range")]
+    deviation = next(event for event in events if event["kind"] == AnomalyKindEnum.baseline)
+    assert deviation["z_score"] < -3.0
+    assert deviation["expected_low"] < 71.5 < deviation["expected_high"]
+
+    baselines = upserted_baselines(upsert)
+    assert baselines["avg_heart_rate"]["count"] == 7
+    assert baselines["test:7"]["count"] == 1
+    assert db.commits == 0  # The hook commits
+
+
+def test_evaluated_rows_are_marked_checked():
+    service = AnomalyService(z_threshold=3.0, min_samples=5)
+    Activity = namedtuple("Activity", "activity_id start_time avg_heart_rate max_heart_rate")
+    db = FakeSession([], [Activity(21, date(2025, 1, 1), 75, 150)])  # Lock, unchecked rows, then no baselines
+    asyncio.run(service.evaluate_activities(db, [(1, date(2025, 1, 1))]))
+
+    marked = [statement for statement, _ in db.writes if isinstance(statement, Update)]
+    assert len(marked) == 1
+    assert marked[0].compile().params["anomaly_checked"] is True
+    assert db.commits == 1
@@ -0,0 +1,92 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+from db.cruds.base_crud import BaseService
+from db.models import DailySteps
+
+ROWS = [{"user_id": 1, "date": datetime(2025, 1, 1), "total_steps": 4000, "source_id": "watch-1"}]
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class FakeSession:
+    """
+    Records calls; the row of a resent sample currently lies on `previous`.
+    """
+
+    def __init__(self, previous=()):
+        self.previous = list(previous)
+        self.calls = []
+
+    async def execute(self, statement, parameters=None):
+        self.calls.append("execute")
+        return FakeResult(self.previous)
+
+    async def commit(self):
+        self.calls.append("commit")
+
+    async def rollback(self):
+        self.calls.append("rollback")
+
+
+def test_transaction_hooks_run_before_commit():
+    service = BaseService(DailySteps, date_column="date")
+    db = FakeSession()
+
+    async def hook(hook_db, keys):
+        assert hook_db is db and keys == [(1, datetime(2025, 1, 1))]
+        db.calls.append("hook")
+
+    service.transaction_hooks.append(hook)
+    assert asyncio.run(service.upsert(db, ROWS)) == 1
+    assert db.calls == ["execute", "execute", "hook", "commit"]
+
+
+def test_resent_sample_also_refreshes_its_previous_date():
+    service = BaseService(DailySteps, date_column="date")
+    db = FakeSession(previous=[(1, datetime(2024, 12, 31))])
+    written = []
+
+    async def hook(hook_db, keys):
+        written.extend(keys)
+
+    service.transaction_hooks.append(hook)
+    assert asyncio.run(service.upsert(db, ROWS)) == 1
+    assert written == [(1, datetime(2025, 1, 1)), (1, datetime(2024, 12, 31))]
+
+
+def test_failing_transaction_hook_rolls_the_write_back():
+    service = BaseService(DailySteps, date_column="date")
+    db = FakeSession()
+
+    async def hook(hook_db, keys):
+        raise RuntimeError("rollup refresh failed")
+
+    service.transaction_hooks.append(hook)
+    assert asyncio.run(service.upsert(db, ROWS)) == 0
+    assert db.calls == ["execute", "execute", "rollback"]
+
+
+class RecordingSession(FakeSession):
+    def __init__(self):
+        super().__init__()
+        self.statements = []
+
+    async def execute(self, statement, parameters=None):
+        self.statements.append(statement)
+        return SimpleNamespace(scalars=lambda: FakeResult(list(range(len(parameters)))))
+
+
+def test_bulk_create_returns_rows_in_input_order():
+    service = BaseService(DailySteps, date_column="date")
+    for return_objects in (True, False):
+        db = RecordingSession()
+        assert asyncio.run(service.bulk_create(db, ROWS * 3, batch_size=2, return_objects=return_objects)) == [0, 1, 0]
+        assert all(statement._sort_by_parameter_order for statement in db.statements)
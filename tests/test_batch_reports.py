@@ -0,0 +1,30 @@
+import asyncio
+import os
+from datetime import date
+from types import SimpleNamespace
+
+from app import batch_reports
+
+
+async def fake_batches(args, timer):
+    yield [SimpleNamespace(user_id=user_id, dob=date(1980, 1, 1)) for user_id in (1, 2, 3)], {1: {}, 2: {}, 3: {}}
+
+
+async def fake_render(sections):
+    if sections == 2:
+        raise RuntimeError("render failed")
+    return b"%PDF"
+
+
+def test_failed_reports_are_reported_and_exit_non_zero(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_reports, "fetch_batches", fake_batches)
+    monkeypatch.setattr(batch_reports, "calculate_scores", lambda totals: {})
+    monkeypatch.setattr(batch_reports, "build_report_sections", lambda report_data: report_data["user"].user_id)
+    monkeypatch.setattr(batch_reports, "render_pdf_async", fake_render)
+    monkeypatch.setattr(batch_reports, "shutdown_render_pool", lambda: None)
+
+    assert asyncio.run(batch_reports.main(["--output-dir", str(tmp_path), "--concurrency", "2"])) == 1
+    assert sorted(os.listdir(tmp_path)) == ["health_report_1.pdf", "health_report_3.pdf"]
+
+    args = batch_reports.parse_args(["--output-dir", str(tmp_path), "--concurrency", "1"])
+    assert asyncio.run(batch_reports.generate_reports(args)) == [2]
@@ -0,0 +1,99 @@
+import asyncio
+import math
+from datetime import date, datetime
+
+from app.utils import cohort_ranking as cohort_ranking_module
+from app.utils.cohort_ranking import CohortRanking
+
+COHORT = ("40-49", "Female")
+
+
+def test_nan_scores_are_not_indexed():
+    ranking = CohortRanking(min_peers=1)
+    ranking.load([(1, COHORT, 50.0), (2, COHORT, math.nan), (3, COHORT, 10.0)])
+    assert ranking.cohorts[COHORT] == [10.0, 50.0]
+    assert 2 not in ranking.entries
+    assert ranking.rank(COHORT, math.nan) is None
+
+
+def test_rank_against_the_stored_scores():
+    ranking = CohortRanking(min_peers=1)
+    ranking.load([(1, COHORT, 50.0), (2, COHORT, 70.0), (3, COHORT, 70.0)])
+    assert ranking.rank(COHORT, 70.0) == {"percentile": 66.7, "peers": 3}
+
+
+def test_current_score_replaces_the_users_stored_entry():
+    ranking = CohortRanking(min_peers=1)
+    ranking.load([(1, COHORT, 50.0), (2, COHORT, 70.0), (3, COHORT, 70.0)])
+
+    # User 1 now scores 90: ranked as if their entry were 90, among the same 3 users
+    assert ranking.rank(COHORT, 90.0, user_id=1) == {"percentile": 83.3, "peers": 3}
+    # User 4 is not in the stored build yet: ranked as a 4th member
+    assert ranking.rank(COHORT, 70.0, user_id=4) == {"percentile": 62.5, "peers": 4}
+    # User 2 moved to another cohort since the build: their stored entry stays with the old one
+    assert ranking.rank(("50-59", "Female"), 70.0, user_id=2) == {"percentile": 50.0, "peers": 1}
+
+
+def test_small_cohorts_are_not_ranked():
+    ranking = CohortRanking(min_peers=3)
+    ranking.load([(1, COHORT, 50.0), (2, COHORT, 70.0)])
+    assert ranking.rank(COHORT, 60.0, user_id=1) is None
+    assert ranking.rank(COHORT, 60.0, user_id=3) == {"percentile": 50.0, "peers": 3}
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+    def scalar(self):
+        return self.rows
+
+
+class FakeSession:
+    def __init__(self, *results):
+        self.results = list(results)
+        self.writes = []
+        self.commits = 0
+
+    async def execute(self, statement, parameters=None):
+        if statement.is_dml:
+            self.writes.append((statement, parameters))
+            return FakeResult(None)
+        return FakeResult(self.results.pop(0))
+
+    async def commit(self):
+        self.commits += 1
+
+
+def test_build_stores_finite_scores_of_every_user(monkeypatch):
+    totals = {"total_steps": 8000, "active_minutes": 30.0, "calories_burned": 300.0, "avg_sleep_minutes": 450.0,
+              "sleep_count": 1, "bhi_deviation": 0.0}
+
+    async def get_totals(db, from_rollups):
+        assert from_rollups
+        return {1: totals, 2: totals}
+
+    monkeypatch.setattr(cohort_ranking_module.stats_service, "get_totals", get_totals)
+    users = [(1, date(1980, 5, 1), "Female"), (2, date(1990, 5, 1), "Male"), (3, date(1990, 5, 1), "Male")]
+    db = FakeSession(users)
+    assert asyncio.run(CohortRanking.build(db)) == 2  # User 3 has no totals
+
+    (_, _), (_, rows) = db.writes  # DELETE, then INSERT
+    assert [row["user_id"] for row in rows] == [1, 2]
+    assert len({row["built_at"] for row in rows}) == 1
+    assert db.commits == 1
+
+
+def test_reloads_only_when_a_new_build_is_stored():
+    ranking = CohortRanking(min_peers=1)
+    first, second = datetime(2025, 1, 1), datetime(2025, 1, 2)
+
+    assert asyncio.run(ranking.ensure_current(FakeSession(first, [(1, "40-49", "Female", 50.0)]))) == first
+    assert asyncio.run(ranking.ensure_current(FakeSession(first))) == first  # No reload query
+    assert ranking.loads == 1
+
+    asyncio.run(ranking.ensure_current(FakeSession(second, [(1, "40-49", "Female", 60.0)])))
+    assert (ranking.version, ranking.cohorts[COHORT], ranking.loads) == (second, [60.0], 2)
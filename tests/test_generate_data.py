@@ -0,0 +1,22 @@
+from datetime import date
+
+from data.generate_data import DataGenerator, load_catalogs
+from data.load_data import DATA_DIR
+
+
+def test_activity_sessions_never_collide():
+    tests, activity_type_ids = load_catalogs(DATA_DIR)
+    generator = DataGenerator(42, 365, date(2025, 2, 22), tests, activity_type_ids)
+
+    activities = [activity for user_id in range(1, 101)
+                  for activity in generator.generate_user(user_id)["activities.json"]]
+    keys = {(activity["user_id"], activity["start_time"]) for activity in activities}
+    assert len(keys) == len(activities)
+
+    by_user_day = {}
+    for activity in activities:
+        by_user_day.setdefault((activity["user_id"], activity["start_time"].date()), []).append(activity)
+    for sessions in by_user_day.values():
+        sessions.sort(key=lambda activity: activity["start_time"])
+        for earlier, later in zip(sessions, sessions[1:]):
+            assert earlier["end_time"] < later["start_time"]
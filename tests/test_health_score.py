@@ -0,0 +1,54 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.utils import health_score
+from app.utils.cache import score_cache
+from app.utils.health_score import calculate_BHI, summarize_health_data
+
+RESULTS = [SimpleNamespace(test_id=1, result_value=120.0), SimpleNamespace(test_id=2, result_value=5.0)]
+
+
+def test_bhi_uses_the_given_bounds():
+    # Test 1 is 35 above the middle of 70-100; test 2 is within range
+    assert calculate_BHI(RESULTS, {1: (70.0, 100.0), 2: (4.0, 6.0)}) == 100 - 35 * 0.5
+
+
+def test_bhi_requires_bounds():
+    # Without bounds every result would be skipped and the score silently 100
+    with pytest.raises(TypeError):
+        calculate_BHI(RESULTS)
+
+
+def test_summary_deviation_matches_bhi():
+    bounds = {1: (70.0, 100.0), 2: (4.0, 6.0)}
+    totals = summarize_health_data({"test_results": RESULTS, "steps": [], "activities": [], "sleep": []}, bounds)
+    assert 100 - totals["bhi_deviation"] * 0.5 == calculate_BHI(RESULTS, bounds)
+
+
+def test_summary_skips_null_calories():
+    start = datetime(2024, 1, 1, 8)
+    activities = [SimpleNamespace(start_time=start, end_time=start + timedelta(minutes=30), calories_burned=300.0),
+                  SimpleNamespace(start_time=start, end_time=start + timedelta(minutes=45), calories_burned=None)]
+    totals = summarize_health_data({"test_results": [], "steps": [], "activities": activities, "sleep": []}, {})
+    assert (totals["active_minutes"], totals["calories_burned"]) == (75, 300.0)
+
+
+def test_scores_computed_across_an_invalidation_are_not_cached(monkeypatch):
+    async def load_report_data(user_id, days):
+        # A write to the user commits while their data is being read
+        score_cache.invalidate(user_id)
+        return {"user": None, "age": 40, "totals": {}}
+
+    monkeypatch.setattr(health_score, "load_report_data", load_report_data)
+    monkeypatch.setattr(health_score, "calculate_scores", lambda totals: {"FHS": 50.0})
+    score_cache.clear()
+
+    assert asyncio.run(health_score.get_user_scores(7))["scores"] == {"FHS": 50.0}
+    assert score_cache.get(7) is None
+
+    monkeypatch.setattr(health_score, "load_report_data", lambda user_id, days: asyncio.sleep(0, {"totals": {}}))
+    asyncio.run(health_score.get_user_scores(7))
+    assert score_cache.get(7)[None]["scores"] == {"FHS": 50.0}
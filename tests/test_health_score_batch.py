@@ -0,0 +1,82 @@
+import json
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.utils.health_score import calculate_AHS_from_totals, calculate_BHI, calculate_AHS, calculate_SQS, \
+    calculate_FHS
+from app.utils.health_score_batch import batch_AHS, score_population, lookup_bounds
+
+
+def test_null_calories_match_sql_totals():
+    start = datetime(2024, 1, 1, 8)
+    starts = np.array([start, start + timedelta(hours=2)], dtype="datetime64[us]")
+    ends = np.array([start + timedelta(minutes=30), start + timedelta(hours=2, minutes=45)], dtype="datetime64[us]")
+
+    AHS = batch_AHS(1, np.array([0]), [4000], np.array([0, 0]), starts, ends, [300.0, None])
+
+    # SUM(calories_burned) skips the NULL row
+    assert AHS[0] == calculate_AHS_from_totals(4000, 30 + 45, 300.0)
+
+
+def test_score_population_with_null_calories_is_json_safe():
+    start = np.datetime64("2024-01-01T08:00")
+    scores = score_population(
+        [1, 2],
+        ([1], [5.0], [0.0], [10.0]),
+        ([1, 2], [8000, 12000]),
+        ([1, 2], np.array([start, start]), np.array([start + 30, start + 60]).astype("datetime64[us]"), [None, 500.0]),
+        ([1], [420]),
+    )
+
+    assert all(np.isfinite(scores[name]).all() for name in ("BHI", "AHS", "SQS", "FHS"))
+    json.dumps({name: scores[name].tolist() for name in ("AHS", "FHS")}, allow_nan=False)
+
+
+def random_rows(rng, user_id):
+    start = datetime(2024, 1, 1)
+    results = [SimpleNamespace(user_id=user_id, test_id=rng.randint(1, 6), result_value=rng.uniform(0, 200))
+               for _ in range(rng.randint(0, 4))]
+    steps = [SimpleNamespace(user_id=user_id, total_steps=rng.randint(0, 20000)) for _ in range(rng.randint(0, 5))]
+    activities = []
+    for _ in range(rng.randint(0, 4)):
+        begin = start + timedelta(days=rng.randint(0, 30), seconds=rng.randint(0, 86400))
+        activities.append(SimpleNamespace(user_id=user_id, start_time=begin,
+                                          end_time=begin + timedelta(seconds=rng.randint(60, 7200)),
+                                          calories_burned=None if rng.random() < 0.3 else rng.uniform(10, 900)))
+    sleep = [SimpleNamespace(user_id=user_id, sleep_duration=rng.randint(120, 700)) for _ in range(rng.randint(0, 4))]
+    return results, steps, activities, sleep
+
+
+def test_batch_scores_equal_the_scalar_scores():
+    rng = random.Random(7)
+    # Test 5 has no bounds and test 6 is unknown, like a test created after the catalog was loaded
+    bounds = {1: (70.0, 100.0), 2: (4.0, 6.0), 3: (0.0, 150.0), 4: (120.0, 180.0), 5: (None, None)}
+    user_ids = sorted(rng.sample(range(1, 500), 60))
+    rows = {user_id: random_rows(rng, user_id) for user_id in user_ids + [500, 501]}  # 500+ are not in the cohort
+    results, steps, activities, sleep = ([row for user_id in rows for row in rows[user_id][table]]
+                                         for table in range(4))
+    rng.shuffle(results), rng.shuffle(steps), rng.shuffle(activities), rng.shuffle(sleep)
+
+    scores = score_population(
+        user_ids,
+        ([r.user_id for r in results], [r.result_value for r in results],
+         *lookup_bounds(bounds, [r.test_id for r in results])),
+        ([s.user_id for s in steps], [s.total_steps for s in steps]),
+        ([a.user_id for a in activities], np.array([a.start_time for a in activities], dtype="datetime64[us]"),
+         np.array([a.end_time for a in activities], dtype="datetime64[us]"),
+         [a.calories_burned for a in activities]),
+        ([s.user_id for s in sleep], [s.sleep_duration for s in sleep]),
+    )
+
+    assert scores["user_id"].tolist() == user_ids
+    for position, user_id in enumerate(user_ids):
+        # The scalar functions see each user's rows in the same order as the batch
+        own = [[row for row in table if row.user_id == user_id] for table in (results, steps, activities, sleep)]
+        BHI = calculate_BHI(own[0], bounds)
+        AHS = calculate_AHS(own[1], own[2])
+        SQS = calculate_SQS(own[3])
+        assert (scores["BHI"][position], scores["AHS"][position], scores["SQS"][position]) == (BHI, AHS, SQS)
+        assert scores["FHS"][position] == calculate_FHS(BHI, AHS, SQS)
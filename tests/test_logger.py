@@ -0,0 +1,23 @@
+import logging
+import queue
+
+from app.logger import DeferredQueueHandler, JsonFormatter
+
+
+class FailingFormatter(logging.Formatter):
+    def format(self, record):
+        raise AssertionError("formatted on the logging thread")
+
+
+def test_records_are_queued_unformatted():
+    log_queue = queue.SimpleQueue()
+    handler = DeferredQueueHandler(log_queue)
+    handler.setFormatter(FailingFormatter())
+    record = logging.LogRecord("app", logging.INFO, __file__, 1, "Upserted %s records in %s", (3, "DailySteps"),
+                               None)
+    handler.handle(record)
+
+    queued = log_queue.get_nowait()
+    assert queued is not record
+    assert (queued.msg, queued.args) == ("Upserted %s records in %s", (3, "DailySteps"))
+    assert '"message": "Upserted 3 records in DailySteps"' in JsonFormatter().format(queued)
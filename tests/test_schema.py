@@ -0,0 +1,103 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+
+import db.database
+from app.utils.ingestion import missing_conflict_indexes
+from db.base import Base
+from db.database import _sync_indexes, _sync_columns, RETIRED_INDEXES
+
+
+class FakeConnection:
+    """
+    Records DDL; CREATE INDEX of the names in `failing` raises like a unique index over duplicate rows.
+    """
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.created = []
+        self.dropped = []
+
+    @asynccontextmanager
+    async def begin_nested(self):
+        yield
+
+    async def execute(self, statement):
+        if isinstance(statement, CreateIndex):
+            if statement.element.name in self.failing:
+                raise RuntimeError("could not create unique index")
+            self.created.append(statement.element.name)
+        else:
+            self.dropped.append(str(statement).split('"')[1])
+
+
+def test_creates_every_index_and_drops_retired_ones():
+    conn = FakeConnection()
+    assert asyncio.run(_sync_indexes(conn))
+    assert {"idx_test_results_user_date", "idx_daily_steps_user_date", "uq_daily_steps_user_source"} <= set(
+        conn.created)
+    assert set(conn.dropped) == set(RETIRED_INDEXES)
+
+
+def test_keeps_the_indexes_a_failed_index_replaces():
+    conn = FakeConnection(failing={"idx_daily_steps_user_date"})
+    assert not asyncio.run(_sync_indexes(conn))
+    assert "idx_daily_steps_user" not in conn.dropped
+    assert "uq_daily_steps_user_date" not in conn.dropped
+    assert "idx_test_results_user" in conn.dropped
+
+
+def test_refuses_ingestion_while_a_conflict_index_is_missing():
+    assert not asyncio.run(_sync_indexes(FakeConnection(failing={"uq_sleep_user_source"})))
+    assert missing_conflict_indexes() == {"uq_sleep_user_source"}
+
+    assert asyncio.run(_sync_indexes(FakeConnection()))
+    assert not missing_conflict_indexes()
+
+
+class FakeInspector:
+    def __init__(self, tables):
+        self.tables = tables
+
+    def get_table_names(self):
+        return list(self.tables)
+
+    def get_columns(self, table):
+        return [{"name": name} for name in self.tables[table]]
+
+
+class FakeColumnConnection:
+    dialect = postgresql.dialect()
+
+    def __init__(self):
+        self.statements = []
+
+    async def run_sync(self, fn):
+        return fn(None)
+
+    async def execute(self, statement):
+        self.statements.append(str(statement))
+
+
+def test_adds_only_missing_nullable_columns(monkeypatch):
+    tables = {table.name: {column.name for column in table.columns} for table in Base.metadata.sorted_tables}
+    tables["daily_steps"].discard("updated_at")
+    tables["users"].discard("gender")  # NOT NULL: logged, not added
+    monkeypatch.setattr(db.database, "inspect", lambda _: FakeInspector(tables))
+
+    conn = FakeColumnConnection()
+    asyncio.run(_sync_columns(conn))
+    assert conn.statements == [
+        'ALTER TABLE "daily_steps" ADD COLUMN IF NOT EXISTS "updated_at" TIMESTAMP WITHOUT TIME ZONE']
+
+
+def test_drops_retired_columns(monkeypatch):
+    tables = {table.name: {column.name for column in table.columns} for table in Base.metadata.sorted_tables}
+    tables["user_baselines"].add("last_source_id")
+    monkeypatch.setattr(db.database, "inspect", lambda _: FakeInspector(tables))
+
+    conn = FakeColumnConnection()
+    asyncio.run(_sync_columns(conn))
+    assert conn.statements == ['ALTER TABLE "user_baselines" DROP COLUMN IF EXISTS "last_source_id"']
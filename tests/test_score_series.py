@@ -0,0 +1,58 @@
+import asyncio
+from datetime import date
+
+from app.utils import health_score
+from app.utils import catalog as catalog_module
+from app.utils.catalog import Catalog, catalog
+from app.utils.health_score import get_score_series
+from app.utils.score_series import DailyPrefixSums, series_cache
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class FakeSession:
+    def __init__(self, *results):
+        self.results = list(results)
+
+    async def execute(self, statement):
+        return FakeResult(self.results.pop(0))
+
+
+async def no_refresh():
+    pass
+
+
+async def no_totals(db, user_id, since, until):
+    return {}
+
+
+def test_reads_do_not_extend_the_cache_entry(monkeypatch):
+    monkeypatch.setattr(catalog, "ensure_fresh", no_refresh)
+    monkeypatch.setattr(health_score.stats_service, "get_daily_totals", no_totals)
+    series_cache.clear()
+
+    asyncio.run(get_score_series(None, 1, 7, 30))
+    expires_at, sums = series_cache._entries[1]
+    asyncio.run(get_score_series(None, 1, 7, 30))
+    assert series_cache._entries[1] == (expires_at, sums)
+
+
+def test_new_test_bounds_clear_the_series_cache():
+    def catalog_rows(upper_bound):
+        return [catalog_module.TestInfo(1, "Glucose", "mg/dL", 70.0, upper_bound)], []  # Tests, activity types
+
+    fresh = Catalog(ttl=60)
+    asyncio.run(fresh.refresh(FakeSession(*catalog_rows(99.0))))
+    series_cache.set(1, DailyPrefixSums(date(2025, 1, 1)))
+
+    asyncio.run(fresh.refresh(FakeSession(*catalog_rows(99.0))))
+    assert series_cache.get(1) is not None  # Same bounds
+
+    asyncio.run(fresh.refresh(FakeSession(*catalog_rows(110.0))))
+    assert series_cache.get(1) is None